@@ -0,0 +1,65 @@
+"""
+compares saving and loading a compressible pensieve, tabular data with repeated values, without compression against
+each available compression, zlib always and lz4 and zstd when their packages are installed; reports the size on disk
+and the throughput of saving and of loading every content in full:
+python benchmarks/benchmark_compression.py
+"""
+from pensieve import Pensieve
+from pensieve.compression import get_compressions
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import os
+
+import numpy as np
+from pandas import DataFrame
+
+NUM_ROWS = 2_000_000
+
+
+def build_contents():
+	random = np.random.default_rng(seed=0)
+	return {
+		'data': DataFrame({
+			'id': np.arange(NUM_ROWS),
+			'category': random.integers(0, 20, NUM_ROWS),
+			'price': np.round(random.random(NUM_ROWS) * 100, 2),
+			'flag': random.random(NUM_ROWS) < 0.1
+		}),
+		'counts': np.repeat(np.arange(1000), NUM_ROWS // 1000)
+	}
+
+
+def get_directory_size(path):
+	return sum(
+		os.path.getsize(os.path.join(directory, file_name))
+		for directory, _, file_names in os.walk(path) for file_name in file_names
+	)
+
+
+def main():
+	contents = build_contents()
+	raw_bytes = contents['data'].memory_usage(deep=True).sum() + contents['counts'].nbytes
+	for compression in [None] + get_compressions():
+		pensieve = Pensieve(compression=compression)
+		for key, content in contents.items():
+			pensieve.store(key=key, content=content)
+		with TemporaryDirectory() as directory:
+			path = os.path.join(directory, 'pensieve')
+			start = perf_counter()
+			pensieve.save(path=path, echo=0)
+			save_seconds = perf_counter() - start
+			size = get_directory_size(path=path)
+
+			start = perf_counter()
+			loaded = Pensieve.load(path=path, echo=False, memory_map=False)
+			checksum = int(loaded['data']['category'].sum()) + int(loaded['counts'].sum())
+			load_seconds = perf_counter() - start
+		print(
+			f'{str(compression):>5}: {size / 1024 ** 2:.0f}MB on disk, '
+			f'save {save_seconds:.2f}s ({raw_bytes / 1024 ** 2 / save_seconds:.0f}MB/s), '
+			f'load {load_seconds:.2f}s ({raw_bytes / 1024 ** 2 / load_seconds:.0f}MB/s), checksum {checksum}'
+		)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,58 @@
+"""
+evaluates a wide graph with one expensive chain on a few threads and compares the measured makespan with the
+makespan predicted from recorded durations
+usage: python benchmarks/benchmark_critical_path.py
+"""
+from pensieve import Pensieve
+from time import perf_counter, sleep
+
+NUM_THREADS = 2
+NUM_CHEAP = 12
+CHEAP_SECONDS = 0.05
+CHAIN_LENGTH = 4
+CHAIN_SECONDS = 0.1
+
+
+def create_root(seconds):
+	def root():
+		sleep(seconds)
+		return 0
+	return root
+
+
+def create_step(seconds):
+	def step(x):
+		sleep(seconds)
+		return x + 1
+	return step
+
+
+def build_pensieve(function_durations=None):
+	pensieve = Pensieve(num_threads=NUM_THREADS, function_durations=function_durations)
+	# the cheap memories are stored first so that dispatching in dictionary order would start them first
+	for i in range(NUM_CHEAP):
+		pensieve.store(key=f'cheap_{i}', function=create_root(CHEAP_SECONDS), evaluate=False)
+	pensieve.store(key='chain_0', function=create_root(CHAIN_SECONDS), evaluate=False)
+	for i in range(1, CHAIN_LENGTH):
+		pensieve.store(key=f'chain_{i}', precursors=[f'chain_{i - 1}'], function=create_step(CHAIN_SECONDS), evaluate=False)
+	return pensieve
+
+
+def main():
+	pensieve = build_pensieve()
+	start = perf_counter()
+	pensieve.evaluate()
+	print(f'first evaluation, no recorded durations: {perf_counter() - start:.2f}s')
+
+	# a new pensieve that knows the durations recorded by the first one
+	pensieve = build_pensieve(function_durations=pensieve.function_durations)
+	for num_threads in [1, 2, 4]:
+		print(f'predicted makespan on {num_threads} threads: {pensieve.simulate_evaluation(num_threads=num_threads):.2f}s')
+	start = perf_counter()
+	pensieve.evaluate()
+	print(f'second evaluation on {NUM_THREADS} threads: {perf_counter() - start:.2f}s')
+	print(f'work divided by threads: {(NUM_CHEAP * CHEAP_SECONDS + CHAIN_LENGTH * CHAIN_SECONDS) / NUM_THREADS:.2f}s')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,54 @@
+"""
+compares round-based and dependency-driven parallel evaluation on a graph with skewed durations:
+every round holds one slow memory, but every chain holds only one
+usage: python benchmarks/benchmark_parallel_executor.py
+"""
+from pensieve import Pensieve
+from time import perf_counter, sleep
+
+NUM_CHAINS = 6
+CHAIN_LENGTH = 6
+SLOW_SECONDS = 0.3
+FAST_SECONDS = 0.02
+
+
+def create_root(seconds):
+	def root():
+		sleep(seconds)
+		return 0
+	return root
+
+
+def create_step(seconds):
+	def step(x):
+		sleep(seconds)
+		return x + 1
+	return step
+
+
+def build_pensieve(scheduler):
+	pensieve = Pensieve(num_threads=NUM_CHAINS, scheduler=scheduler)
+	for chain in range(NUM_CHAINS):
+		for level in range(CHAIN_LENGTH):
+			seconds = SLOW_SECONDS if (chain + level) % CHAIN_LENGTH == 0 else FAST_SECONDS
+			if level == 0:
+				pensieve.store(key=f'chain_{chain}_{level}', function=create_root(seconds), evaluate=False)
+			else:
+				pensieve.store(
+					key=f'chain_{chain}_{level}', precursors=[f'chain_{chain}_{level - 1}'],
+					function=create_step(seconds), evaluate=False
+				)
+	return pensieve
+
+
+def main():
+	print(f'{NUM_CHAINS} chains of {CHAIN_LENGTH} memories, one {SLOW_SECONDS}s memory per chain and per round')
+	for scheduler in ['rounds', 'dependencies']:
+		pensieve = build_pensieve(scheduler=scheduler)
+		start = perf_counter()
+		pensieve.evaluate()
+		print(f'{scheduler:>12}: {perf_counter() - start:.2f}s')
+
+
+if __name__ == '__main__':
+	main()
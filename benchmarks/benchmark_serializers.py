@@ -0,0 +1,56 @@
+"""
+compares saving and loading large contents with pickle, the old behaviour, against the per-type formats:
+.npy for numpy arrays and, when pyarrow is installed, feather for data frames, both memory-mapped on load;
+each load runs in a fresh process that reads a slice of every content, and reports its peak resident memory
+usage: python benchmarks/benchmark_serializers.py
+"""
+from pensieve import Pensieve
+from multiprocessing import get_context
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import resource
+import os
+
+import numpy as np
+from pandas import DataFrame
+
+ARRAY_SIZE = 25_000_000
+NUM_ROWS = 2_000_000
+
+
+def build_pensieve(content_formats):
+	pensieve = Pensieve(content_formats=content_formats)
+	pensieve.store(key='array', content=np.random.random(ARRAY_SIZE))
+	pensieve.store(key='data', content=DataFrame({f'x_{i}': np.random.random(NUM_ROWS) for i in range(5)}))
+	return pensieve
+
+
+def load_and_read_slices(path, queue):
+	start = perf_counter()
+	pensieve = Pensieve.load(path=path, echo=False)
+	total = float(pensieve['array'][:1000].sum()) + float(pensieve['data']['x_0'].iloc[:1000].sum())
+	elapsed = perf_counter() - start
+	# ru_maxrss is in kilobytes on linux
+	queue.put((elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, total))
+
+
+def main():
+	context = get_context('spawn')
+	for name, content_formats in [('pickle', ['pickle']), ('per type', None)]:
+		pensieve = build_pensieve(content_formats=content_formats)
+		with TemporaryDirectory() as directory:
+			path = os.path.join(directory, 'pensieve')
+			start = perf_counter()
+			pensieve.save(path=path, echo=0)
+			save_seconds = perf_counter() - start
+
+			queue = context.Queue()
+			process = context.Process(target=load_and_read_slices, args=(path, queue))
+			process.start()
+			load_seconds, peak_megabytes, _ = queue.get()
+			process.join()
+		print(f'{name:>8}: save {save_seconds:.2f}s, load {load_seconds:.2f}s, peak rss of loading {peak_megabytes:.0f}MB')
+
+
+if __name__ == '__main__':
+	main()
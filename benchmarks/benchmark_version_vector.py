@@ -0,0 +1,60 @@
+"""
+measures the per-access overhead of revalidating memories on a 10k-node graph,
+with version vectors and with the fingerprint comparison they replace
+usage: python benchmarks/benchmark_version_vector.py
+"""
+from pensieve import Pensieve
+from time import perf_counter
+
+NUM_ROOTS = 100
+NUM_NODES = 10000
+
+
+def build_pensieve():
+	pensieve = Pensieve()
+	for i in range(NUM_ROOTS):
+		pensieve.store(key=f'root_{i}', content=list(range(i, i + 100)))
+	for i in range(NUM_NODES - NUM_ROOTS):
+		pensieve.store(
+			key=f'node_{i}', precursors=[f'root_{i % NUM_ROOTS}', f'root_{(i + 1 + i // NUM_ROOTS) % NUM_ROOTS}'],
+			function=lambda x: sum(len(value) for value in x.values()), evaluate=False
+		)
+	return pensieve
+
+
+def time_accesses(pensieve, keys):
+	start = perf_counter()
+	for key in keys:
+		_ = pensieve[key]
+	return (perf_counter() - start) / len(keys)
+
+
+def invalidate_roots(pensieve, keep_generations):
+	for i in range(NUM_ROOTS):
+		pensieve.memories_dictionary[f'root_{i}'].mark_stale()
+	if not keep_generations:
+		for memory in pensieve.memories_dictionary.values():
+			memory._precursor_generations = None
+
+
+def main():
+	pensieve = build_pensieve()
+	keys = list(pensieve.memories_dictionary.keys())
+	first = time_accesses(pensieve, keys)
+	fresh = time_accesses(pensieve, keys)
+
+	invalidate_roots(pensieve, keep_generations=True)
+	with_generations = time_accesses(pensieve, keys)
+
+	invalidate_roots(pensieve, keep_generations=False)
+	with_fingerprints = time_accesses(pensieve, keys)
+
+	print(f'{len(keys)} memories, seconds per access:')
+	print(f'first evaluation:                 {first:.2e}')
+	print(f'fresh content:                    {fresh:.2e}')
+	print(f'revalidation with generations:    {with_generations:.2e}')
+	print(f'revalidation with fingerprints:   {with_fingerprints:.2e}')
+
+
+if __name__ == '__main__':
+	main()
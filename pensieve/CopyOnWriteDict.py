@@ -0,0 +1,129 @@
+from collections.abc import MutableMapping
+from threading import Lock
+from weakref import ref
+
+
+# a key of a snapshot that was deleted, or that was added to the dictionary the snapshot was taken from afterwards
+_DELETED = object()
+
+
+class CopyOnWriteDict(MutableMapping):
+	def __init__(self, dictionary=None, base=None, copy_value=None):
+		"""
+		a dictionary that is snapshotted in constant time: a snapshot reads through to the dictionary it was taken from
+		and holds entries of its own only for the keys it has used or changed; before a dictionary changes a key,
+		its snapshots that still read that key through it get a copy of the value as it was
+		:param dict or NoneType dictionary: the entries, used as they are rather than copied
+		:param CopyOnWriteDict or NoneType base: the dictionary this one is a snapshot of
+		:param callable or NoneType copy_value: makes this dictionary's own copy of a value of its base,
+		e.g., list for lists that are changed in place
+		"""
+		self._own = {} if dictionary is None else dictionary
+		self._base = base
+		self._copy_value = copy_value
+		self._snapshots = []
+		self._lock = Lock()
+
+	def snapshot(self, copy_value=None):
+		"""
+		:param callable or NoneType copy_value: makes the snapshot's own copy of a value of this dictionary
+		:rtype: CopyOnWriteDict
+		"""
+		result = self.__class__(base=self, copy_value=copy_value)
+		with self._lock:
+			# snapshots are held weakly, so one that is garbage collected no longer gets copies
+			self._snapshots = [snapshot for snapshot in self._snapshots if snapshot() is not None]
+			self._snapshots.append(ref(result))
+		return result
+
+	def _copy(self, value):
+		return value if self._copy_value is None or value is _DELETED else self._copy_value(value)
+
+	def _look_up(self, key):
+		"""
+		:return: the value of key, not copied, or _DELETED if there is no such key
+		"""
+		value = self._own.get(key, _DELETED)
+		if value is _DELETED and self._base is not None and key not in self._own:
+			return self._base._look_up(key)
+		return value
+
+	def prepare_change(self, key):
+		"""
+		gives the snapshots that still read key through this dictionary a copy of its value, as it is now;
+		call it before the value of key is changed in place, e.g., by appending to a list, as assignment and
+		deletion call it anyway
+		:type key: str
+		"""
+		if len(self._snapshots) == 0:
+			return
+		value = self._look_up(key)
+		with self._lock:
+			snapshots = [snapshot() for snapshot in self._snapshots]
+		for snapshot in snapshots:
+			if snapshot is not None and key not in snapshot._own:
+				snapshot._own.setdefault(key, snapshot._copy(value))
+
+	def __getitem__(self, key):
+		if key in self._own or self._base is None:
+			value = self._own[key]
+		else:
+			value = self._base._look_up(key)
+			if self._copy_value is not None and value is not _DELETED:
+				# a value the base prepared for this dictionary in the meantime is kept
+				value = self._own.setdefault(key, self._copy(value))
+		if value is _DELETED:
+			raise KeyError(key)
+		return value
+
+	def __contains__(self, key):
+		return self._look_up(key) is not _DELETED
+
+	def __setitem__(self, key, value):
+		self.prepare_change(key)
+		self._own[key] = value
+
+	def __delitem__(self, key):
+		if key not in self:
+			raise KeyError(key)
+		self.prepare_change(key)
+		if self._base is None:
+			del self._own[key]
+		else:
+			self._own[key] = _DELETED
+
+	def __iter__(self):
+		if self._base is None:
+			return iter(self._own)
+		return self._iterate()
+
+	def _iterate(self):
+		own = self._own
+		for key in list(self._base):
+			if own.get(key) is not _DELETED:
+				yield key
+		for key, value in list(own.items()):
+			if value is not _DELETED and key not in self._base:
+				yield key
+
+	def __len__(self):
+		if self._base is None:
+			return len(self._own)
+		return sum(1 for _ in self._iterate())
+
+	def __repr__(self):
+		return repr(dict(self.items()))
+
+	def __reduce__(self):
+		# pickled as a plain dictionary, without the dictionaries it shares entries with
+		return dict, (dict(self.items()),)
+
+
+def prepare_change(dictionary, key):
+	"""
+	call before the value of key in dictionary is changed in place
+	:type dictionary: dict or CopyOnWriteDict
+	:type key: str
+	"""
+	if isinstance(dictionary, CopyOnWriteDict):
+		dictionary.prepare_change(key)
@@ -1,21 +1,65 @@
 from .EvaluationInput import EvaluationInput
 from .get_type import get_type
 from .get_schedule import get_schedule
+from .get_fingerprint import get_fingerprint
+from .get_function_fingerprint import get_function_fingerprint, serialize_function
+from .invalidate import invalidate
+from .get_stale_dependencies import get_stale_dependencies
+from .run_serialized_function import run_serialized_function
+from .run_coroutine import run_coroutine
+from .estimate_size import estimate_size
+from .PensieveDirectory import PensieveDirectory
+from .compression import get_compression
+from .CopyOnWriteDict import prepare_change
 
 from slytherin.collections import remove_list_duplicates
-from slytherin import get_size
 from chronometry import Timer
 from disk import Path
-from joblib import delayed
-from chronometry.progress import ProgressBar
 from pandas import DataFrame, Series
 
 import dill
 import pickle
-from inspect import getsource as get_source
+import asyncio
+from concurrent.futures import Future
+from datetime import timedelta
+from inspect import isawaitable, iscoroutinefunction
+from functools import partial
+from itertools import count
+from threading import Lock, local
+from uuid import uuid4
+
+
+# generations are drawn from one counter so that they never repeat, even across memories that replace each other
+_GENERATIONS = count(start=1)
+
+# how many flights each thread is computing
+_FLIGHT_STATE = local()
+
+
+def is_computing_flight():
+	"""
+	:return: whether the current thread is computing the content of a memory that other threads may be waiting for
+	:rtype: bool
+	"""
+	return getattr(_FLIGHT_STATE, 'count', 0) > 0
+
+
+def _count_flight(change):
+	_FLIGHT_STATE.count = getattr(_FLIGHT_STATE, 'count', 0) + change
 
 
 class Memory:
+	# defaults for memories unpickled from states that predate these attributes
+	_pinned = False
+	_evicted = False
+	_content_loader = None
+	_saved_path = None
+	_saved_signatures = None
+	_content_format = None
+	_compression = None
+	_content_compression = None
+	_stores_content = False
+
 	def __init__(
 			self, key, pensieve, function, _original_function,
 			label=None, precursors=None, metadata=False, materialize=True,
@@ -54,20 +98,28 @@ class Memory:
 
 		self._size = None
 		self._precursors_reference = None
+		self._content_fingerprint = None
+		self._generation = next(_GENERATIONS)
+		self._precursor_generations = None
+		self._flight_lock = Lock()
+		self._flight = None
+		self._pinned = False
+		self._evicted = False
+		self._content_loader = None
 		self._content_type = None
+		self._content_format = None
+		self._compression = None
+		self._content_compression = None
 		self._content_access_count = 0
 		self._n_jobs = n_jobs
-		if self.pensieve and self.pensieve.backup_memory_directory:
-			self._backup_directory = self.pensieve.backup_memory_directory.make_dir(name=self.key, ignore_if_exists=True)
-		else:
-			self._backup_directory = None
 
 		if _update:
 			self.update(precursors=precursors, function=function, _original_function=_original_function)
 
 	__PARAMS__ = [
-		'key', 'label', 'materialize', 'frozen', 'deep_freezed', 'stale', 'metadata', 'total_time', 'size',
-		'precursors_reference', 'content_type', 'content_access_count', 'backup_directory'
+		'key', 'label', 'materialize_memory', 'frozen', 'deep_frozen', 'stale', 'metadata', 'total_time', 'size',
+		'precursors_reference', 'content_type', 'content_access_count', 'pinned',
+		'content_format', 'compression', 'content_compression', 'stores_content'
 	]
 
 	@property
@@ -88,8 +140,15 @@ class Memory:
 	def partial_copy(self, include_function=False, stale=False, update=False, include_precursor_reference=True):
 		result = self.clean_copy(include_function=include_function, stale=stale, update=update)
 		result._content = self._content
-		result._content = self._content
+		result._content_fingerprint = self._content_fingerprint
+		result._generation = self._generation
+		result._precursor_generations = self._precursor_generations if include_precursor_reference else None
 		result._frozen = self._frozen
+		result._pinned = self._pinned
+		result._compression = self._compression
+		result._stores_content = self._stores_content
+		result._evicted = self._evicted
+		result._content_loader = self._content_loader
 		result._total_time = self._total_time
 		result._size = self._size
 		result._precursors_reference = self._precursors_reference if include_precursor_reference else None
@@ -97,6 +156,41 @@ class Memory:
 		result._content_access_count = self._content_access_count
 		return result
 
+	def shallow_copy(self):
+		"""
+		a copy, for another pensieve, that shares the content, function, and metadata with this memory;
+		memories replace rather than change what they hold, so the copies are copy-on-write
+		:rtype: Memory
+		"""
+		result = self.__class__.__new__(self.__class__)
+		result.__dict__.update(self.__dict__)
+		result._flight_lock = Lock()
+		result._flight = None
+		result._pensieve = None
+		return result
+
+	def has_same_content(self, other):
+		"""
+		:type other: Memory
+		:return: True if both memories hold up-to-date contents that are the same, by generation or else by fingerprint
+		:rtype: bool
+		"""
+		if self.is_stale or other.is_stale or not self._is_content_ready() or not other._is_content_ready():
+			return False
+		if self._generation == other._generation:
+			return True
+		return self.content_fingerprint == other.content_fingerprint
+
+	def has_same_definition(self, other):
+		"""
+		:type other: Memory
+		:return: True if both memories run the same function on the same precursors
+		:rtype: bool
+		"""
+		if self.precursor_keys != other.precursor_keys:
+			return False
+		return get_function_fingerprint(function=self._function) == get_function_fingerprint(function=other._function)
+
 	def __hashkey__(self):
 		return self.__class__.__name__, self.parameters, self.precursor_keys
 
@@ -104,13 +198,25 @@ class Memory:
 	def parameters(self):
 		return {param: getattr(self, f'_{param}') for param in self.__PARAMS__}
 
+	def __reduce_ex__(self, protocol):
+		reduced = super().__reduce_ex__(protocol)
+		state = reduced[2]
+		if protocol < 5 and state.get('buffers'):
+			# protocols before 5 cannot hold buffers, so they are copied into the state as bytes
+			state['buffers'] = [bytes(buffer) for buffer in state['buffers']]
+		return reduced
+
 	def __getstate__(self):
 		"""
+		with pickle protocol 5, large buffers of the content, e.g., numpy arrays and the blocks of data frames, are kept
+		out of the serialized content and pickled straight from the memory of the content; a pickler with a
+		buffer_callback writes them out of band, and unpickling rebuilds the content on top of them without a copy
 		:rtype: dict
 		"""
 		stale = self._stale
+		is_available, content = self._get_materialized_content()
 		try:
-			function_dump = dill.dumps(obj=self._function)
+			function_dump = serialize_function(function=self._function)
 		except RecursionError as e:
 			print(f'\nrecursion error during the dill.dumping of the "{self.key}" memory \n\n')
 			raise e
@@ -120,13 +226,17 @@ class Memory:
 			'function': function_dump
 		}
 
-		if not stale:
+		if not stale and is_available:
 			try:
-				state['serialized'] = pickle.dumps(obj=self._content, protocol=pickle.HIGHEST_PROTOCOL)
+				buffers = []
+				state['serialized'] = pickle.dumps(
+					obj=content, protocol=pickle.HIGHEST_PROTOCOL, buffer_callback=buffers.append
+				)
+				state['buffers'] = buffers
 				state['serialized_by'] = 'pickle'
 			except:
 				try:
-					state['serialized'] = dill.dumps(obj=self._content, protocol=dill.HIGHEST_PROTOCOL)
+					state['serialized'] = dill.dumps(obj=content, protocol=dill.HIGHEST_PROTOCOL)
 					state['serialized_by'] = 'dill'
 				except:
 					state['serialized_by'] = None
@@ -175,53 +285,190 @@ class Memory:
 				self._content = dill.loads(str=state['serialized'])
 
 			elif state['serialized_by'] == 'pickle':
-				self._content = pickle.loads(state['serialized'])
+				# states written before buffers were kept out of band have none
+				self._content = pickle.loads(state['serialized'], buffers=state.get('buffers'))
 
 			else:
 				self._stale = True
 				self._content = None
 				self._precursors_reference = None
 		self._function = dill.loads(str=state['function'])
+		self._content_fingerprint = None
+		self._generation = next(_GENERATIONS)
+		self._precursor_generations = None
+		self._flight_lock = Lock()
+		self._flight = None
+		self._evicted = False
+		self._content_loader = None
 		self._pensieve = None
 
 	@property
-	def backup_directory(self):
+	def result_cache(self):
 		"""
-		:rtype: Path or NoneType
+		:rtype: ResultCache or NoneType
 		"""
-		return self._backup_directory
+		return None if self.pensieve is None else self.pensieve.result_cache
 
-	def save(self, path):
+	def _get_file_signatures(self):
 		"""
-		:type path: str or Path
+		what each file written by save depends on; a file whose signature has not changed is not written again
+		:rtype: dict[str, object]
 		"""
-		path = Path(path=path)
-		path.make_dir()
+		if self._original_function is self._function:
+			original_function_signature = None
+		else:
+			original_function_signature = get_function_fingerprint(function=self._original_function)
+		return {
+			'content': (self._generation, self._evicted and self._content_loader is None, self.compression),
+			'function': get_function_fingerprint(function=self._function),
+			'original_function': original_function_signature
+		}
+
+	def save(self, path, incremental=False, storage=None):
+		"""
+		:param str or Path path: the directory of the memory, or its entry in storage
+		:param bool incremental: if True, files that have not changed since this memory was last saved to, or loaded
+		from, the same place are not written again
+		:param PensieveDirectory or PensieveArchive or NoneType storage: where the pensieve is saved
+		:return: the number of files written
+		:rtype: int
+		"""
+		if storage is None:
+			storage, entry = PensieveDirectory.for_memory_directory(path=Path(path=path).path)
+		else:
+			entry = str(path)
+		location = storage.get_location(entry=entry)
+		signatures = self._get_file_signatures()
+		if incremental and self._saved_path == location:
+			saved_signatures = self._saved_signatures or {}
+			# another memory, e.g., a snapshot of this one, may have written to the same place since
+			if saved_signatures.get('token') != self._load_save_token(storage=storage, entry=entry):
+				saved_signatures = {}
+		else:
+			saved_signatures = {}
+
+		def needs_writing(name):
+			if saved_signatures.get(name) != signatures[name]:
+				return True
+			if name == 'content':
+				return not storage.has_content(
+					entry=entry, content_format=self._content_format, compression=self._content_compression
+				)
+			return not storage.has_object(entry=entry, name=name)
+
+		num_files = 0
+		if needs_writing(name='content'):
+			is_available, content = self._get_materialized_content()
+			try:
+				if not is_available:
+					raise ValueError(f'the content of "{self.key}" was evicted')
+				content_formats = self.pensieve._content_formats if self.pensieve is not None else None
+				compression = self.compression
+				self._content_format = storage.save_content(
+					entry=entry, content=content, content_formats=content_formats, compression=compression
+				)
+				self._content_compression = compression
+				signatures['content_saved'] = True
+			except:
+				signatures['content_saved'] = False
+			num_files += 1
+		else:
+			signatures['content_saved'] = saved_signatures.get('content_saved', False)
+
 		parameters = {param: getattr(self, f'_{param}') for param in self.__PARAMS__}
-		try:
-			(path + 'content.pensieve').save(obj=self._content)
-		except:
+		if not signatures['content_saved']:
 			parameters['stale'] = True
-		(path + 'parameters.pensieve').save(obj=parameters)
-		(path + 'function.pensieve').save(obj=self._function, method='dill')
+		signatures['parameters'] = get_fingerprint(parameters)
+		if needs_writing(name='parameters'):
+			storage.save_object(entry=entry, name='parameters', obj=parameters)
+			num_files += 1
+
+		if needs_writing(name='function'):
+			storage.save_object(entry=entry, name='function', obj=self._function, method='dill')
+			num_files += 1
+
+		# a function converted by create_pensieve_function keeps the fingerprint of the original one
+		if signatures['original_function'] is not None and needs_writing(name='original_function'):
+			storage.save_object(entry=entry, name='original_function', obj=self._original_function, method='dill')
+			num_files += 1
+
+		if num_files > 0:
+			signatures['token'] = uuid4().hex
+			storage.save_object(entry=entry, name='save_token', obj=signatures['token'])
+		else:
+			signatures['token'] = saved_signatures.get('token')
+
+		self._saved_path = location
+		self._saved_signatures = signatures
+		return num_files
+
+	@staticmethod
+	def _load_save_token(storage, entry):
+		"""
+		the token written with the files of a memory, which changes whenever any of them is written
+		:type storage: PensieveDirectory or PensieveArchive
+		:type entry: str
+		:rtype: str or NoneType
+		"""
+		if not storage.has_object(entry=entry, name='save_token'):
+			return None
+		return storage.load_object(entry=entry, name='save_token')
 
 	@classmethod
-	def load(cls, path, pensieve):
-		path = Path(path=path)
-		parameters = (path + 'parameters.pensieve').load()
-		function = (path + 'function.pensieve').load(method='dill')
+	def load(cls, path, pensieve, memory_map=True, lazy=False, storage=None):
+		"""
+		:param str or Path path: the directory of the memory, or its entry in storage
+		:type pensieve: Pensieve
+		:param bool memory_map: if True, contents saved in a format that supports it, e.g., numpy arrays, are
+		memory-mapped rather than read
+		:param bool lazy: if True, the content is read when it is first needed
+		:param PensieveDirectory or PensieveArchive or NoneType storage: where the pensieve is saved
+		:rtype: Memory
+		"""
+		if storage is None:
+			storage, entry = PensieveDirectory.for_memory_directory(path=Path(path=path).path)
+		else:
+			entry = str(path)
+		parameters = storage.load_object(entry=entry, name='parameters')
+		function = storage.load_object(entry=entry, name='function', method='dill')
+		if storage.has_object(entry=entry, name='original_function'):
+			original_function = storage.load_object(entry=entry, name='original_function', method='dill')
+		else:
+			original_function = function
 		memory = cls(
-			pensieve=pensieve, function=function, precursors=None,
+			pensieve=pensieve, function=function, _original_function=original_function, precursors=None,
 			key=parameters['key'], _update=False
 		)
 		for name, value in parameters.items():
 			setattr(memory, f'_{name}', value)
 		memory._function = function
+		memory._content_fingerprint = None
 		try:
-			memory._content = (path + 'content.pensieve').load()
+			content_loader = partial(
+				storage.load_content, entry=entry, content_format=memory._content_format, memory_map=memory_map,
+				compression=memory._content_compression
+			)
+			if lazy and storage.has_content(
+					entry=entry, content_format=memory._content_format, compression=memory._content_compression
+			):
+				# the memory looks evicted until its content is faulted in from storage
+				memory._content = None
+				memory._evicted = True
+				memory._content_loader = content_loader
+			else:
+				memory._content = content_loader()
+			content_saved = True
 		except:
 			memory._content = None
 			memory._stale = True
+			content_saved = False
+
+		# the files match the loaded memory, so saving it back to the same place writes nothing
+		memory._saved_path = storage.get_location(entry=entry)
+		memory._saved_signatures = memory._get_file_signatures()
+		memory._saved_signatures['content_saved'] = content_saved
+		memory._saved_signatures['parameters'] = get_fingerprint(parameters)
+		memory._saved_signatures['token'] = cls._load_save_token(storage=storage, entry=entry)
 		return memory
 
 	def get_summary(self):
@@ -241,20 +488,22 @@ class Memory:
 			result[new_key] = value
 		return result
 
+	def estimate_size(self, seen=None):
+		"""
+		:param dict[int, int] or NoneType seen: ids of objects already counted, see estimate_size
+		:rtype: int
+		"""
+		if seen is None:
+			seen = {}
+		# the pensieve can be reached from closures but does not belong to any one memory
+		seen.setdefault(id(self._pensieve), 0)
+		parts = (self._key, self._content, self._precursors_reference, self._content_type, self._function, self._metadata)
+		return sum(estimate_size(part, seen=seen) for part in parts)
+
 	@property
 	def size(self):
 		if self._size is None:
-			result = 0
-			result += get_size(self._key, exclude_objects=[self._pensieve])
-			result += get_size(self._content, exclude_objects=[self._pensieve])
-			result += get_size(self._precursors_reference, exclude_objects=[self._pensieve])
-			result += get_size(self._content_type, exclude_objects=[self._pensieve])
-			result += get_size(self._frozen, exclude_objects=[self._pensieve])
-			result += get_size(self._stale, exclude_objects=[self._pensieve])
-			result += get_size(self._function, exclude_objects=[self._pensieve])
-			result += get_size(self._metadata, exclude_objects=[self._pensieve])
-			result += get_size(result)
-			self._size = result
+			self._size = self.estimate_size()
 		return self._size
 
 	@property
@@ -279,7 +528,10 @@ class Memory:
 	def speed(self):
 		evaluation_time = self.evaluation_time
 		if evaluation_time is not None:
-			return self.size / evaluation_time
+			if isinstance(evaluation_time, timedelta):
+				evaluation_time = evaluation_time.total_seconds()
+			# bytes per second of evaluation; functions too fast to measure count as a microsecond
+			return self.size / max(evaluation_time, 1e-6)
 		else:
 			return None
 
@@ -341,6 +593,10 @@ class Memory:
 		return self._stale
 
 	def freeze(self, forever=False):
+		if self._evicted:
+			# a frozen memory is never recomputed, so an evicted content has to come back first
+			self.evaluate()
+		self._prepare_change()
 		self._frozen = True
 		self._deep_frozen = forever
 		if forever:
@@ -349,8 +605,140 @@ class Memory:
 	def deep_freeze(self):
 		self.freeze(forever=True)
 
+	@property
+	def is_pinned(self):
+		return self._pinned
+
+	def pin(self):
+		"""
+		keeps the content of this memory in memory even when the pensieve is over its memory budget
+		"""
+		self._prepare_change()
+		self._pinned = True
+
+	def unpin(self):
+		self._prepare_change()
+		self._pinned = False
+
+	@property
+	def compression(self):
+		"""
+		the compression the content is saved with: the memory's own, or else the pensieve's
+		:rtype: str or NoneType
+		"""
+		if self._compression is None:
+			return None if self.pensieve is None else self.pensieve.compression
+		# False turns compression off for this memory
+		return self._compression or None
+
+	def set_compression(self, compression):
+		"""
+		:param str or bool or NoneType compression: 'zlib', 'lz4', or 'zstd'; False for none;
+		None to use the pensieve's compression
+		"""
+		if compression is not None and compression is not False:
+			get_compression(name=compression)
+		self._prepare_change()
+		self._compression = compression
+
+	@property
+	def is_evicted(self):
+		"""
+		True if the content is not in memory, because it was dropped to stay within the memory budget or was not read
+		yet by a lazy load, and will be loaded back or recomputed when needed
+		:rtype: bool
+		"""
+		return self._evicted
+
+	@property
+	def can_be_evicted(self):
+		"""
+		frozen memories cannot be recomputed so their contents are never evicted
+		:rtype: bool
+		"""
+		if not self._materialize_memory or self._frozen or self._pinned or self._evicted or self._function is None:
+			return False
+		if self._content is None:
+			return False
+		# the content of a stored object lives in the closure of its function and evicting it frees nothing
+		for cell in getattr(self._function, '__closure__', None) or ():
+			try:
+				if cell.cell_contents is self._content:
+					return False
+			except ValueError:
+				pass
+		return True
+
+	def _evict(self, content_loader=None, content=None):
+		"""
+		drops the content so that it is loaded back, or recomputed, on demand;
+		successors that are up to date are not affected
+		:param callable or NoneType content_loader: loads the content back, e.g., from the spill directory
+		:param content: the content that content_loader loads; eviction is cancelled if the memory no longer holds it
+		:return: whether the content was evicted
+		:rtype: bool
+		"""
+		with self._flight_lock:
+			if self._flight is not None or not self.can_be_evicted:
+				return False
+			if content_loader is not None and content is not self._content:
+				return False
+			self._prepare_change()
+			# the flag is set before the content is dropped so that lock-free readers never return the dropped content
+			self._evicted = True
+			self._content = None
+			self._size = None
+			self._content_loader = content_loader
+			if content_loader is None:
+				self._content_fingerprint = None
+				self._precursors_reference = None
+				self._precursor_generations = None
+			return True
+
+	def _get_materialized_content(self):
+		"""
+		:return: whether the content is available without running the function, and the content
+		:rtype: tuple[bool, object]
+		"""
+		if self._content_loader is not None:
+			try:
+				return True, self._content_loader()
+			except Exception:
+				return False, None
+		return not self._evicted, self._content
+
+	def prefetch(self):
+		"""
+		loads a content that is up to date but not in memory, e.g., after a lazy load; stale contents are left alone
+		"""
+		if not self.is_stale and self._materialize_memory:
+			self.get_content()
+
+	def _fault_in(self):
+		"""
+		loads an evicted content back; the content is the same one, so its generation and fingerprint are kept
+		:return: whether the content was loaded
+		:rtype: bool
+		"""
+		content_loader = self._content_loader
+		self._content_loader = None
+		try:
+			content = content_loader()
+		except Exception:
+			# the content is gone, e.g., the spill directory ran out of room, and has to be recomputed
+			self._content_fingerprint = None
+			self._precursors_reference = None
+			self._precursor_generations = None
+			return False
+		self._content = content
+		self._evicted = False
+		if self.pensieve is not None:
+			self.pensieve._content_was_set(memory=self)
+		return True
+
 	def unfreeze(self):
 		if not self._deep_frozen:
+			self._prepare_change()
 			self._frozen = False
 			if self._stale:
 				self.mark_stale()
@@ -364,6 +752,13 @@ class Memory:
 		"""
 		return self._pensieve
 
+	def _prepare_change(self):
+		"""
+		snapshots of the pensieve that still share this memory get a copy of it, as it is, before it changes
+		"""
+		if self._pensieve is not None:
+			prepare_change(dictionary=self._pensieve._memories_dictionary, key=self._key)
+
 	@property
 	def key(self):
 		return self._key
@@ -425,6 +820,7 @@ class Memory:
 		"""
 		:param Memory or str successor: the successor memory or its key that should be removed
 		"""
+		prepare_change(dictionary=self.pensieve._successor_keys, key=self.key)
 		if isinstance(successor, str):
 			self.pensieve._successor_keys[self.key].remove(successor)
 		else:
@@ -453,12 +849,18 @@ class Memory:
 
 		self.pensieve._precursor_keys[self.key] = precursor_keys
 		for precursor_key in removed_precursor_keys:
+			prepare_change(dictionary=self.pensieve._successor_keys, key=precursor_key)
 			self.pensieve._successor_keys[precursor_key].remove(self.key)
 		for precursor_key in new_precursor_keys:
+			prepare_change(dictionary=self.pensieve._successor_keys, key=precursor_key)
 			self.pensieve._successor_keys[precursor_key].append(self.key)
 
+		self._prepare_change()
 		self._function = function
 		self._original_function = _original_function
+		self._size = None
+		# the recorded generations say nothing about the new function or precursors
+		self._precursor_generations = None
 		self.mark_stale()
 
 		if metadata is not None:
@@ -479,38 +881,19 @@ class Memory:
 		"""
 		return [precursor for precursor in self.precursors if precursor.is_stale]
 
-	def _get_stale_dependencies(self, unique=False):
-		"""
-		:rtype: list[Memory]
-		"""
-		dependencies = []
-		for precursor in self.stale_precursors:
-			dependencies.append(precursor)
-			dependencies += precursor._get_stale_dependencies(unique=False)
-
-		if unique:
-			unique_dependencies = []
-			for dependency in dependencies:
-				if dependency not in unique_dependencies:
-					unique_dependencies.append(dependency)
-			return unique_dependencies
-		else:
-			return dependencies
-
 	@property
 	def stale_dependencies(self):
 		"""
+		stale ancestors of this memory in topological order
 		:rtype: list[Memory]
 		"""
-		return self._get_stale_dependencies(unique=True)
+		return get_stale_dependencies(memories=[self])
 
 	def update_and_get_schedule(self):
 		"""
 		:rtype: list[list[Memory]]
 		"""
-		jobs = self.stale_dependencies
-		jobs.reverse()
-		return get_schedule(jobs=jobs)
+		return get_schedule(jobs=self.stale_dependencies)
 
 	@property
 	def type_significance(self):
@@ -521,182 +904,365 @@ class Memory:
 
 	@property
 	def content(self):
+		return self.get_content()
+
+	def _is_content_ready(self):
+		"""
+		:rtype: bool
+		"""
+		return self._materialize_memory and not self._evicted and (self.is_frozen or not self.is_stale)
+
+	def _get_ready_content(self):
+		"""
+		reads the content without a lock: readiness is checked before the content is read so that an old content is
+		never returned for a readiness that a newer one brought, and again after, with the generation, in case the
+		content was evicted or replaced in between
+		:return: whether the content was ready, and the content if it was
+		:rtype: tuple[bool, object]
+		"""
+		if not self._is_content_ready():
+			return False, None
+		generation = self._generation
+		content = self._content
+		if self._generation == generation and self._is_content_ready():
+			return True, content
+		return False, None
+
+	def _start_or_join_flight(self):
+		"""
+		single-flight: the first caller that needs the content computes it and the others wait for its result
+		:return: whether this caller computes the content, and the future that carries the content
+		:rtype: tuple[bool, Future]
+		"""
+		with self._flight_lock:
+			if self._flight is not None:
+				return False, self._flight
+			if self._is_content_ready():
+				# the content became ready in the meantime
+				ready = Future()
+				ready.set_result(self._content)
+				return False, ready
+			self._flight = Future()
+			return True, self._flight
+
+	def _land_flight(self, flight, content=None, error=None):
+		"""
+		:type flight: Future
+		"""
+		with self._flight_lock:
+			self._flight = None
+		if error is None:
+			flight.set_result(content)
+		else:
+			flight.set_exception(error)
+
+	def _evaluate_content(self, process_pool=None):
+		if self._content_loader is not None and self._fault_in() and self._is_content_ready():
+			return self._content
 		if not self._materialize_memory:
-			content, precursors_reference = self.get_content_and_reference()
+			content, precursors_reference = self.get_content_and_reference(process_pool=process_pool)
 			# empty the content because it is not supposed to be materialized
 			self.set_content(content=None, precursors_reference=None)
-		elif self.is_frozen or not self.is_stale:
-			content = self._content
+		else:
+			content, precursors_reference = self.get_content_and_reference(process_pool=process_pool)
+			self.set_content(
+				content=content, precursors_reference=precursors_reference,
+				precursor_generations=self._get_precursor_generations()
+			)
+		return content
 
+	def get_content(self, process_pool=None):
+		"""
+		:param ProcessPoolExecutor or NoneType process_pool: if provided, the function runs in a worker process
+		"""
+		# reading content that is ready takes no lock; otherwise the flight lock settles it
+		is_ready, content = self._get_ready_content()
+		if is_ready:
+			return content
+
+		is_computing, flight = self._start_or_join_flight()
+		if not is_computing:
+			return flight.result()
+
+		_count_flight(change=1)
+		try:
+			content = self._evaluate_content(process_pool=process_pool)
+		except BaseException as error:
+			self._land_flight(flight=flight, error=error)
+			raise
+		finally:
+			_count_flight(change=-1)
+		self._land_flight(flight=flight, content=content)
+		return content
+
+	async def _evaluate_content_async(self, executor=None):
+		if self._content_loader is not None and self._fault_in() and self._is_content_ready():
+			return self._content
+		if not self._materialize_memory:
+			content, precursors_reference = await self.get_content_and_reference_async(executor=executor)
+			self.set_content(content=None, precursors_reference=None)
 		else:
-			content, precursors_reference = self.get_content_and_reference()
-			self.set_content(content=content, precursors_reference=precursors_reference)
+			content, precursors_reference = await self.get_content_and_reference_async(executor=executor)
+			self.set_content(
+				content=content, precursors_reference=precursors_reference,
+				precursor_generations=self._get_precursor_generations()
+			)
+		return content
 
+	async def get_content_async(self, executor=None):
+		"""
+		like get_content but awaits coroutine functions on the running event loop
+		:param concurrent.futures.Executor or NoneType executor: runs functions that are not coroutine functions
+		"""
+		is_ready, content = self._get_ready_content()
+		if is_ready:
+			return content
+
+		is_computing, flight = self._start_or_join_flight()
+		if not is_computing:
+			return await asyncio.wrap_future(flight)
+
+		_count_flight(change=1)
+		try:
+			content = await self._evaluate_content_async(executor=executor)
+		except BaseException as error:
+			self._land_flight(flight=flight, error=error)
+			raise
+		finally:
+			_count_flight(change=-1)
+		self._land_flight(flight=flight, content=content)
 		return content
 
-	def set_content(self, content, precursors_reference):
+	def set_content(self, content, precursors_reference, precursor_generations=None):
+		"""
+		:param precursors_reference: fingerprints of the function and precursor contents used to produce the content
+		:param dict[str, int] or NoneType precursor_generations: generations of the precursors used to produce the content
+		"""
 		if self.is_frozen:
 			raise MemoryError(f'{self.key} is frozen. You cannot change a frozen memory!')
-		self._content = content
+		self._prepare_change()
+		if content is not self._content:
+			self._content = content
+			self._content_fingerprint = None
+			self._size = None
+			self._generation = next(_GENERATIONS)
+		recomputed = self._evicted
+		self._evicted = False
+		self._content_loader = None
 		self._stale = False
 		self._precursors_reference = precursors_reference
+		self._precursor_generations = precursor_generations
+		if self._materialize_memory and self.pensieve is not None:
+			self.pensieve._content_was_set(memory=self, recomputed=recomputed)
 
 	@property
-	def backup_content_pickle_path(self):
+	def generation(self):
 		"""
-		:rtype: Path or NoneType
+		a number that increases every time the content of this memory changes
+		:rtype: int
 		"""
-		if self.backup_directory:
-			return (self.backup_directory + f'{self.key}_content.pickle')
-		else:
-			return None
+		return self._generation
 
-	@property
-	def backup_content_dill_path(self):
+	def _get_precursor_generations(self):
 		"""
-		:rtype: Path or NoneType
+		:rtype: dict[str, int or NoneType]
 		"""
-		if self.backup_directory:
-			return (self.backup_directory + f'{self.key}_content.dill')
-		else:
-			return None
-
-	def backup_content_exists(self):
-		return False
-		return self.backup_content_pickle_path.exists() or self.backup_content_dill_path.exists()
+		return {
+			precursor.key: precursor._generation if precursor._materialize_memory else None
+			for precursor in self.precursors
+		}
 
-	@property
-	def backup_precursors_reference_path(self):
+	def _precursors_are_unchanged(self):
 		"""
-		:rtype: Path or NoneType
+		compares the generations recorded at the last evaluation with the current ones, without any hashing
+		:rtype: bool
 		"""
-		if self.backup_directory:
-			return (self.backup_directory + f'{self.key}_hash.pickle')
-		else:
-			return None
-
-	@property
-	def backup_content(self):
-		if self.backup_directory:
-			if self.backup_content_pickle_path.exists():
-				return self.backup_content_pickle_path.load(method='pickle', echo=0)
-			elif self.backup_content_dill_path.exists():
-				return self.backup_content_dill_path.load(method='dill', echo=0)
-			else:
-				return None
-		else:
-			return None
-
-	@backup_content.setter
-	def backup_content(self, content):
-		if self.backup_directory:
-			try:
-				self.backup_content_pickle_path.save(obj=content, method='pickle', echo=0)
-			except:
-				if self.backup_content_pickle_path.exists():
-					self.backup_content_pickle_path.delete()
-				try:
-					self.backup_content_dill_path.save(obj=content, method='dill', echo=0)
-				except Exception as e:
-					if self.backup_content_dill_path.exists():
-						self.backup_content_dill_path.delete()
+		if not self._materialize_memory or self._precursor_generations is None:
+			return False
+		if self._precursors_reference is None and self.has_precursors:
+			return False
+		# a precursor that is not materialized has no stable generation and needs its content fingerprinted
+		current_generations = self._get_precursor_generations()
+		return None not in current_generations.values() and current_generations == self._precursor_generations
 
 	@property
-	def backup_precursors_reference(self):
-		if self.backup_directory and self.backup_precursors_reference_path.exists():
-			return self.backup_precursors_reference_path.load(method='pickle', echo=0)
-
-		else:
-			return None
-
-	@backup_precursors_reference.setter
-	def backup_precursors_reference(self, precursors_reference):
-		if self.backup_directory:
-			self.backup_precursors_reference_path.save(obj=precursors_reference, method='pickle', echo=0)
+	def content_fingerprint(self):
+		"""
+		a digest of the materialized content, computed once per content object
+		:rtype: str
+		"""
+		if self._content_fingerprint is None:
+			self._content_fingerprint = get_fingerprint(self._content)
+		return self._content_fingerprint
 
 	def mark_stale(self):
-		self._stale = True
-		self._size = None
-		for successor in self.successors:
-			successor.mark_stale()
-
-	def get_content_and_reference(self):
-		if self.num_threads == 1:
-			precursor_keys_to_contents = {p.key: p.content for p in self.precursors}
-		else:
-			def get_content(p):
-				return p.content
+		invalidate(memories=[self])
 
-			precursors = self.precursors
+	def _get_precursor_keys_to_contents(self):
+		"""
+		:rtype: dict[str, object]
+		"""
+		if self.num_threads == 1 or not self.has_precursors:
+			return {p.key: p.content for p in self.precursors}
 
-			schedule = self.update_and_get_schedule()
+		# the pensieve updates the stale ancestors in parallel and then collects the precursor contents
+		precursor_keys = self.precursor_keys
+		contents = self.pensieve.evaluate(keys=precursor_keys, output=True)
+		return {key: content for key, content in zip(precursor_keys, contents)}
 
-			progress_bar = ProgressBar(
-				total=sum([len(schedule_round) for schedule_round in schedule]),
-				echo=self.pensieve._echo
-			)
+	def _get_precursors_reference(self, precursor_keys_to_contents):
+		"""
+		builds a reference made of small digests of the function and of the precursor contents
+		:type precursor_keys_to_contents: dict[str, object]
+		:rtype: str or tuple
+		"""
+		function_fingerprint = get_function_fingerprint(function=self._original_function)
+		if len(precursor_keys_to_contents) == 0:
+			return function_fingerprint
+
+		precursor_fingerprints = {}
+		for precursor in self.precursors:
+			content = precursor_keys_to_contents[precursor.key]
+			if precursor._content is content:
+				# the precursor has already fingerprinted this exact object
+				precursor_fingerprints[precursor.key] = precursor.content_fingerprint
+			else:
+				precursor_fingerprints[precursor.key] = get_fingerprint(content)
+		return function_fingerprint, precursor_fingerprints
 
-			progress_amount = 0
-			for schedule_round in schedule:
-				progress_bar.show(amount=progress_amount, text=f'updating {len(schedule_round)} memories')
-				self.pensieve.processor(delayed(get_content)(job) for job in schedule_round)
-				progress_amount += len(schedule_round)
-			if progress_amount > 0:
-				progress_bar.show(amount=progress_amount, text=f'{self.key} updated!')
+	@staticmethod
+	def _get_function_arguments(precursor_keys_to_contents):
+		"""
+		:type precursor_keys_to_contents: dict[str, object]
+		:rtype: tuple
+		"""
+		if len(precursor_keys_to_contents) == 0:
+			return ()
+		elif len(precursor_keys_to_contents) == 1:
+			return list(precursor_keys_to_contents.values())[0],
+		else:
+			inputs = EvaluationInput(inputs=precursor_keys_to_contents)
+			return inputs.originals,
 
-			contents = self.pensieve.processor(delayed(get_content)(p) for p in precursors)
-			keys = [precursor.key for precursor in precursors]
-			precursor_keys_to_contents = {key: content for key, content in zip(keys, contents)}
+	def _run_function_in_process(self, arguments, process_pool):
+		"""
+		:type arguments: tuple
+		:type process_pool: ProcessPoolExecutor
+		:return: the content and the timer, or None if the function or its inputs cannot be serialized, in which
+		case nothing was run
+		:rtype: tuple or NoneType
+		:raises ContentSerializationError: if the function ran but its output cannot be sent back
+		"""
+		if self.is_coroutine_function:
+			# a coroutine cannot be carried back from a worker process, so it is awaited in this one
+			return None
+		try:
+			function_dump = serialize_function(function=self._function)
+			arguments_dump = dill.dumps(arguments)
+		except Exception:
+			return None
+		return dill.loads(process_pool.submit(run_serialized_function, function_dump, arguments_dump).result())
 
-		if len(self.precursor_keys) == 0:
-			new_reference = get_source(self._original_function)
+	def _run_function(self, precursor_keys_to_contents, process_pool=None):
+		"""
+		:type precursor_keys_to_contents: dict[str, object]
+		:param ProcessPoolExecutor or NoneType process_pool: if provided, the function runs in a worker process
+		"""
+		arguments = self._get_function_arguments(precursor_keys_to_contents=precursor_keys_to_contents)
+		content_and_timer = None
+		if process_pool is not None:
+			content_and_timer = self._run_function_in_process(arguments=arguments, process_pool=process_pool)
+
+		if content_and_timer is None:
+			# without a process pool, or if dill cannot carry the function or its inputs, it runs in this thread
+			timer = Timer(start_now=True, unit='timedelta')
+			new_content = self._function(*arguments)
+			if isawaitable(new_content):
+				new_content = run_coroutine(new_content)
+			timer.stop()
+		else:
+			new_content, timer = content_and_timer
+		self.pensieve.function_durations.add_measurement(name=self.key, timer=timer)
+		return new_content
 
-			if new_reference == self._precursors_reference and self._materialize_memory:
-				new_content = self._content
-			elif self.backup_directory and new_reference == self.backup_precursors_reference and self.backup_content_exists():
-				new_content = self.backup_content
+	@property
+	def is_coroutine_function(self):
+		"""
+		:rtype: bool
+		"""
+		return iscoroutinefunction(self._original_function) or iscoroutinefunction(self._function)
 
-			else:
-				timer = Timer(start_now=True, unit='timedelta')
-				new_content = self._function()
-				timer.stop()
-				self.pensieve.function_durations.add_measurement(name=self.key, timer=timer)
-
-		elif len(self.precursor_keys) == 1:
-			precursor_content = list(precursor_keys_to_contents.values())[0]
-			new_reference = (get_source(self._original_function), precursor_keys_to_contents)
-			if new_reference == self._precursors_reference and self._materialize_memory:
-				new_content = self._content
-			elif self.backup_directory and new_reference == self.backup_precursors_reference and self.backup_content_exists():
-				new_content = self.backup_content
+	def _find_content(self, precursor_keys_to_contents):
+		"""
+		looks for content that is still valid for the precursor contents, without running the function
+		:type precursor_keys_to_contents: dict[str, object]
+		:return: whether the content is found, the content, and the new precursors reference
+		:rtype: tuple
+		"""
+		if self._precursors_are_unchanged():
+			return True, self._content, self._precursors_reference
 
-			else:
-				timer = Timer(start_now=True, unit='timedelta')
-				new_content = self._function(precursor_content)
-				timer.stop()
-				self.pensieve.function_durations.add_measurement(name=self.key, timer=timer)
+		new_reference = self._get_precursors_reference(precursor_keys_to_contents=precursor_keys_to_contents)
 
-		else:
-			inputs = EvaluationInput(inputs=precursor_keys_to_contents)
-			new_reference = (get_source(self._original_function), precursor_keys_to_contents)
-			if new_reference == self._precursors_reference and self._materialize_memory:
-				new_content = self._content
-			elif self.backup_directory and new_reference == self.backup_precursors_reference and self.backup_content_exists():
-				new_content = self.backup_content
-			else:
-				timer = Timer(start_now=True, unit='timedelta')
-				new_content = self._function(inputs.originals)
+		if new_reference == self._precursors_reference and self._materialize_memory:
+			return True, self._content, new_reference
 
-				timer.stop()
-				self.pensieve.function_durations.add_measurement(name=self.key, timer=timer)
+		result_cache = self.result_cache
+		if result_cache is not None and not self._stores_content:
+			found, content = result_cache.get(reference=new_reference)
+			if found:
+				return True, content, new_reference
+		return False, None, new_reference
 
-		self._content_type = get_type(new_content)
+	def _record_content(self, content, reference, computed):
+		"""
+		:param content: the content that was found or produced
+		:param reference: the precursors reference of the content
+		:param bool computed: True if the function produced the content, which then goes to the result cache unless
+		the function only returns a stored object
+		"""
+		self._content_type = get_type(content)
 
 		self._content_access_count += 1
-		if self.backup_directory and new_reference != self.backup_precursors_reference:
-			self.backup_content = new_content
-			self.backup_precursors_reference = new_reference
+		result_cache = self.result_cache
+		if computed and result_cache is not None and not self._stores_content:
+			result_cache.put(reference=reference, content=content)
 
+	def get_content_and_reference(self, process_pool=None):
+		"""
+		:param ProcessPoolExecutor or NoneType process_pool: if provided, the function runs in a worker process
+		:rtype: tuple
+		"""
+		precursor_keys_to_contents = self._get_precursor_keys_to_contents()
+		found, new_content, new_reference = self._find_content(precursor_keys_to_contents=precursor_keys_to_contents)
+		if not found:
+			new_content = self._run_function(
+				precursor_keys_to_contents=precursor_keys_to_contents, process_pool=process_pool
+			)
+		self._record_content(content=new_content, reference=new_reference, computed=not found)
+		return new_content, new_reference
+
+	async def get_content_and_reference_async(self, executor=None):
+		"""
+		:param concurrent.futures.Executor or NoneType executor: runs functions that are not coroutine functions
+		:rtype: tuple
+		"""
+		precursors = self.precursors
+		contents = await asyncio.gather(*[precursor.get_content_async(executor=executor) for precursor in precursors])
+		precursor_keys_to_contents = {precursor.key: content for precursor, content in zip(precursors, contents)}
+
+		found, new_content, new_reference = self._find_content(precursor_keys_to_contents=precursor_keys_to_contents)
+		if not found and self.is_coroutine_function:
+			arguments = self._get_function_arguments(precursor_keys_to_contents=precursor_keys_to_contents)
+			timer = Timer(start_now=True, unit='timedelta')
+			new_content = await self._function(*arguments)
+			timer.stop()
+			self.pensieve.function_durations.add_measurement(name=self.key, timer=timer)
+		elif not found:
+			new_content = await asyncio.get_event_loop().run_in_executor(
+				executor, self._run_function, precursor_keys_to_contents
+			)
+		self._record_content(content=new_content, reference=new_reference, computed=not found)
 		return new_content, new_reference
 
 	@property
@@ -0,0 +1,197 @@
+from datetime import timedelta
+from threading import Lock
+import re
+
+
+_UNITS = {
+	'': 1, 'b': 1,
+	'k': 1024, 'kb': 1024, 'kib': 1024,
+	'm': 1024 ** 2, 'mb': 1024 ** 2, 'mib': 1024 ** 2,
+	'g': 1024 ** 3, 'gb': 1024 ** 3, 'gib': 1024 ** 3,
+	't': 1024 ** 4, 'tb': 1024 ** 4, 'tib': 1024 ** 4
+}
+
+
+def get_number_of_bytes(size):
+	"""
+	:param int or float or str size: number of bytes or a string such as '512MB' or '8 GB' (units are powers of 1024)
+	:rtype: int
+	"""
+	if isinstance(size, (int, float)):
+		return int(size)
+	match = re.match(r'^\s*([0-9]*\.?[0-9]+)\s*([a-zA-Z]*)\s*$', size)
+	if match is None or match.group(2).lower() not in _UNITS:
+		raise ValueError(f'Unsupported size: {size}')
+	return int(float(match.group(1)) * _UNITS[match.group(2).lower()])
+
+
+class MemoryBudget:
+	def __init__(self, budget, spill_store=None):
+		"""
+		keeps the total size of materialized contents under a budget by evicting contents that are cheap to recompute
+		:param int or str budget: maximum number of bytes, e.g., 8 * 1024 ** 3 or '8GB'
+		:param SpillStore or NoneType spill_store: evicted contents that take longer to recompute than to read back
+		are written here instead of being dropped
+		"""
+		self._budget = get_number_of_bytes(budget)
+		self._spill_store = spill_store
+		self._lock = Lock()
+		self._clear_sizes()
+		self._num_evictions = 0
+		self._evicted_bytes = 0
+		self._num_recomputations = 0
+
+	def _clear_sizes(self):
+		# the size of each materialized memory, the content it holds, and the size and number of holders of each
+		# content, so that a content held by several memories is charged once
+		self._sizes = {}
+		self._content_ids = {}
+		self._contents = {}
+		self._used_bytes = 0
+
+	def __getstate__(self):
+		# the ids of contents mean nothing once they are unpickled, so the pensieve records its memories again
+		return {
+			key: value for key, value in self.__dict__.items()
+			if key not in ('_lock', '_sizes', '_content_ids', '_contents', '_used_bytes')
+		}
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self._lock = Lock()
+		self._clear_sizes()
+
+	@property
+	def budget(self):
+		"""
+		:rtype: int
+		"""
+		return self._budget
+
+	@property
+	def spill_store(self):
+		"""
+		:rtype: SpillStore or NoneType
+		"""
+		return self._spill_store
+
+	@property
+	def used_bytes(self):
+		"""
+		:rtype: int
+		"""
+		return self._used_bytes
+
+	@property
+	def statistics(self):
+		"""
+		:rtype: dict
+		"""
+		with self._lock:
+			statistics = {
+				'budget': self._budget,
+				'used_bytes': self.used_bytes,
+				'materialized_memories': len(self._sizes),
+				'evictions': self._num_evictions,
+				'evicted_bytes': self._evicted_bytes,
+				'recomputations': self._num_recomputations
+			}
+		if self._spill_store is not None:
+			statistics.update(self._spill_store.statistics)
+		return statistics
+
+	def record(self, memory, recomputed=False):
+		"""
+		:param Memory memory: a memory whose content is materialized
+		:param bool recomputed: True if the content had been evicted before
+		"""
+		size = memory.size
+		content_id = id(memory._content)
+		with self._lock:
+			self._release(key=memory.key)
+			self._sizes[memory.key] = size
+			self._content_ids[memory.key] = content_id
+			if content_id not in self._contents:
+				self._contents[content_id] = [size, 0]
+				self._used_bytes += size
+			self._contents[content_id][1] += 1
+			if recomputed:
+				self._num_recomputations += 1
+
+	def _release(self, key):
+		"""
+		stops charging a memory for its content; called with the lock held
+		:type key: str
+		:return: the number of bytes freed, which is zero while other memories hold the same content
+		:rtype: int
+		"""
+		self._sizes.pop(key, None)
+		content_id = self._content_ids.pop(key, None)
+		if content_id is None:
+			return 0
+		content = self._contents[content_id]
+		content[1] -= 1
+		if content[1] > 0:
+			return 0
+		del self._contents[content_id]
+		self._used_bytes -= content[0]
+		return content[0]
+
+	def forget(self, key):
+		"""
+		:param str key: key of a memory that no longer exists
+		"""
+		with self._lock:
+			self._release(key=key)
+		if self._spill_store is not None:
+			self._spill_store.discard(key=key)
+
+	@staticmethod
+	def _get_eviction_score(memory):
+		# bytes freed per second of recomputation; contents without a measured cost are evicted last
+		speed = memory.speed
+		return -1 if speed is None else speed
+
+	def _spill(self, memory, size):
+		"""
+		:type memory: Memory
+		:type size: int
+		:return: a function that loads the content back, or None if the content is cheaper to recompute
+		:rtype: callable or NoneType
+		"""
+		if self._spill_store is None:
+			return None
+		evaluation_seconds = memory.evaluation_time
+		if isinstance(evaluation_seconds, timedelta):
+			evaluation_seconds = evaluation_seconds.total_seconds()
+		if not self._spill_store.is_worth_spilling(size=size, evaluation_seconds=evaluation_seconds):
+			return None
+		return self._spill_store.spill(key=memory.key, content=memory._content, generation=memory.generation)
+
+	def enforce(self, memories, keep=None):
+		"""
+		evicts contents, the ones that free the most bytes per second of recomputation first, until within budget
+		:param dict[str, Memory] memories: the memories of the pensieve
+		:param str or NoneType keep: key of a memory that should not be evicted, e.g., the one just evaluated
+		"""
+		with self._lock:
+			used_bytes = self.used_bytes
+			if used_bytes <= self._budget:
+				return
+			candidates = [
+				memories[key] for key in self._sizes
+				if key != keep and key in memories and memories[key].can_be_evicted
+			]
+
+		candidates.sort(key=self._get_eviction_score, reverse=True)
+		for memory in candidates:
+			if used_bytes <= self._budget:
+				break
+			content = memory._content
+			content_loader = self._spill(memory=memory, size=self._sizes.get(memory.key, 0))
+			if memory._evict(content_loader=content_loader, content=content):
+				with self._lock:
+					size = self._release(key=memory.key)
+					self._num_evictions += 1
+					self._evicted_bytes += size
+				used_bytes -= size
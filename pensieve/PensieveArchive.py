@@ -0,0 +1,249 @@
+from .serializers import write_content, read_content, get_serializer
+
+from threading import Lock
+import tempfile
+import sqlite3
+import io
+import os
+
+
+# contents smaller than this are serialized in memory before they are written to the archive
+SPOOL_SIZE = 64 * 1024 ** 2
+CHUNK_SIZE = 4 * 1024 ** 2
+_HEADER = b'SQLite format 3\x00'
+
+
+class PensieveArchive:
+	def __init__(self, path):
+		"""
+		a saved pensieve in a single SQLite file: every object of every memory is a row of one table, indexed by the
+		key of the memory and the name of the object, so a single content is found without reading the others, and a
+		memory that changed replaces its own rows without the rest of the file being rewritten;
+		objects are copied in chunks where sqlite3 supports incremental blob I/O (Python 3.11 and later), but on older
+		versions each object is held in memory in full while it is written or read, so contents larger than memory
+		should be saved to a directory there
+		:param str path: the archive file
+		"""
+		self._path = os.path.abspath(str(path))
+		directory = os.path.dirname(self._path)
+		os.makedirs(directory, exist_ok=True)
+		self._lock = Lock()
+		self._connection = None
+		with self._lock:
+			self._connect()
+
+	def _connect(self):
+		"""
+		opens the file if it is not open, e.g., after close, when a lazily loaded content is read; call it holding the
+		lock
+		:rtype: sqlite3.Connection
+		"""
+		if self._connection is None:
+			# a single connection is shared by the threads that save and load memories, behind the lock
+			self._connection = sqlite3.connect(self._path, check_same_thread=False)
+			self._connection.execute(
+				'CREATE TABLE IF NOT EXISTS files ('
+				'entry TEXT NOT NULL, name TEXT NOT NULL, format TEXT NOT NULL, compression TEXT, size INTEGER NOT NULL, '
+				'data BLOB'
+				')'
+			)
+			self._connection.execute('CREATE UNIQUE INDEX IF NOT EXISTS files_index ON files (entry, name)')
+			self._connection.commit()
+		return self._connection
+
+	def __getstate__(self):
+		return {'_path': self._path}
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self._lock = Lock()
+		# the file is opened when it is first used
+		self._connection = None
+
+	def __repr__(self):
+		return f'PensieveArchive({self._path})'
+
+	@property
+	def path(self):
+		return self._path
+
+	@staticmethod
+	def is_archive(path):
+		"""
+		:type path: str
+		:rtype: bool
+		"""
+		path = str(path)
+		if not os.path.isfile(path):
+			return False
+		with open(path, 'rb') as file:
+			return file.read(len(_HEADER)) == _HEADER
+
+	def get_location(self, entry):
+		"""
+		:return: a string that identifies where an entry is saved
+		:rtype: str
+		"""
+		return f'{self._path}::{entry or ""}'
+
+	def _find(self, entry, name):
+		"""
+		:return: the row id, format, and compression of a file, or None if there is no such file
+		:rtype: tuple[int, str, str or NoneType] or NoneType
+		"""
+		with self._lock:
+			return self._connect().execute(
+				'SELECT rowid, format, compression FROM files WHERE entry = ? AND name = ?', (entry or '', name)
+			).fetchone()
+
+	def _write(self, entry, name, content_format, file, compression=None):
+		"""
+		:param file: a binary file object positioned at the end of what is written
+		"""
+		size = file.tell()
+		file.seek(0)
+		with self._lock:
+			connection = self._connect()
+			if hasattr(connection, 'blobopen'):
+				# the file is copied into the blob in chunks instead of being read in full
+				cursor = connection.execute(
+					'INSERT OR REPLACE INTO files (entry, name, format, compression, size, data) '
+					'VALUES (?, ?, ?, ?, ?, zeroblob(?))',
+					(entry or '', name, content_format, compression, size, size)
+				)
+				with connection.blobopen('files', 'data', cursor.lastrowid) as blob:
+					for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+						blob.write(chunk)
+			else:
+				# without incremental blob I/O, the whole object is passed to sqlite3 at once
+				connection.execute(
+					'INSERT OR REPLACE INTO files (entry, name, format, compression, size, data) '
+					'VALUES (?, ?, ?, ?, ?, ?)',
+					(entry or '', name, content_format, compression, size, file.read())
+				)
+
+	def _read(self, entry, name):
+		"""
+		:return: the file, its format, and its compression
+		:rtype: tuple[file, str, str or NoneType]
+		"""
+		with self._lock:
+			connection = self._connect()
+			if hasattr(connection, 'blobopen'):
+				row = connection.execute(
+					'SELECT rowid, format, compression FROM files WHERE entry = ? AND name = ?', (entry or '', name)
+				).fetchone()
+				if row is not None:
+					# the blob is copied out in chunks, and spills to a temporary file if it is large
+					rowid, content_format, compression = row
+					file = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+					with connection.blobopen('files', 'data', rowid, readonly=True) as blob:
+						for chunk in iter(lambda: blob.read(CHUNK_SIZE), b''):
+							file.write(chunk)
+					file.seek(0)
+					return file, content_format, compression
+			else:
+				# without incremental blob I/O, the whole object is read at once
+				row = connection.execute(
+					'SELECT data, format, compression FROM files WHERE entry = ? AND name = ?', (entry or '', name)
+				).fetchone()
+				if row is not None:
+					data, content_format, compression = row
+					return io.BytesIO(data), content_format, compression
+		raise FileNotFoundError(f'{self._path} has no "{name}" for "{entry}"')
+
+	def has_object(self, entry, name):
+		"""
+		:param str or NoneType entry: the key of a memory, or None for the objects of the pensieve itself
+		:type name: str
+		:rtype: bool
+		"""
+		return self._find(entry=entry, name=name) is not None
+
+	def save_object(self, entry, name, obj, method='pickle'):
+		"""
+		:param str method: 'pickle' or 'dill'
+		"""
+		with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as file:
+			get_serializer(name=method)['save'](obj, file)
+			self._write(entry=entry, name=name, content_format=method, file=file)
+
+	def load_object(self, entry, name, method='pickle'):
+		file, _, _ = self._read(entry=entry, name=name)
+		return get_serializer(name=method)['load'](file)
+
+	def has_content(self, entry, content_format, compression=None):
+		"""
+		:type entry: str
+		:type content_format: str or NoneType
+		:type compression: str or NoneType
+		:rtype: bool
+		"""
+		row = self._find(entry=entry, name='content')
+		return row is not None and row[1:] == (content_format or 'pickle', compression)
+
+	def save_content(self, entry, content, content_formats=None, compression=None):
+		"""
+		:param list[str] or NoneType content_formats: formats to try before the others
+		:param str or NoneType compression: if given, the content is compressed as it is written
+		:return: the format the content was saved in
+		:rtype: str
+		"""
+		with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as file:
+			content_format = write_content(
+				file=file, content=content, content_formats=content_formats, compression=compression
+			)
+			self._write(entry=entry, name='content', content_format=content_format, file=file, compression=compression)
+		return content_format
+
+	def load_content(self, entry, content_format, memory_map=True, compression=None):
+		"""
+		contents are read from the archive; memory_map is ignored because a blob is not a file that can be mapped
+		:param str or NoneType content_format: the format the content was saved in
+		:param str or NoneType compression: the compression the content was saved with
+		"""
+		file, saved_format, saved_compression = self._read(entry=entry, name='content')
+		return read_content(file=file, content_format=content_format or saved_format, compression=saved_compression)
+
+	def remove(self, entry):
+		"""
+		removes every object of an entry; the space is reused by later writes
+		:type entry: str
+		"""
+		with self._lock:
+			self._connect().execute('DELETE FROM files WHERE entry = ?', (entry,))
+
+	def get_entries(self):
+		"""
+		:return: the keys of the memories in the archive
+		:rtype: list[str]
+		"""
+		with self._lock:
+			rows = self._connect().execute("SELECT DISTINCT entry FROM files WHERE entry != ''").fetchall()
+		return [entry for entry, in rows]
+
+	def commit(self):
+		"""
+		makes everything written since the last commit visible at once; until then, readers see the previous save
+		"""
+		with self._lock:
+			self._connect().commit()
+
+	def compact(self):
+		"""
+		rewrites the file without the space left by replaced and removed objects
+		"""
+		with self._lock:
+			connection = self._connect()
+			connection.commit()
+			connection.execute('VACUUM')
+
+	def close(self):
+		"""
+		commits and releases the file; it is opened again if the archive is used afterwards
+		"""
+		with self._lock:
+			if self._connection is not None:
+				self._connection.commit()
+				self._connection.close()
+				self._connection = None
@@ -0,0 +1,135 @@
+from .pickle_file import save_pickle, load_pickle, get_pickle_path
+from .serializers import save_content, load_content, get_content_path, get_content_formats
+from .compression import get_compressions
+
+import shutil
+import os
+
+
+class PensieveDirectory:
+	def __init__(self, path):
+		"""
+		the directory layout of a saved pensieve: a directory per memory, next to the pensieve's own files,
+		and a file per object, e.g., parameters.pensieve, function.pensieve, and content.npy
+		:param str path: the directory
+		"""
+		self._path = os.path.abspath(str(path))
+
+	def __repr__(self):
+		return f'PensieveDirectory({self._path})'
+
+	@property
+	def path(self):
+		return self._path
+
+	@classmethod
+	def for_memory_directory(cls, path):
+		"""
+		:param str path: the directory of a single memory
+		:return: the storage and the entry of the memory in it
+		:rtype: tuple[PensieveDirectory, str]
+		"""
+		path = os.path.abspath(str(path))
+		return cls(path=os.path.dirname(path)), os.path.basename(path)
+
+	def _get_directory(self, entry):
+		"""
+		:param str or NoneType entry: the key of a memory, or None for the files of the pensieve itself
+		:rtype: str
+		"""
+		return self._path if entry is None else os.path.join(self._path, entry)
+
+	def get_location(self, entry):
+		"""
+		:return: a string that identifies where an entry is saved
+		:rtype: str
+		"""
+		return self._get_directory(entry=entry)
+
+	def _get_object_path(self, entry, name):
+		return os.path.join(self._get_directory(entry=entry), f'{name}.pensieve')
+
+	def has_object(self, entry, name):
+		"""
+		:type entry: str or NoneType
+		:type name: str
+		:rtype: bool
+		"""
+		return os.path.exists(get_pickle_path(path=self._get_object_path(entry=entry, name=name)))
+
+	def save_object(self, entry, name, obj, method='pickle'):
+		"""
+		:param str method: 'pickle' or 'dill'
+		"""
+		save_pickle(path=self._get_object_path(entry=entry, name=name), obj=obj, method=method)
+
+	def load_object(self, entry, name, method='pickle'):
+		return load_pickle(path=self._get_object_path(entry=entry, name=name), method=method)
+
+	def has_content(self, entry, content_format, compression=None):
+		"""
+		:type entry: str
+		:param str or NoneType content_format: the format the content was saved in; None for older pensieves
+		:param str or NoneType compression: the compression the content was saved with
+		:rtype: bool
+		"""
+		content_path = get_content_path(
+			path=os.path.join(self._get_directory(entry=entry), 'content'), content_format=content_format or 'pickle',
+			compression=compression
+		)
+		return os.path.exists(get_pickle_path(path=content_path))
+
+	def save_content(self, entry, content, content_formats=None, compression=None):
+		"""
+		:param list[str] or NoneType content_formats: formats to try before the others
+		:param str or NoneType compression: if given, the content is compressed as it is written
+		:return: the format the content was saved in
+		:rtype: str
+		"""
+		content_path = os.path.join(self._get_directory(entry=entry), 'content')
+		content_format = save_content(
+			path=content_path, content=content, content_formats=content_formats, compression=compression
+		)
+		# a content that was saved in another format, or with another compression, before leaves no file behind
+		for other_format in get_content_formats():
+			for other_compression in [None] + get_compressions():
+				if (other_format, other_compression) == (content_format, compression):
+					continue
+				file_path = get_content_path(
+					path=content_path, content_format=other_format, compression=other_compression
+				)
+				if os.path.exists(file_path):
+					os.remove(file_path)
+		return content_format
+
+	def load_content(self, entry, content_format, memory_map=True, compression=None):
+		"""
+		:param str or NoneType content_format: the format the content was saved in; None for older pensieves
+		:param bool memory_map: if True, formats that support it map the file instead of reading it
+		:param str or NoneType compression: the compression the content was saved with
+		"""
+		if content_format is None or (content_format == 'pickle' and compression is None):
+			return load_pickle(path=os.path.join(self._get_directory(entry=entry), 'content.pensieve'))
+		else:
+			return load_content(
+				path=os.path.join(self._get_directory(entry=entry), 'content'), content_format=content_format,
+				memory_map=memory_map, compression=compression
+			)
+
+	def remove(self, entry):
+		"""
+		removes every file of an entry
+		:type entry: str
+		"""
+		directory = self._get_directory(entry=entry)
+		if os.path.isdir(directory):
+			shutil.rmtree(directory, ignore_errors=True)
+
+	def commit(self):
+		"""
+		files are written in place, so there is nothing to commit
+		"""
+		pass
+
+	def close(self):
+		pass
@@ -0,0 +1,204 @@
+from .get_fingerprint import get_fingerprint, is_identity_fingerprint
+from .serializers import save_content, load_content, get_content_path
+from .compression import get_compression
+
+from threading import Lock
+import tempfile
+import os
+
+
+class ResultCache:
+	def __init__(self, directory, compression=None):
+		"""
+		a content-addressable cache of function results on disk: a result is filed under a digest of the fingerprint of
+		its function and the fingerprints of its precursor contents, so that any pensieve, in any process, that runs
+		the same function on the same inputs finds it
+		:param str directory: the cache directory
+		:param str or NoneType compression: the compression new results are written with
+		"""
+		if compression is not None:
+			get_compression(name=compression)
+		self._directory = str(directory)
+		self._compression = compression
+		os.makedirs(self._directory, exist_ok=True)
+		self._lock = Lock()
+		self._num_hits = 0
+		self._num_misses = 0
+		self._num_writes = 0
+		self._num_errors = 0
+		self._written_bytes = 0
+
+	def __getstate__(self):
+		return {key: value for key, value in self.__dict__.items() if key != '_lock'}
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self._lock = Lock()
+
+	@property
+	def directory(self):
+		return self._directory
+
+	@property
+	def compression(self):
+		return self._compression
+
+	@compression.setter
+	def compression(self, compression):
+		"""
+		results already in the cache are found whatever compression they were written with
+		:type compression: str or NoneType
+		"""
+		if compression is not None:
+			get_compression(name=compression)
+		self._compression = compression
+
+	@property
+	def statistics(self):
+		"""
+		:rtype: dict
+		"""
+		with self._lock:
+			lookups = self._num_hits + self._num_misses
+			return {
+				'hits': self._num_hits,
+				'misses': self._num_misses,
+				'hit_rate': self._num_hits / lookups if lookups > 0 else None,
+				'writes': self._num_writes,
+				'errors': self._num_errors,
+				'written_bytes': self._written_bytes
+			}
+
+	def _count(self, name, increment=1):
+		with self._lock:
+			setattr(self, name, getattr(self, name) + increment)
+
+	@staticmethod
+	def get_address(reference):
+		"""
+		:param str or tuple reference: a precursors reference, i.e., a function fingerprint, or a function fingerprint
+		and a dictionary of precursor fingerprints
+		:rtype: str
+		"""
+		return get_fingerprint(reference)
+
+	@staticmethod
+	def can_cache(reference):
+		"""
+		a result is not cached if any fingerprint in its reference stands for where an object is in memory, because
+		another object, in this process or another one, can be at the same place later
+		:param str or tuple reference: a precursors reference
+		:rtype: bool
+		"""
+		if isinstance(reference, tuple):
+			function_fingerprint, precursor_fingerprints = reference
+			fingerprints = [function_fingerprint, *precursor_fingerprints.values()]
+		else:
+			fingerprints = [reference]
+		return not any(is_identity_fingerprint(fingerprint) for fingerprint in fingerprints)
+
+	def _get_path(self, address):
+		"""
+		:return: path of the result without the extension of its format
+		:rtype: str
+		"""
+		# files are spread over subdirectories so that no directory gets too large
+		return os.path.join(self._directory, address[:2], address)
+
+	@staticmethod
+	def _get_index_path(path):
+		return f'{path}.index'
+
+	@classmethod
+	def _find_file(cls, path):
+		"""
+		reads the index of a result, which names its format and compression, so that a lookup opens one file rather
+		than looking for every combination of the two
+		:return: the format and compression of the file of a result, or None if there is no such file
+		:rtype: tuple[str, str or NoneType] or NoneType
+		"""
+		try:
+			with open(cls._get_index_path(path=path)) as file:
+				content_format, compression = file.read().split(',')
+		except (OSError, ValueError):
+			return None
+		return content_format, compression or None
+
+	@classmethod
+	def _write_index(cls, path, content_format, compression):
+		"""
+		written after the result is in place, and renamed into place itself, so that an index never points to a
+		partial result
+		:type path: str
+		:type content_format: str
+		:type compression: str or NoneType
+		"""
+		file_descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.', suffix='.tmp')
+		try:
+			with os.fdopen(file_descriptor, 'w') as file:
+				file.write(f'{content_format},{compression or ""}')
+			os.replace(temporary_path, cls._get_index_path(path=path))
+		except BaseException:
+			try:
+				os.remove(temporary_path)
+			except OSError:
+				pass
+			raise
+
+	def contains(self, reference):
+		"""
+		:rtype: bool
+		"""
+		if not self.can_cache(reference=reference):
+			return False
+		return self._find_file(path=self._get_path(address=self.get_address(reference=reference))) is not None
+
+	def get(self, reference):
+		"""
+		:return: whether the result is in the cache, and the result
+		:rtype: tuple[bool, object]
+		"""
+		if not self.can_cache(reference=reference):
+			return False, None
+		path = self._get_path(address=self.get_address(reference=reference))
+		found = self._find_file(path=path)
+		if found is not None:
+			content_format, compression = found
+			try:
+				content = load_content(path=path, content_format=content_format, compression=compression)
+			except Exception:
+				# files are renamed into place only when complete, so this is a file from an incompatible environment
+				self._count(name='_num_errors')
+			else:
+				self._count(name='_num_hits')
+				return True, content
+		self._count(name='_num_misses')
+		return False, None
+
+	def put(self, reference, content):
+		"""
+		writes a result unless it is already in the cache; the file appears atomically, so concurrent readers and
+		writers, and interrupted writes, never leave a partial result behind
+		:return: whether the result is in the cache
+		:rtype: bool
+		"""
+		if not self.can_cache(reference=reference):
+			return False
+		path = self._get_path(address=self.get_address(reference=reference))
+		if self._find_file(path=path) is not None:
+			return True
+
+		compression = self._compression
+		try:
+			content_format = save_content(path=path, content=content, compression=compression)
+			self._write_index(path=path, content_format=content_format, compression=compression)
+		except Exception:
+			self._count(name='_num_errors')
+			return False
+
+		with self._lock:
+			self._num_writes += 1
+			self._written_bytes += os.path.getsize(
+				get_content_path(path=path, content_format=content_format, compression=compression)
+			)
+		return True
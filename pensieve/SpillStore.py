@@ -0,0 +1,208 @@
+from .MemoryBudget import get_number_of_bytes
+from .serializers import save_content, load_content, get_content_path
+
+from chronometry import Timer, MeasurementSet
+
+from collections import OrderedDict
+from functools import partial
+from itertools import count
+from threading import Lock
+import os
+
+
+# before any content is faulted back in, reading from the spill directory is assumed to run at this many bytes per second
+_DEFAULT_READ_SPEED = 200 * 1024 ** 2
+
+
+class SpillStore:
+	def __init__(self, directory, budget=None):
+		"""
+		a disk tier for evicted contents that are expensive to recompute; numpy arrays and (with pyarrow) data frames
+		are written so that they are memory-mapped back instead of read in full
+		:param str directory: the spill directory
+		:param int or str or NoneType budget: maximum number of bytes on disk, the least recently used files go first
+		"""
+		self._directory = str(directory)
+		os.makedirs(self._directory, exist_ok=True)
+		self._budget = None if budget is None else get_number_of_bytes(budget)
+		self._entries = OrderedDict()
+		self._lock = Lock()
+		self._file_numbers = count(start=1)
+		self._spill_durations = MeasurementSet()
+		self._fault_durations = MeasurementSet()
+		self._num_discards = 0
+		self._faulted_bytes = 0
+		self._fault_seconds = 0.0
+
+	def __getstate__(self):
+		state = {key: value for key, value in self.__dict__.items() if key not in ('_lock', '_file_numbers')}
+		# the spilled files belong to the process that wrote them
+		state['_entries'] = OrderedDict()
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self._lock = Lock()
+		self._file_numbers = count(start=1)
+
+	@property
+	def directory(self):
+		return self._directory
+
+	@property
+	def spill_durations(self):
+		"""
+		:rtype: MeasurementSet
+		"""
+		return self._spill_durations
+
+	@property
+	def fault_durations(self):
+		"""
+		:rtype: MeasurementSet
+		"""
+		return self._fault_durations
+
+	@property
+	def used_bytes(self):
+		return sum(entry['size'] for entry in self._entries.values())
+
+	@property
+	def statistics(self):
+		"""
+		:rtype: dict
+		"""
+		with self._lock:
+			return {
+				'spill_budget': self._budget,
+				'spilled_bytes': self.used_bytes,
+				'spilled_memories': len(self._entries),
+				'spills': sum(measurement.count for measurement in self._spill_durations.measurements.values()),
+				'faults': sum(measurement.count for measurement in self._fault_durations.measurements.values()),
+				'spill_discards': self._num_discards
+			}
+
+	@property
+	def read_speed(self):
+		"""
+		bytes per second measured when faulting contents back in
+		:rtype: float
+		"""
+		if self._fault_seconds <= 0:
+			return _DEFAULT_READ_SPEED
+		return self._faulted_bytes / self._fault_seconds
+
+	def is_worth_spilling(self, size, evaluation_seconds):
+		"""
+		:param int size: size of the content in bytes
+		:param float or NoneType evaluation_seconds: time it takes to recompute the content, None if unknown
+		:rtype: bool
+		"""
+		if self._budget is not None and size > self._budget:
+			return False
+		return evaluation_seconds is None or evaluation_seconds > size / self.read_speed
+
+	def _write(self, key, content):
+		"""
+		:return: the path and the format of the file
+		:rtype: tuple[str, str]
+		"""
+		path = os.path.join(self._directory, f'{key}_{next(self._file_numbers)}')
+		content_format = save_content(path=path, content=content)
+		return get_content_path(path=path, content_format=content_format), content_format
+
+	@staticmethod
+	def _read(path, content_format):
+		# the path carries the extension of the format, which load_content adds again
+		return load_content(path=os.path.splitext(path)[0], content_format=content_format, memory_map=True)
+
+	@staticmethod
+	def _remove_files(paths):
+		for path in paths:
+			try:
+				os.remove(path)
+			except OSError:
+				pass
+
+	def _make_room(self):
+		"""
+		drops the least recently used entries until the spill directory is within budget
+		:return: paths of the dropped files
+		:rtype: list[str]
+		"""
+		paths = []
+		if self._budget is None:
+			return paths
+		used_bytes = self.used_bytes
+		while used_bytes > self._budget and len(self._entries) > 0:
+			_, entry = self._entries.popitem(last=False)
+			used_bytes -= entry['size']
+			paths.append(entry['path'])
+			self._num_discards += 1
+		return paths
+
+	def spill(self, key, content, generation=None):
+		"""
+		writes a content to the spill directory
+		:param str key: key of the memory
+		:param content: the content
+		:param int or NoneType generation: generation of the content; a content that is already spilled is not written again
+		:return: a function that loads the content back, or None if the content could not be spilled
+		:rtype: callable or NoneType
+		"""
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is not None and generation is not None and entry['generation'] == generation:
+				self._entries.move_to_end(key)
+				return partial(self.fault, key=key, path=entry['path'])
+
+		timer = Timer(start_now=True, unit='timedelta')
+		try:
+			path, content_format = self._write(key=key, content=content)
+		except Exception:
+			return None
+		timer.stop()
+
+		size = os.path.getsize(path)
+		with self._lock:
+			old_entry = self._entries.pop(key, None)
+			self._entries[key] = {'path': path, 'format': content_format, 'size': size, 'generation': generation}
+			self._spill_durations.add_measurement(name=key, timer=timer)
+			paths_to_remove = self._make_room()
+		if old_entry is not None:
+			paths_to_remove.append(old_entry['path'])
+		self._remove_files(paths=paths_to_remove)
+
+		if path in paths_to_remove:
+			return None
+		return partial(self.fault, key=key, path=path)
+
+	def fault(self, key, path):
+		"""
+		loads a spilled content back
+		:raises KeyError: if the file was dropped to stay within the spill budget
+		"""
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is None or entry['path'] != path:
+				raise KeyError(f'"{key}" is no longer in the spill directory')
+			# the file is kept: it backs the memory-mapped content and saves a write if the content is evicted again
+			self._entries.move_to_end(key)
+
+		timer = Timer(start_now=True, unit='timedelta')
+		content = self._read(path=path, content_format=entry['format'])
+		timer.stop()
+		with self._lock:
+			self._fault_durations.add_measurement(name=key, timer=timer)
+			self._faulted_bytes += entry['size']
+			self._fault_seconds += timer.duration.total_seconds()
+		return content
+
+	def discard(self, key):
+		"""
+		:param str key: key of a memory whose spilled content is no longer needed
+		"""
+		with self._lock:
+			entry = self._entries.pop(key, None)
+		if entry is not None:
+			self._remove_files(paths=[entry['path']])
@@ -0,0 +1,167 @@
+from .exceptions import MemoryRecursionError
+from .CopyOnWriteDict import CopyOnWriteDict
+
+
+class TopologicalOrder:
+	def __init__(self, precursor_keys, successor_keys):
+		"""
+		a topological order of the memories that is kept up to date as edges are added, after Pearce and Kelly: adding
+		an edge that already agrees with the order costs nothing, and otherwise only the memories between its two ends
+		in the order are visited and moved; an edge that would close a loop is found by the same search
+		:param dict[str, list[str]] precursor_keys: the precursors of each memory, read but never changed
+		:param dict[str, list[str]] successor_keys: the successors of each memory, read but never changed
+		"""
+		self._precursor_keys = precursor_keys
+		self._successor_keys = successor_keys
+		self._positions = {}
+		self._next_position = 0
+		# bit sets of ancestors, built when first needed and dropped when an edge is added
+		self._ancestor_bits = None
+
+		# Kahn's algorithm for the memories that are already there
+		in_degrees = {key: len(keys) for key, keys in precursor_keys.items()}
+		ready = [key for key, in_degree in in_degrees.items() if in_degree == 0]
+		while len(ready) > 0:
+			key = ready.pop()
+			self.add(key=key)
+			for successor_key in successor_keys.get(key, []):
+				in_degrees[successor_key] -= 1
+				if in_degrees[successor_key] == 0:
+					ready.append(successor_key)
+		if len(self._positions) < len(in_degrees):
+			raise MemoryRecursionError('Pensieve: the memories have a loop!')
+
+	def snapshot(self, precursor_keys, successor_keys):
+		"""
+		the same order, in constant time, for a snapshot of the memories; the positions are shared copy-on-write
+		:param dict[str, list[str]] precursor_keys: the precursors of each memory in the snapshot
+		:param dict[str, list[str]] successor_keys: the successors of each memory in the snapshot
+		:rtype: TopologicalOrder
+		"""
+		if not isinstance(self._positions, CopyOnWriteDict):
+			self._positions = CopyOnWriteDict(dictionary=self._positions)
+		result = self.__class__.__new__(self.__class__)
+		result._precursor_keys = precursor_keys
+		result._successor_keys = successor_keys
+		result._positions = self._positions.snapshot()
+		result._next_position = self._next_position
+		result._ancestor_bits = None
+		return result
+
+	def __contains__(self, key):
+		return key in self._positions
+
+	def add(self, key):
+		"""
+		puts a memory without edges at the end of the order
+		:type key: str
+		"""
+		if key not in self._positions:
+			self._positions[key] = self._next_position
+			self._next_position += 1
+			self._ancestor_bits = None
+
+	def remove(self, key):
+		"""
+		:type key: str
+		"""
+		self._positions.pop(key, None)
+		self._ancestor_bits = None
+
+	def forget_ancestors(self):
+		"""
+		drops the bit sets of ancestors, e.g., after edges are removed; the order itself stays valid
+		"""
+		self._ancestor_bits = None
+
+	def _search(self, start_key, neighbour_keys, is_within_bounds):
+		"""
+		:param dict[str, list[str]] neighbour_keys: successors for a forward search, precursors for a backward one
+		:param callable is_within_bounds: takes a position and returns True if the search should go there
+		:return: the keys visited
+		:rtype: list[str]
+		"""
+		visited = {start_key}
+		to_visit = [start_key]
+		result = []
+		while len(to_visit) > 0:
+			key = to_visit.pop()
+			result.append(key)
+			for neighbour_key in neighbour_keys.get(key, []):
+				if neighbour_key not in visited and is_within_bounds(self._positions[neighbour_key]):
+					visited.add(neighbour_key)
+					to_visit.append(neighbour_key)
+		return result
+
+	def add_edge(self, precursor_key, successor_key):
+		"""
+		moves memories, if needed, so that the precursor comes before the successor;
+		the order is not changed if the edge would close a loop
+		:type precursor_key: str
+		:type successor_key: str
+		:raises MemoryRecursionError: if the successor is the precursor or one of its ancestors
+		"""
+		if precursor_key == successor_key:
+			raise MemoryRecursionError(f'Pensieve: "{successor_key}" cannot be its own precursor!')
+		self._ancestor_bits = None
+		lower_bound = self._positions[successor_key]
+		upper_bound = self._positions[precursor_key]
+		if upper_bound < lower_bound:
+			return
+
+		# the descendants of the successor and the ancestors of the precursor that are between the two in the order
+		forward = self._search(
+			start_key=successor_key, neighbour_keys=self._successor_keys,
+			is_within_bounds=lambda position: position <= upper_bound
+		)
+		if precursor_key in forward:
+			raise MemoryRecursionError(
+				f'Pensieve: "{successor_key}" is an ancestor memory of its precursor: "{precursor_key}"!'
+			)
+		backward = self._search(
+			start_key=precursor_key, neighbour_keys=self._precursor_keys,
+			is_within_bounds=lambda position: position >= lower_bound
+		)
+
+		# the ancestors take the smallest of the positions the two sets held, in their old order, then the descendants
+		backward.sort(key=self._positions.__getitem__)
+		forward.sort(key=self._positions.__getitem__)
+		positions = sorted(self._positions[key] for key in backward + forward)
+		for key, position in zip(backward + forward, positions):
+			self._positions[key] = position
+
+	def get_sorted_keys(self):
+		"""
+		:return: every memory after its precursors
+		:rtype: list[str]
+		"""
+		return sorted(self._positions, key=self._positions.__getitem__)
+
+	def _get_ancestor_bits(self):
+		"""
+		:return: the index of each memory and a bit set of the indices of its ancestors
+		:rtype: tuple[dict[str, int], dict[str, int]]
+		"""
+		if self._ancestor_bits is None:
+			indices = {}
+			bits = {}
+			for key in self.get_sorted_keys():
+				indices[key] = len(indices)
+				key_bits = 0
+				for precursor_key in self._precursor_keys.get(key, []):
+					key_bits |= bits[precursor_key] | (1 << indices[precursor_key])
+				bits[key] = key_bits
+			self._ancestor_bits = indices, bits
+		return self._ancestor_bits
+
+	def is_ancestor(self, ancestor_key, key):
+		"""
+		answers from bit sets of ancestors, which are built in one pass over the order when first needed
+		:type ancestor_key: str
+		:type key: str
+		:rtype: bool
+		"""
+		if self._positions[ancestor_key] >= self._positions[key]:
+			return False
+		indices, bits = self._get_ancestor_bits()
+		return bool(bits[key] >> indices[ancestor_key] & 1)
@@ -1,27 +1,78 @@
-from .Memory import Memory
+from .Memory import Memory, is_computing_flight
 from .create_pensieve_function import create_pensieve_function
 from .exceptions import *
 from .get_schedule import get_schedule
+from .invalidate import invalidate
+from .get_stale_dependencies import get_stale_dependencies
+from .execute_jobs import execute_jobs
+from .critical_path import get_durations, get_critical_paths, simulate_makespan
+from .MemoryBudget import MemoryBudget
+from .SpillStore import SpillStore
+from .ResultCache import ResultCache
+from .compression import get_compression
+from .PensieveDirectory import PensieveDirectory
+from .PensieveArchive import PensieveArchive
+from .TopologicalOrder import TopologicalOrder
+from .CopyOnWriteDict import CopyOnWriteDict, prepare_change
 
 from slytherin.collections import remove_list_duplicates
 from slytherin import get_function_arguments
 from chronometry import MeasurementSet, convert
 from chronometry.progress import ProgressBar
-from joblib import Parallel
-from joblib import delayed
 
-from toposort import toposort
 import warnings
 from disk import Path
+from pandas import DataFrame
 from abstract import Graph
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, as_completed
+from threading import local, Lock
+from weakref import finalize, ref
+from functools import partial
+import asyncio
+import os
 import re
 
 
+_WORKER_STATE = local()
+
+
+def _is_worker_thread():
+	return getattr(_WORKER_STATE, 'is_worker', False)
+
+
+def _must_not_wait_for_pool():
+	"""
+	workers, and threads computing flights that workers may be waiting for, run jobs in place because waiting for
+	the pool could deadlock it
+	:rtype: bool
+	"""
+	return _is_worker_thread() or is_computing_flight()
+
+
+def _run_as_worker(function, *args, **kwargs):
+	_WORKER_STATE.is_worker = True
+	return function(*args, **kwargs)
+
+
+def _copy_memory(memory, pensieve_reference):
+	"""
+	a shallow copy of a memory for a snapshot, which holds it weakly so that the two do not keep each other alive
+	:type memory: Memory
+	:type pensieve_reference: weakref.ref
+	:rtype: Memory
+	"""
+	result = memory.shallow_copy()
+	result._pensieve = pensieve_reference()
+	return result
+
+
 class PensieveWithoutDisplay:
 	def __init__(
 			self, name='Pensieve', function_durations=None, hide_ignored=False,
 			graph_direction='LR', num_threads=1, lazy=False, materialize=True, backup=False, echo=0,
-			n_jobs=1, show_types=True, line_width_by_type=False, line_width=1
+			n_jobs=1, show_types=True, line_width_by_type=False, line_width=1, scheduler='dependencies',
+			executor='thread', memory_budget=None, spill=False, spill_budget=None,
+			content_formats=None, compression=None
 	):
 		"""
 		:param str		name:				a name for pensieve
@@ -35,17 +86,63 @@ class PensieveWithoutDisplay:
 		:param bool or int or ProgressBar 			echo: 					int or ProgressBar or bool
 		:param bool line_width_by_type: if True, the line width of graph edges will be chosen by type of objects
 		:param int or float line_width: width of the line
+		:param str scheduler: when num_threads != 1, 'dependencies' starts each memory as soon as its precursors are
+		done while 'rounds' evaluates the update schedule one round at a time
+		:param str executor: when num_threads != 1, 'thread' runs memory functions in worker threads while 'process'
+		ships them with their precursor contents to worker processes, which helps cpu-bound pure python functions;
+		functions that dill cannot serialize fall back to threads
+		:param int or str or NoneType memory_budget: maximum total size of materialized contents, e.g., '8GB';
+		when it is exceeded, contents that free the most bytes per second of recomputation are evicted and
+		recomputed when needed; frozen and pinned memories are never evicted
+		:param bool or str backup: a directory (True for 'pensieve') for a cache of function results on disk; a memory
+		whose function and precursor contents match a cached result, even one from another process, is not recomputed
+		:param bool or str spill: a spill directory (True for 'pensieve_spill'); evicted contents that take longer to
+		recompute than to read back are written there and faulted back in when needed
+		:param int or str or NoneType spill_budget: maximum size of the spill directory; least recently used files go first
+		:param list[str] or NoneType content_formats: formats to try first when contents are written to disk,
+		e.g., ['parquet'] for smaller data frame files; by default numpy arrays go to .npy, data frames to
+		memory-mappable feather files if pyarrow is installed, bytes and strings to raw files, and the rest to pickle
+		:param str or NoneType compression: 'zlib', 'lz4', or 'zstd' to compress contents as they are saved and
+		backed up; lz4 and zstd need their packages, and compressed contents are read rather than memory-mapped
 		"""
+		if scheduler not in ('dependencies', 'rounds'):
+			raise ValueError(f'Unsupported scheduler: {scheduler}')
+		if executor not in ('thread', 'process'):
+			raise ValueError(f'Unsupported executor: {executor}')
 		self._graph_direction = None
 		self.set_graph_direction(graph_direction)
 		self._memories_dictionary = {}
 		self._precursor_keys = {}
 		self._successor_keys = {}
+		self._topological_order = None
 		self._name = name
 		self._function_durations = function_durations or MeasurementSet()
 		self._hide_ignored = hide_ignored
 		self._num_intermediary_nodes = 0
 		self._num_threads = num_threads
+		self._scheduler = scheduler
+		self._executor = executor
+		self._content_formats = content_formats
+		if compression is not None:
+			get_compression(name=compression)
+		self._compression = compression
+		if spill and memory_budget is None:
+			raise ValueError('Pensieve: spilling to disk needs a memory_budget!')
+		if spill:
+			if isinstance(spill, bool):
+				spill = 'pensieve_spill'
+			spill_store = SpillStore(directory=spill, budget=spill_budget)
+		else:
+			spill_store = None
+		if memory_budget is None:
+			self._memory_budget = None
+		else:
+			self._memory_budget = MemoryBudget(budget=memory_budget, spill_store=spill_store)
+		self._thread_pool = None
+		self._process_pool = None
+		self._pool_lock = Lock()
+		# the archive a lazy load reads contents from, closed with the pensieve
+		self._storage = None
 		self._lazy = lazy
 		self._materialize_memories = materialize
 		self._echo = echo
@@ -56,23 +153,26 @@ class PensieveWithoutDisplay:
 				backup = 'pensieve'
 			self._backup_directory = Path(backup)
 			self._backup_directory.make_dir(ignore_if_exists=True)
-			self._backup_memory_directory = self.backup_directory.make_dir(name='memories', ignore_if_exists=True)
+			self._result_cache = ResultCache(
+				directory=os.path.join(self._backup_directory.path, 'results'), compression=compression
+			)
 
 		else:
 			self._backup_directory = None
-			self._backup_memory_directory = None
+			self._result_cache = None
 
 		self._line_width_by_type = line_width_by_type
 		self._line_width = line_width
 
-	_PARAMETERS_ = ['name', 'function_durations', 'hide_ignored', 'precursor_keys', 'successor_keys']
+	_PARAMETERS_ = ['name', 'function_durations', 'hide_ignored', 'precursor_keys', 'successor_keys', 'compression']
 	_STATE_ATTRIBUTES_ = [
 		'_graph_direction', '_name',
 		'_memories_dictionary', '_precursor_keys', '_successor_keys',
-		'_function_durations', '_directory', '_hide_ignored',
-		'_num_intermediary_nodes', '_num_threads', '_evaluate', '_lazy', '_echo',
-		'_backup_directory', '_backup_memory_directory',
-		'_line_width_by_type', '_line_width'
+		'_function_durations', '_hide_ignored',
+		'_num_intermediary_nodes', '_num_threads', '_lazy', '_materialize_memories', '_n_jobs', '_show_types', '_echo',
+		'_backup_directory', '_result_cache',
+		'_line_width_by_type', '_line_width', '_scheduler', '_executor',
+		'_memory_budget', '_content_formats', '_compression'
 	]
 
 	def __getstate__(self):
@@ -91,11 +191,11 @@ class PensieveWithoutDisplay:
 			'_hide_ignored': False,
 			'_num_intermediary_nodes': 0,
 			'_num_threads': 1,
-			'_materialize': True,
+			'_materialize_memories': True,
 			'_lazy': False,
 			'_echo': 0,
 			'_backup_directory': None,
-			'_backup_memory_directory': None
+			'_result_cache': None
 		}
 		return result
 
@@ -112,7 +212,16 @@ class PensieveWithoutDisplay:
 				setattr(self, key, None)
 		for memory in self.memories_dictionary.values():
 			memory._pensieve = self
-		self._directory._pensieve = self
+		self._invalidate_descendants_of_stale_memories()
+		if self._memory_budget is not None:
+			for memory in self.memories_dictionary.values():
+				if memory._materialize_memory and not memory.is_evicted:
+					self._memory_budget.record(memory=memory)
+		self._topological_order = None
+		self._thread_pool = None
+		self._process_pool = None
+		self._pool_lock = Lock()
+		self._storage = None
 
 	def be_lazy(self):
 		self._lazy = True
@@ -138,20 +247,233 @@ class PensieveWithoutDisplay:
 	@property
 	def processor(self):
 		"""
-		:rtype: NoneType or Parallel
+		takes joblib-style delayed calls, runs them on the persistent thread pool, and returns their results in order
+		:rtype: callable
+		"""
+		return self._process_delayed_calls
+
+	def _process_delayed_calls(self, delayed_calls):
+		"""
+		:param delayed_calls: iterable of (function, args, kwargs) tuples as produced by joblib.delayed
+		:rtype: list
+		"""
+		if _must_not_wait_for_pool():
+			return [function(*args, **kwargs) for function, args, kwargs in delayed_calls]
+		futures = [
+			self.thread_pool.submit(_run_as_worker, function, *args, **kwargs)
+			for function, args, kwargs in delayed_calls
+		]
+		return [future.result() for future in futures]
+
+	@property
+	def num_threads(self):
+		"""
+		:rtype: int
+		"""
+		return self._num_threads
+
+	@num_threads.setter
+	def num_threads(self, num_threads):
+		"""
+		:type num_threads: int
+		"""
+		if num_threads != self._num_threads:
+			self._num_threads = num_threads
+			# the pools are created again, with the new size, when they are needed next
+			self._shutdown_pools(wait=False)
+
+	@property
+	def compression(self):
+		"""
+		:rtype: str or NoneType
+		"""
+		return self._compression
+
+	@compression.setter
+	def compression(self, compression):
+		"""
+		contents are compressed with it from the next save on; memories with a compression of their own keep it
+		:type compression: str or NoneType
+		"""
+		if compression is not None:
+			get_compression(name=compression)
+		self._compression = compression
+		if self._result_cache is not None:
+			self._result_cache.compression = compression
+
+	def set_compression(self, memory, compression):
+		"""
+		:type memory: Memory or str
+		:param str or bool or NoneType compression: 'zlib', 'lz4', or 'zstd'; False for none;
+		None to use the pensieve's compression
+		"""
+		memory_key, memory = self._get_key_and_memory(x=memory)
+		memory.set_compression(compression=compression)
+
+	def _shutdown_pools(self, wait=True):
+		with self._pool_lock:
+			pools = [pool for pool in (self._thread_pool, self._process_pool) if pool is not None]
+			self._thread_pool = None
+			self._process_pool = None
+		for pool in pools:
+			pool.shutdown(wait=wait)
+
+	def close(self):
+		"""
+		shuts down the worker pools and closes the archive a lazy load reads from; the pools are created again if the
+		pensieve evaluates in parallel later, and the archive is opened again if a content is read from it
+		"""
+		self._shutdown_pools(wait=not _is_worker_thread())
+		storage, self._storage = self._storage, None
+		if storage is not None:
+			storage.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_val, exc_tb):
+		self.close()
+
+	@property
+	def num_workers(self):
+		"""
+		number of worker threads; like joblib, -1 means all cpus, -2 all cpus but one, and so on
+		:rtype: int
+		"""
+		if self._num_threads is None or self._num_threads >= 1:
+			return self._num_threads or 1
+		return max(1, (os.cpu_count() or 1) + 1 + self._num_threads)
+
+	@property
+	def thread_pool(self):
+		"""
+		a pool of worker threads that is created on first use and kept for later evaluations
+		:rtype: ThreadPoolExecutor
+		"""
+		with self._pool_lock:
+			if self._thread_pool is None:
+				self._thread_pool = ThreadPoolExecutor(max_workers=self.num_workers, thread_name_prefix='pensieve')
+				# a pensieve that is never closed does not keep its threads after it is garbage collected
+				finalize(self, self._thread_pool.shutdown, wait=False)
+			return self._thread_pool
+
+	@property
+	def process_pool(self):
+		"""
+		a pool of worker processes that is created on first use and kept for later evaluations
+		:rtype: ProcessPoolExecutor
+		"""
+		with self._pool_lock:
+			if self._process_pool is None:
+				self._process_pool = ProcessPoolExecutor(max_workers=self.num_workers)
+				finalize(self, self._process_pool.shutdown, wait=False)
+			return self._process_pool
+
+	def _get_job_content(self, memory):
+		"""
+		evaluates a memory inside a worker thread, in a worker process if the executor is 'process'
+		:type memory: Memory
+		"""
+		_WORKER_STATE.is_worker = True
+		if self._executor == 'process':
+			return memory.get_content(process_pool=self.process_pool)
+		else:
+			return memory.content
+
+	def get_update_jobs(self, keys):
+		"""
+		stale memories that need to be evaluated to get the memories of keys, in topological order
+		:type keys: list[str]
+		:rtype: list[Memory]
 		"""
-		return Parallel(n_jobs=self._num_threads, backend='threading', require='sharedmem')
+		memories = [self.memories_dictionary[key] for key in keys]
+		jobs = get_stale_dependencies(memories=memories)
+		job_keys = {job.key for job in jobs}
+		for memory in memories:
+			if memory.is_stale and memory.key not in job_keys:
+				jobs.append(memory)
+				job_keys.add(memory.key)
+		return jobs
 
 	def get_update_schedule(self, keys):
-		jobs = []
-		for key in keys:
-			for job in self.memories_dictionary[key].stale_dependencies:
-				if job not in jobs:
-					jobs.append(job)
-		for key in keys:
-			if self.memories_dictionary[key].is_stale:
-				jobs.append(self.memories_dictionary[key])
-		return get_schedule(jobs=jobs)
+		"""
+		:type keys: list[str]
+		:rtype: list[list[Memory]]
+		"""
+		return get_schedule(jobs=self.get_update_jobs(keys=keys))
+
+	def _evaluate_in_rounds(self, jobs, progress_bar):
+		"""
+		:type jobs: list[Memory]
+		:type progress_bar: ProgressBar
+		"""
+		schedule = get_schedule(jobs=jobs)
+		progress_amount = 0
+		for schedule_round in schedule:
+			progress_bar.show(amount=progress_amount, text=f'updating {len(schedule_round)} memories')
+			futures = [self.thread_pool.submit(self._get_job_content, job) for job in schedule_round]
+			wait(futures)
+			for future in futures:
+				future.result()
+			progress_amount += len(schedule_round)
+		if progress_amount > 0:
+			progress_bar.show(amount=progress_amount, text='memories updated!')
+
+	def _evaluate_as_ready(self, jobs, progress_bar):
+		"""
+		:type jobs: list[Memory]
+		:type progress_bar: ProgressBar
+		"""
+		progress = {'amount': 0}
+
+		def submit(job):
+			return self.thread_pool.submit(self._get_job_content, job)
+
+		def on_done(job, content):
+			progress['amount'] += 1
+			progress_bar.show(amount=progress['amount'], text=f'"{job.key}" updated')
+
+		if len(jobs) > 0:
+			progress_bar.show(amount=0, text=f'updating {len(jobs)} memories')
+		# the memories at the head of the longest remaining chains start first
+		durations = get_durations(jobs=jobs, function_durations=self.function_durations)
+		execute_jobs(
+			jobs=jobs, submit=submit, max_in_flight=self.num_workers, on_done=on_done,
+			priorities=get_critical_paths(jobs=jobs, durations=durations)
+		)
+
+	def simulate_evaluation(self, keys=None, num_threads=None, only_stale=True, default_duration=None):
+		"""
+		predicts the makespan of evaluating memories from their recorded durations, without running anything
+		:type keys: list[str] or NoneType or str
+		:param int or NoneType num_threads: number of workers to simulate, the pensieve's own if None
+		:param bool only_stale: if False, all memories needed for keys are simulated as if they were stale
+		:param float or NoneType default_duration: seconds for memories without measurements, the median if None
+		:return: predicted makespan in seconds
+		:rtype: float
+		"""
+		if keys is None:
+			keys = list(self.memories_dictionary.keys())
+		elif isinstance(keys, str):
+			keys = [keys]
+
+		if only_stale:
+			jobs = self.get_update_jobs(keys=keys)
+		else:
+			jobs = [self.memories_dictionary[key] for key in keys]
+			for key in keys:
+				jobs += self.get_ancestors(memory=key)
+
+		if num_threads is None:
+			num_workers = self.num_workers
+		elif num_threads < 1:
+			num_workers = max(1, (os.cpu_count() or 1) + 1 + num_threads)
+		else:
+			num_workers = num_threads
+		durations = get_durations(
+			jobs=jobs, function_durations=self.function_durations, default_duration=default_duration
+		)
+		return simulate_makespan(jobs=jobs, durations=durations, num_workers=num_workers)
 
 	def evaluate(self, keys=None, output=False):
 		"""
@@ -165,35 +487,57 @@ class PensieveWithoutDisplay:
 		elif isinstance(keys, str):
 			keys = [keys]
 
-		if self._num_threads == 1:
+		if self._num_threads == 1 or _must_not_wait_for_pool():
+			# inside a worker, or a flight that workers may wait for, memories are evaluated in place
 			if output:
 				return [self[key] for key in keys]
 			else:
 				for key in keys:
 					self.memories_dictionary[key].evaluate()
 		else:
-			def get_content(p):
-				return p.content
+			jobs = self.get_update_jobs(keys=keys)
+			progress_bar = ProgressBar(total=len(jobs), echo=self._echo)
+			if self._scheduler == 'rounds':
+				self._evaluate_in_rounds(jobs=jobs, progress_bar=progress_bar)
+			else:
+				self._evaluate_as_ready(jobs=jobs, progress_bar=progress_bar)
 
-			memories = [self.memories_dictionary[key] for key in keys]
-			schedule = self.get_update_schedule(keys=keys)
+			if output:
+				memories = [self.memories_dictionary[key] for key in keys]
+				return list(self.thread_pool.map(self._get_job_content, memories))
 
-			progress_bar = ProgressBar(
-				total=sum([len(schedule_round) for schedule_round in schedule]),
-				echo=self._echo
-			)
+	async def evaluate_async(self, keys=None, output=False):
+		"""
+		evaluates multiple memories on the running event loop: coroutine functions of independent memories are awaited
+		concurrently while other functions are offloaded to the thread pool so that they do not block the loop
+		:type keys: list[str] or NoneType or str
+		:type output: bool
+		:rtype: list or NoneType
+		"""
+		if keys is None:
+			keys = list(self.memories_dictionary.keys())
+		elif isinstance(keys, str):
+			keys = [keys]
 
-			progress_amount = 0
-			for schedule_round in schedule:
-				progress_bar.show(amount=progress_amount, text=f'updating {len(schedule_round)} memories')
-				self.processor(delayed(get_content)(job) for job in schedule_round)
-				progress_amount += len(schedule_round)
-			if progress_amount > 0:
-				progress_bar.show(amount=progress_amount, text=f'{self.key} updated!')
+		jobs = self.get_update_jobs(keys=keys)
+		progress_bar = ProgressBar(total=len(jobs), echo=self._echo)
+		progress = {'amount': 0}
+		tasks = {}
 
-			contents = self.processor(delayed(get_content)(p) for p in memories)
-			if output:
-				return list(contents)
+		async def evaluate_job(job):
+			await asyncio.gather(*[tasks[key] for key in job.precursor_keys if key in tasks])
+			await job.get_content_async(executor=self.thread_pool)
+			progress['amount'] += 1
+			progress_bar.show(amount=progress['amount'], text=f'"{job.key}" updated')
+
+		# jobs are in topological order so the tasks of the precursors of a job are created before its own task
+		for job in jobs:
+			tasks[job.key] = asyncio.ensure_future(evaluate_job(job))
+		await asyncio.gather(*tasks.values())
+
+		if output:
+			memories = [self.memories_dictionary[key] for key in keys]
+			return list(await asyncio.gather(*[memory.get_content_async(executor=self.thread_pool) for memory in memories]))
 
 	@property
 	def backup_directory(self):
@@ -203,14 +547,17 @@ class PensieveWithoutDisplay:
 		return self._backup_directory
 
 	@property
-	def backup_memory_directory(self):
+	def result_cache(self):
 		"""
-		:rtype: Path or NoneType
+		the on-disk cache of function results that backup=True turns on
+		:rtype: ResultCache or NoneType
 		"""
-		return self._backup_memory_directory
+		return self._result_cache
 
 	def __add__(self, other):
 		"""
+		merges two pensieves; memories are shared copy-on-write with the operands, and a memory is stale in the result
+		only if it is stale in its operand or one of its precursors is replaced by one with a different content
 		:type other: Pensieve
 		:rtype: Pensieve
 		"""
@@ -218,68 +565,57 @@ class PensieveWithoutDisplay:
 			function_durations=self.function_durations,
 			hide_ignored=self._hide_ignored, graph_direction=self._graph_direction
 		)
-		memories_dictionary = {}
-		precursor_keys = {}
-		successor_keys = {}
-		stales = []
-
-		for key in set(self.memories_dictionary.keys()).union(set(other.memories_dictionary.keys())):
-
-			if key in self.memories_dictionary and key not in other.memories_dictionary:
-				new_memory = self.memories_dictionary[key].partial_copy(
-					include_function=True, include_precursor_reference=False,
-					stale=self.memories_dictionary[key].is_stale
-				)
-				precursor_keys[key] = self._precursor_keys[key].copy()
-				successor_keys[key] = self._successor_keys[key].copy()
-				if self.memories_dictionary[key].is_stale:
-					stales.append(key)
-
-			elif key in other.memories_dictionary and key not in self.memories_dictionary:
-				new_memory = other.memories_dictionary[key].partial_copy(
-					include_function=True, include_precursor_reference=False,
-					stale=other.memories_dictionary[key].is_stale
-				)
-				precursor_keys[key] = other._precursor_keys[key].copy()
-				successor_keys[key] = other._successor_keys[key].copy()
-				if other.memories_dictionary[key].is_stale:
-					stales.append(key)
 
+		# the operand each memory is taken from
+		sources = {}
+		for key, left_memory in self.memories_dictionary.items():
+			right_memory = other.memories_dictionary.get(key)
+			if right_memory is None or not right_memory.has_precursors:
+				sources[key] = self
+			elif not left_memory.has_precursors:
+				sources[key] = other
+			elif left_memory.has_same_definition(other=right_memory):
+				# either one will do, so the one that is up to date is taken
+				sources[key] = other if left_memory.is_stale and not right_memory.is_stale else self
 			else:
-				left_memory = self.memories_dictionary[key]
-				right_memory = other.memories_dictionary[key]
-
-				if not right_memory.has_precursors:
-					new_memory = left_memory.partial_copy(
-						include_function=True, include_precursor_reference=False, stale=True
-					)
-					precursor_keys[key] = self._precursor_keys[key].copy()
-
-				elif not left_memory.has_precursors:
-					new_memory = right_memory.partial_copy(
-						include_function=True, include_precursor_reference=False, stale=True
-					)
-					precursor_keys[key] = other._precursor_keys[key].copy()
-
-				else:
-					raise PensieveError(f'memory "{key}" has precursors in both pensieves')
-
-				stales.append(key)
-
-				successor_keys[key] = self._successor_keys[key].copy()
-				for x in other._successor_keys[key]:
-					if x not in successor_keys[key]:
-						successor_keys[key].append(x)
+				raise PensieveError(f'memory "{key}" has different precursors or functions in the two pensieves')
+		for key in other.memories_dictionary.keys():
+			if key not in sources:
+				sources[key] = other
 
+		memories_dictionary = {}
+		precursor_keys = {}
+		successor_keys = {key: [] for key in sources}
+		for key, source in sources.items():
+			new_memory = source.memories_dictionary[key].shallow_copy()
 			new_memory._pensieve = new_pensieve
 			memories_dictionary[key] = new_memory
+			precursor_keys[key] = source._precursor_keys[key].copy()
+			for precursor_key in precursor_keys[key]:
+				successor_keys[precursor_key].append(key)
 
 		new_pensieve._precursor_keys = precursor_keys
 		new_pensieve._successor_keys = successor_keys
 		new_pensieve._memories_dictionary = memories_dictionary
-		for stale in stales:
-			new_pensieve._memories_dictionary[stale].mark_stale()
 
+		# a memory whose precursor comes from the other operand stays up to date only if the contents match
+		stales = []
+		for key, source in sources.items():
+			new_memory = memories_dictionary[key]
+			if new_memory.is_stale:
+				continue
+			for precursor_key in precursor_keys[key]:
+				if sources[precursor_key] is source:
+					continue
+				precursor = memories_dictionary[precursor_key]
+				if not precursor.has_same_content(other=source.memories_dictionary[precursor_key]):
+					stales.append(new_memory)
+					break
+				if new_memory._precursor_generations is not None:
+					new_memory._precursor_generations = {
+						**new_memory._precursor_generations, precursor_key: precursor._generation
+					}
+		invalidate(memories=stales)
 		return new_pensieve
 
 	def __hashkey__(self):
@@ -292,10 +628,30 @@ class PensieveWithoutDisplay:
 	def parameters(self):
 		return {param: getattr(self, f'_{param}') for param in self._PARAMETERS_}
 
-	def save(self, path, echo=None):
+	@staticmethod
+	def _get_storage(path, archive=None):
+		"""
+		:type path: str or Path
+		:param bool or NoneType archive: True for a single archive file, False for a directory,
+		None for an archive only if one already exists at the path
+		:rtype: PensieveDirectory or PensieveArchive
+		"""
+		path = Path(path=path).path
+		if archive is None:
+			archive = PensieveArchive.is_archive(path=path)
+		return PensieveArchive(path=path) if archive else PensieveDirectory(path=path)
+
+	def save(self, path, echo=None, incremental=True, num_threads=4, archive=None):
 		"""
 		:type path: str or Path
 		:type echo: bool
+		:param bool incremental: if True, only the files of memories whose content, function, or parameters changed
+		since they were last saved to, or loaded from, the same path are written
+		:param int num_threads: maximum number of memories written at the same time
+		:param bool or NoneType archive: if True, the pensieve is saved in a single indexed file rather than a
+		directory; by default, an archive is used only if the path already is one
+		:return: the number of memory files written
+		:rtype: int
 		"""
 		if echo is None:
 			echo = self._echo
@@ -303,48 +659,138 @@ class PensieveWithoutDisplay:
 		progress_bar = ProgressBar(total=len(self.memories_dictionary)+2, echo=echo)
 		progress_amount = 0
 
-		path = Path(path=path)
-		path.make_dir()
-
-		progress_bar.show(amount=progress_amount, text='saving parameters')
-		(path + 'parameters.pensieve').save(obj=self.parameters)
-		progress_amount += 1
-
-		memory_keys = []
+		storage = self._get_storage(path=path, archive=archive)
+		try:
+			progress_bar.show(amount=progress_amount, text='saving parameters')
+			storage.save_object(entry=None, name='parameters', obj=self.parameters)
+			progress_amount += 1
 
-		for key, memory in self.memories_dictionary.items():
-			progress_bar.show(amount=progress_amount, text=f'saving "{key}" memory')
-			memory.save(path=path + key)
+			try:
+				previous_memory_keys = storage.load_object(entry=None, name='memory_keys')
+			except Exception:
+				previous_memory_keys = []
+
+			memory_keys = list(self.memories_dictionary.keys())
+			num_files = 0
+			with ThreadPoolExecutor(max_workers=max(1, num_threads)) as executor:
+				futures = {
+					executor.submit(memory.save, path=key, incremental=incremental, storage=storage): key
+					for key, memory in self.memories_dictionary.items()
+				}
+				for future in as_completed(futures):
+					num_files += future.result()
+					progress_bar.show(amount=progress_amount, text=f'saved "{futures[future]}" memory')
+					progress_amount += 1
+
+			progress_bar.show(amount=progress_amount, text=f'saving memory keys')
+			storage.save_object(entry=None, name='memory_keys', obj=memory_keys)
 			progress_amount += 1
-			memory_keys.append(key)
 
-		progress_bar.show(amount=progress_amount, text=f'saving memory keys')
-		(path + 'memory_keys.pensieve').save(obj=memory_keys)
-		progress_amount += 1
+			# memories that were erased since the last save are not part of the pensieve anymore
+			for key in set(previous_memory_keys).difference(memory_keys):
+				storage.remove(entry=key)
+			storage.commit()
+		finally:
+			storage.close()
 
 		progress_bar.show(amount=progress_amount)
+		return num_files
 
 	@classmethod
-	def load(cls, path, echo=True):
-		path = Path(path=path)
-		parameters = (path + 'parameters.pensieve').load()
+	def load(cls, path, echo=True, num_threads=4, memory_map=True, lazy=False, prefetch=None):
+		"""
+		:param str or Path path: a directory or an archive file written by save
+		:type echo: bool
+		:param int num_threads: maximum number of memories read at the same time
+		:param bool memory_map: if True, contents saved in a format that supports it are memory-mapped;
+		contents in an archive are always read
+		:param bool lazy: if True, the graph, parameters, and functions are loaded right away
+		but each content is read when it is first needed
+		:param bool or int or list[str] or NoneType prefetch: with lazy, contents to read in the background:
+		True for all, a number for that many of the most accessed ones, or a list of keys
+		:rtype: PensieveWithoutDisplay
+		"""
+		storage = cls._get_storage(path=path)
+		try:
+			pensieve = cls._load_from_storage(
+				storage=storage, echo=echo, num_threads=num_threads, memory_map=memory_map, lazy=lazy
+			)
+		except BaseException:
+			storage.close()
+			raise
+		if lazy:
+			# contents are read from the storage when they are needed, so it stays open until the pensieve is closed
+			pensieve._storage = storage
+		else:
+			storage.close()
+		if lazy and prefetch:
+			pensieve.prefetch(keys=prefetch, num_threads=num_threads)
+		return pensieve
+
+	@classmethod
+	def _load_from_storage(cls, storage, echo, num_threads, memory_map, lazy):
+		"""
+		:type storage: PensieveDirectory or PensieveArchive
+		:rtype: PensieveWithoutDisplay
+		"""
+		parameters = storage.load_object(entry=None, name='parameters')
 		pensieve = cls()
 		for name, value in parameters.items():
 			setattr(pensieve, f'_{name}', value)
-		memory_keys = (path + 'memory_keys.pensieve').load()
+		memory_keys = storage.load_object(entry=None, name='memory_keys')
 		progress_bar = ProgressBar(total=len(memory_keys))
 		progress_amount = 0
-		pensieve._memories_dictionary = {}
-		for key in memory_keys:
-			if echo:
-				progress_bar.show(amount=progress_amount, text=f'loading "{key}" memory')
-			memory = Memory.load(path=path + key, pensieve=pensieve)
-			pensieve._memories_dictionary[key] = memory
-			progress_amount += 1
-		if echo:
-			progress_bar.show(amount=progress_amount)
+		memories = {}
+		with ThreadPoolExecutor(max_workers=max(1, num_threads)) as executor:
+			futures = {
+				executor.submit(
+					Memory.load, path=key, pensieve=pensieve, memory_map=memory_map, lazy=lazy, storage=storage
+				): key
+				for key in memory_keys
+			}
+			for future in as_completed(futures):
+				key = futures[future]
+				memories[key] = future.result()
+				progress_amount += 1
+				if echo:
+					progress_bar.show(amount=progress_amount, text=f'loaded "{key}" memory')
+		pensieve._memories_dictionary = {key: memories[key] for key in memory_keys}
+		pensieve._invalidate_descendants_of_stale_memories()
 		return pensieve
 
+	def _invalidate_descendants_of_stale_memories(self):
+		"""
+		memories whose contents could not be restored come back stale, and invalidate relies on every descendant of a
+		stale memory being stale too
+		"""
+		invalidate(memories=[memory for memory in self.memories_dictionary.values() if memory.is_stale])
+
+	def prefetch(self, keys=True, num_threads=4):
+		"""
+		reads contents that are up to date but not in memory, e.g., after a lazy load, in background threads
+		:param bool or int or list[str] keys: True for all memories, a number for that many of the most accessed ones,
+		or a list of keys
+		:param int num_threads: maximum number of contents read at the same time
+		:return: futures that are done when the contents are read
+		:rtype: list[concurrent.futures.Future]
+		"""
+		if isinstance(keys, (list, tuple)):
+			memories = [self._get_key_and_memory(x=key)[1] for key in keys]
+		else:
+			# memories that were accessed most often before the save are the most likely to be needed again
+			memories = sorted(
+				self.memories_dictionary.values(), key=lambda memory: memory._content_access_count, reverse=True
+			)
+			if keys is not True:
+				memories = memories[:keys]
+		memories = [memory for memory in memories if memory.is_evicted and not memory.is_stale]
+
+		executor = ThreadPoolExecutor(max_workers=max(1, num_threads), thread_name_prefix='pensieve_prefetch')
+		futures = [executor.submit(memory.prefetch) for memory in memories]
+		# the threads exit once the contents are read
+		executor.shutdown(wait=False)
+		return futures
+
 	def __eq__(self, other):
 		if not isinstance(other, self.__class__):
 			return False
@@ -418,6 +864,49 @@ class PensieveWithoutDisplay:
 	def keys(self):
 		return self._memories_dictionary.keys()
 
+	def _get_topological_order(self):
+		"""
+		the order is built from the adjacency when first needed and then kept up to date by store and erase
+		:rtype: TopologicalOrder
+		"""
+		if self._topological_order is None:
+			self._topological_order = TopologicalOrder(
+				precursor_keys=self._precursor_keys, successor_keys=self._successor_keys
+			)
+		return self._topological_order
+
+	def snapshot(self):
+		"""
+		takes a snapshot in constant time: the snapshot reads the memories and adjacency of this pensieve through
+		copy-on-write dictionaries; this pensieve keeps its memories and, before it changes one that the snapshot has
+		not used yet, hands the snapshot a shallow copy of it, while the snapshot copies each memory shallowly when it
+		first uses it, so contents stay shared until either side replaces them; the snapshot has no memory budget
+		:rtype: PensieveWithoutDisplay
+		"""
+		new_pensieve = self.__class__.__new__(self.__class__)
+		new_pensieve.__dict__.update(self.__dict__)
+		new_pensieve._thread_pool = None
+		new_pensieve._process_pool = None
+		new_pensieve._pool_lock = Lock()
+		# the snapshot reads lazily loaded contents through the same storage but leaves closing it to this pensieve
+		new_pensieve._storage = None
+		new_pensieve._memory_budget = None
+		copy_memory = partial(_copy_memory, pensieve_reference=ref(new_pensieve))
+		for name, copy_value in [
+			('_memories_dictionary', copy_memory), ('_precursor_keys', list), ('_successor_keys', list)
+		]:
+			dictionary = getattr(self, name)
+			if not isinstance(dictionary, CopyOnWriteDict):
+				# the entries stay where they are, so the topological order still reads the same adjacency
+				dictionary = CopyOnWriteDict(dictionary=dictionary)
+				setattr(self, name, dictionary)
+			setattr(new_pensieve, name, dictionary.snapshot(copy_value=copy_value))
+		if self._topological_order is not None:
+			new_pensieve._topological_order = self._topological_order.snapshot(
+				precursor_keys=new_pensieve._precursor_keys, successor_keys=new_pensieve._successor_keys
+			)
+		return new_pensieve
+
 	@property
 	def memories_dictionary(self):
 		"""
@@ -462,6 +951,49 @@ class PensieveWithoutDisplay:
 			for memory in self.memories_dictionary.values():
 				memory.unfreeze()
 
+	def pin(self, memory):
+		"""
+		keeps the content of a memory from being evicted when the pensieve is over its memory budget
+		:type memory: Memory or str
+		"""
+		memory_key, memory = self._get_key_and_memory(x=memory)
+		memory.pin()
+
+	def unpin(self, memory):
+		"""
+		:type memory: Memory or str
+		"""
+		memory_key, memory = self._get_key_and_memory(x=memory)
+		memory.unpin()
+
+	@property
+	def memory_budget(self):
+		"""
+		:rtype: MemoryBudget or NoneType
+		"""
+		return self._memory_budget
+
+	@property
+	def eviction_statistics(self):
+		"""
+		the budget, the bytes used by materialized contents, and the numbers of evictions and recomputations
+		:rtype: dict or NoneType
+		"""
+		if self._memory_budget is None:
+			return None
+		return self._memory_budget.statistics
+
+	def _content_was_set(self, memory, recomputed=False):
+		"""
+		called by a memory when its content is materialized
+		:type memory: Memory
+		:param bool recomputed: True if the content had been evicted before
+		"""
+		if self._memory_budget is None:
+			return
+		self._memory_budget.record(memory=memory, recomputed=recomputed)
+		self._memory_budget.enforce(memories=self._memories_dictionary, keep=memory.key)
+
 	def _get_key_and_memory(self, x):
 		"""
 		:param str or Memory x: key to memory or the memory itself
@@ -536,6 +1068,7 @@ class PensieveWithoutDisplay:
 			intermediary_node = f'intermediary_{self._num_intermediary_nodes+1}'
 			self._num_intermediary_nodes += 1
 			self[intermediary_node] = value
+			self._memories_dictionary[intermediary_node]._prepare_change()
 			self._memories_dictionary[intermediary_node]._label = ', '.join(keys)
 
 			intermediary_value = self[intermediary_node]
@@ -587,7 +1120,8 @@ class PensieveWithoutDisplay:
 
 		if function is not None and content is not None:
 			raise StoringError('Pensieve: at least one of function and content should be None!')
-		elif function is None:
+		stores_content = function is None
+		if stores_content:
 			if lazy:
 				raise StoringError('Pensieve: the content has to be materialized!')
 
@@ -622,16 +1156,23 @@ class PensieveWithoutDisplay:
 			warnings.warn('There are duplicates among precursors! They are removed but they may cause error later on!')
 
 		# Check precursor states are known, i.e., precursor memories exist
-		unknown_precursors = set(precursors).difference(set(self._memories_dictionary.keys()))
+		memories_dictionary = self._memories_dictionary
+		unknown_precursors = [precursor for precursor in precursors if precursor not in memories_dictionary]
 		if unknown_precursors:
 			precursor_str = ', '.join([f'"{s}"' for s in unknown_precursors])
 			raise UnknownPrecursorError(f'Pensieve: error adding "{key}": Unknown precursor memories: {precursor_str}')
 
-		# make sure there is no loops
-		for memory in precursors:
-			ancestor_names = [ancestor.key for ancestor in self.get_ancestors(memory=memory)]
-			if key in ancestor_names:
-				raise MemoryRecursionError(f'Pensieve: "{key}" is an ancestor memory of its precursor: "{memory}"!')
+		# make sure there is no loops; the search that finds one also keeps the topological order up to date
+		topological_order = self._get_topological_order()
+		is_new = key not in topological_order
+		topological_order.add(key=key)
+		try:
+			for precursor_key in precursors:
+				topological_order.add_edge(precursor_key=precursor_key, successor_key=key)
+		except MemoryRecursionError:
+			if is_new:
+				topological_order.remove(key=key)
+			raise
 
 		# Create or update memory
 		precursor_memories = remove_list_duplicates([self._memories_dictionary[p] for p in precursors])
@@ -639,6 +1180,7 @@ class PensieveWithoutDisplay:
 		if key in self._memories_dictionary:
 			memory = self._memories_dictionary[key]
 			if len(precursors) == 0:
+				memory._prepare_change()
 				memory._precursors_reference = None
 
 			memory.update(
@@ -647,6 +1189,8 @@ class PensieveWithoutDisplay:
 				metadata=metadata,
 				_original_function=function
 			)
+			# precursors that were dropped leave the order valid but not the ancestors
+			topological_order.forget_ancestors()
 
 		else:
 			memory = Memory(
@@ -656,10 +1200,21 @@ class PensieveWithoutDisplay:
 				_original_function=function, n_jobs=self._n_jobs
 			)
 			self._memories_dictionary[key] = memory
+		# a stored object is not a function result worth keeping in the result cache
+		memory._stores_content = stores_content
 
 		if evaluate:
 			memory.evaluate()  # this will update the content if necessary
 
+	def invalidate(self, keys):
+		"""
+		marks memories and all their descendants stale in one traversal
+		:param list[str or Memory] or str or Memory keys: keys to the memories that have changed
+		"""
+		if isinstance(keys, (str, Memory)):
+			keys = [keys]
+		invalidate(memories=[self._get_key_and_memory(x=key)[1] for key in keys])
+
 	def erase(self, memory):
 		"""
 		:param str or Memory memory: memory to be forgotten
@@ -667,13 +1222,18 @@ class PensieveWithoutDisplay:
 		"""
 		memory_key, memory = self._get_key_and_memory(x=memory)
 		del self._memories_dictionary[memory_key]
+		if self._memory_budget is not None:
+			self._memory_budget.forget(key=memory_key)
 		for successor in self._successor_keys[memory_key]:
+			prepare_change(dictionary=self._precursor_keys, key=successor)
 			self._precursor_keys[successor].remove(memory_key)
 		del self._successor_keys[memory_key]
 
 		for precursor in self._precursor_keys[memory_key]:
+			prepare_change(dictionary=self._successor_keys, key=precursor)
 			self._successor_keys[precursor].remove(memory_key)
 		del self._precursor_keys[memory_key]
+		self._get_topological_order().remove(key=memory_key)
 
 	def __delitem__(self, key):
 		self.erase(memory=key)
@@ -700,12 +1260,7 @@ class PensieveWithoutDisplay:
 		if not len(self._memories_dictionary):
 			return "<empty graph>"
 
-		# Sort memories topologically
-		def get_dependencies(n):
-			return set(n.precursor_keys)
-
-		to_be_topologically_sorted = {memory.key: get_dependencies(memory) for memory in self._memories_dictionary.values()}
-		topologically_sorted = [l for g in toposort(to_be_topologically_sorted) for l in g]
+		topologically_sorted = self._get_topological_order().get_sorted_keys()
 
 		# Find longest strings so we can pad our strings to equal length later
 		def get_precursors_str(n):
@@ -788,34 +1343,40 @@ class PensieveWithoutDisplay:
 
 		return result
 
-	def _get_ancestors(self, memory, memories_travelled=None):
+	def get_ancestor_keys(self, memory):
 		"""
-		:type memory: Memory or str
-		:type memories_travelled: list[Node] or None
-		:rtype: list[Node]
-		"""
-		memories_travelled = memories_travelled or []
-		memories_travelled.append(memory)
-		parents = self.get_precursors(memory=memory)
-		if len(parents) == 0:
-			return []
-		else:
-			ancestors = []
-			for parent in parents:
-				if parent not in ancestors:
-					ancestors.append(parent)
-
-				if parent not in memories_travelled:
-					parent_ancestors = self._get_ancestors(
-						memory=parent, memories_travelled=memories_travelled
-					)
-					for ancestor in parent_ancestors:
-						if ancestor not in ancestors:
-							ancestors.append(ancestor)
-			return ancestors
+		:param str or Memory memory: key to the memory you want the ancestors of
+		:return: keys of the precursors, their precursors, and so on, each once
+		:rtype: list[str]
+		"""
+		memory_key, _ = self._get_key_and_memory(memory)
+		ancestor_keys = []
+		visited = {memory_key}
+		to_visit = [memory_key]
+		while len(to_visit) > 0:
+			for precursor_key in self._precursor_keys[to_visit.pop()]:
+				if precursor_key not in visited:
+					visited.add(precursor_key)
+					ancestor_keys.append(precursor_key)
+					to_visit.append(precursor_key)
+		return ancestor_keys
 
 	def get_ancestors(self, memory):
-		return self._get_ancestors(memory=memory, memories_travelled=[])
+		"""
+		:param str or Memory memory: key to the memory you want the ancestors of
+		:rtype: list[Memory]
+		"""
+		return [self._memories_dictionary[key] for key in self.get_ancestor_keys(memory=memory)]
+
+	def is_ancestor(self, ancestor, memory):
+		"""
+		:param str or Memory ancestor: key to the memory that may be an ancestor
+		:param str or Memory memory: key to the memory
+		:rtype: bool
+		"""
+		ancestor_key, _ = self._get_key_and_memory(ancestor)
+		memory_key, _ = self._get_key_and_memory(memory)
+		return self._get_topological_order().is_ancestor(ancestor_key=ancestor_key, key=memory_key)
 
 	@property
 	def performance(self):
@@ -829,9 +1390,56 @@ class PensieveWithoutDisplay:
 		)
 		result['precursor_evaluation_time'] = result['total_evaluation_time'] - result['mean_duration']
 
+		spill_store = self._memory_budget.spill_store if self._memory_budget is not None else None
+		if spill_store is not None:
+			for column, durations in (
+				('mean_spill_duration', spill_store.spill_durations),
+				('mean_fault_duration', spill_store.fault_durations)
+			):
+				measurements = durations.measurements
+				result[column] = result.apply(
+					lambda x: convert(delta=measurements[x['name']].mean_duration, to_unit=x['unit'])
+					if x['name'] in measurements else None,
+					axis=1
+				)
+
 		# sizes = [{'name': name, 'type': memory.get_summary()} for name, memory in self.memories_dictionary.items()]
 		return result
 
+	def memory_report(self):
+		"""
+		bytes held by each memory; shared bytes belong to objects that other memories hold too, e.g., a content that
+		is passed through unchanged, and retained bytes would be freed if the memory were erased
+		:rtype: pandas.DataFrame
+		"""
+		seen_by_key = {}
+		sizes = {}
+		for key, memory in self.memories_dictionary.items():
+			seen = {}
+			sizes[key] = memory.estimate_size(seen=seen)
+			seen.pop(id(self), None)
+			seen_by_key[key] = seen
+
+		holders = {}
+		for seen in seen_by_key.values():
+			for object_id in seen:
+				holders[object_id] = holders.get(object_id, 0) + 1
+
+		records = []
+		for key, memory in self.memories_dictionary.items():
+			shared_bytes = sum(size for object_id, size in seen_by_key[key].items() if holders[object_id] > 1)
+			records.append({
+				'key': key,
+				'content_type': memory._content_type,
+				'total_bytes': sizes[key],
+				'retained_bytes': sizes[key] - shared_bytes,
+				'shared_bytes': shared_bytes,
+				'is_evicted': memory.is_evicted
+			})
+		return DataFrame(records, columns=[
+			'key', 'content_type', 'total_bytes', 'retained_bytes', 'shared_bytes', 'is_evicted'
+		])
+
 	@property
 	def timestamps(self):
 		"""
@@ -896,10 +1504,8 @@ class PensieveWithoutDisplay:
 		return result
 
 	def get_contents(self):
-		new_pensieve = self.__class__(function_durations=self._function_durations, hide_ignored=self._hide_ignored)
-
-		for key, memory in self.memories_dictionary.items():
-			new_pensieve._memories_dictionary[key] = memory.partial_copy()
-		new_pensieve._precursor_keys = self._precursor_keys.copy()
-		new_pensieve._successor_keys = self._successor_keys.copy()
-		return new_pensieve
+		"""
+		:return: a snapshot of this pensieve
+		:rtype: PensieveWithoutDisplay
+		"""
+		return self.snapshot()
@@ -0,0 +1,90 @@
+import gzip
+import io
+
+try:
+	import lz4.frame
+except ImportError:
+	lz4 = None
+
+try:
+	import zstandard
+except ImportError:
+	zstandard = None
+
+
+# a fast level; most of the gain on tabular data comes at the low levels
+ZLIB_LEVEL = 1
+ZSTD_LEVEL = 3
+
+_COMPRESSIONS = {}
+
+
+def register_compression(name, extension, open_writer, open_reader, module=True):
+	"""
+	:param str name: name of the compression, recorded with each saved content
+	:param str extension: added to the extension of compressed files
+	:param callable open_writer: takes a binary file object and returns a file object that compresses what is
+	written to it into the file; closing it must not close the file
+	:param callable open_reader: takes a binary file object and returns a file object that decompresses it
+	:param module: the module the compression needs, or None if it is not installed
+	"""
+	_COMPRESSIONS[name] = {
+		'name': name, 'extension': extension, 'open_writer': open_writer, 'open_reader': open_reader,
+		'is_available': module is not None
+	}
+
+
+def get_compression(name):
+	"""
+	:type name: str
+	:rtype: dict
+	"""
+	if name not in _COMPRESSIONS:
+		raise ValueError(f'Unsupported compression: {name}')
+	compression = _COMPRESSIONS[name]
+	if not compression['is_available']:
+		raise ValueError(f'The {name} compression needs a package that is not installed')
+	return compression
+
+
+def get_compressions():
+	"""
+	:return: names of the registered compressions whose packages are installed
+	:rtype: list[str]
+	"""
+	return [name for name, compression in _COMPRESSIONS.items() if compression['is_available']]
+
+
+def _open_zlib_writer(file):
+	# mtime=0 keeps the output the same for the same content
+	return gzip.GzipFile(fileobj=file, mode='wb', compresslevel=ZLIB_LEVEL, mtime=0)
+
+
+def _open_zlib_reader(file):
+	return gzip.GzipFile(fileobj=file, mode='rb')
+
+
+def _open_lz4_writer(file):
+	return lz4.frame.LZ4FrameFile(file, mode='wb')
+
+
+def _open_lz4_reader(file):
+	return lz4.frame.LZ4FrameFile(file, mode='rb')
+
+
+def _open_zstd_writer(file):
+	return zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(file, closefd=False)
+
+
+def _open_zstd_reader(file):
+	# buffered so that readers that peek, e.g., pickle and numpy, can read lines and seek back within the buffer
+	return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(file, closefd=False))
+
+
+register_compression(name='zlib', extension='gz', open_writer=_open_zlib_writer, open_reader=_open_zlib_reader)
+register_compression(
+	name='lz4', extension='lz4', open_writer=_open_lz4_writer, open_reader=_open_lz4_reader, module=lz4
+)
+register_compression(
+	name='zstd', extension='zst', open_writer=_open_zstd_writer, open_reader=_open_zstd_reader, module=zstandard
+)
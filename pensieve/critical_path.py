@@ -0,0 +1,110 @@
+from datetime import timedelta
+from heapq import heappush, heappop
+from statistics import median
+
+
+def _to_seconds(duration):
+	if isinstance(duration, timedelta):
+		return duration.total_seconds()
+	return float(duration)
+
+
+def _get_successor_keys(jobs):
+	"""
+	:type jobs: dict[str, Memory]
+	:rtype: dict[str, list[str]]
+	"""
+	successor_keys = {key: [] for key in jobs}
+	for key, job in jobs.items():
+		for precursor_key in job.precursor_keys:
+			if precursor_key in jobs:
+				successor_keys[precursor_key].append(key)
+	return successor_keys
+
+
+def _get_unique_jobs(jobs):
+	unique_jobs = {}
+	for job in jobs:
+		if job.key not in unique_jobs:
+			unique_jobs[job.key] = job
+	return unique_jobs
+
+
+def get_durations(jobs, function_durations, default_duration=None):
+	"""
+	estimates how long each job takes from its recorded mean duration
+	:type jobs: list[Memory]
+	:type function_durations: MeasurementSet
+	:param float or NoneType default_duration: seconds for jobs without measurements, the median of the others if None
+	:rtype: dict[str, float]
+	"""
+	measurements = function_durations.measurements
+	known = {
+		job.key: _to_seconds(measurements[job.key].mean_duration)
+		for job in jobs if job.key in measurements
+	}
+	if default_duration is None:
+		default_duration = median(known.values()) if len(known) > 0 else 1.0
+	return {job.key: known.get(job.key, default_duration) for job in jobs}
+
+
+def get_critical_paths(jobs, durations):
+	"""
+	finds, for every job, the duration of the longest path from the start of the job to the end of any job after it
+	:type jobs: list[Memory]
+	:param dict[str, float] durations: seconds per job key
+	:rtype: dict[str, float]
+	"""
+	jobs = _get_unique_jobs(jobs)
+	successor_keys = _get_successor_keys(jobs)
+	remaining_successors = {key: len(successors) for key, successors in successor_keys.items()}
+
+	# walk the graph backwards, from jobs that nothing depends on up to the first jobs
+	to_visit = [key for key, count in remaining_successors.items() if count == 0]
+	critical_paths = {}
+	while len(to_visit) > 0:
+		key = to_visit.pop()
+		longest_after = max([critical_paths[successor_key] for successor_key in successor_keys[key]], default=0)
+		critical_paths[key] = durations[key] + longest_after
+		for precursor_key in jobs[key].precursor_keys:
+			if precursor_key in jobs:
+				remaining_successors[precursor_key] -= 1
+				if remaining_successors[precursor_key] == 0:
+					to_visit.append(precursor_key)
+	return critical_paths
+
+
+def simulate_makespan(jobs, durations, num_workers, priorities=None):
+	"""
+	predicts how long running the jobs takes when each of num_workers workers picks the ready job of highest priority
+	:type jobs: list[Memory]
+	:param dict[str, float] durations: seconds per job key
+	:type num_workers: int
+	:param dict[str, float] or NoneType priorities: the critical paths if None
+	:rtype: float
+	"""
+	jobs = _get_unique_jobs(jobs)
+	if priorities is None:
+		priorities = get_critical_paths(jobs=list(jobs.values()), durations=durations)
+	successor_keys = _get_successor_keys(jobs)
+	in_degrees = {key: len([p for p in job.precursor_keys if p in jobs]) for key, job in jobs.items()}
+
+	ready = []
+	for order, key in enumerate(jobs):
+		if in_degrees[key] == 0:
+			heappush(ready, (-priorities[key], order, key))
+
+	running = []
+	now = 0.0
+	order = len(jobs)
+	while len(ready) > 0 or len(running) > 0:
+		while len(ready) > 0 and len(running) < max(1, num_workers):
+			_, _, key = heappop(ready)
+			heappush(running, (now + durations[key], key))
+		now, key = heappop(running)
+		for successor_key in successor_keys[key]:
+			in_degrees[successor_key] -= 1
+			if in_degrees[successor_key] == 0:
+				order += 1
+				heappush(ready, (-priorities[successor_key], order, successor_key))
+	return now
@@ -0,0 +1,133 @@
+from sys import getsizeof
+from types import FunctionType, ModuleType
+
+from numpy import ndarray, memmap
+from pandas import DataFrame, Series, Index
+
+
+# containers with more elements than this are sized from an evenly spaced sample of their elements
+SAMPLE_SIZE = 100
+
+_SIZE_ESTIMATORS = []
+
+
+def register_size_estimator(cls, estimator):
+	"""
+	teaches estimate_size the size of a type; estimators registered later take precedence
+	:param type cls: the type, subclasses included
+	:param callable estimator: takes an instance and returns the number of bytes it holds, including what it refers to
+	"""
+	_SIZE_ESTIMATORS.insert(0, (cls, estimator))
+
+
+def _get_numpy_size(x):
+	if isinstance(x, memmap):
+		# pages of a memory-mapped file are backed by the file and are not retained
+		return getsizeof(x)
+	if x.dtype.hasobject:
+		return getsizeof(x) + _get_sampled_size(elements=x.reshape(-1), seen={})
+	return getsizeof(x) if x.base is None else getsizeof(x) + x.nbytes
+
+
+def _get_sampled_size(elements, seen):
+	"""
+	:param elements: a sequence that supports len and indexing
+	:type seen: dict[int, int]
+	:rtype: int
+	"""
+	length = len(elements)
+	if length <= SAMPLE_SIZE:
+		return sum(estimate_size(element, seen=seen) for element in elements)
+	step = length / SAMPLE_SIZE
+	sample = [elements[int(i * step)] for i in range(SAMPLE_SIZE)]
+	return int(sum(estimate_size(element, seen=seen) for element in sample) * length / SAMPLE_SIZE)
+
+
+def _get_object_column_size(values):
+	# values of object columns are python objects that memory_usage(deep=True) would visit one by one
+	return _get_sampled_size(elements=values, seen={})
+
+
+def _get_pandas_size(x):
+	if isinstance(x, DataFrame):
+		size = int(x.memory_usage(index=True, deep=False).sum())
+		for i, dtype in enumerate(x.dtypes):
+			if dtype == object:
+				size += _get_object_column_size(values=x.iloc[:, i].values)
+		index = x.index
+	elif isinstance(x, Series):
+		size = int(x.memory_usage(index=True, deep=False))
+		if x.dtype == object:
+			size += _get_object_column_size(values=x.values)
+		index = x.index
+	else:
+		return int(x.memory_usage(deep=False)) + (_get_object_column_size(values=x.values) if x.dtype == object else 0)
+
+	if index.dtype == object:
+		size += _get_object_column_size(values=index.values)
+	return size + getsizeof(object())
+
+
+register_size_estimator(cls=ndarray, estimator=_get_numpy_size)
+register_size_estimator(cls=DataFrame, estimator=_get_pandas_size)
+register_size_estimator(cls=Series, estimator=_get_pandas_size)
+register_size_estimator(cls=Index, estimator=_get_pandas_size)
+
+
+def _get_shallow_size(x):
+	try:
+		return getsizeof(x)
+	except TypeError:
+		return 0
+
+
+def estimate_size(x, seen=None):
+	"""
+	estimates the number of bytes an object holds, including the objects it refers to, without walking large objects:
+	numpy and pandas objects are sized by their buffers and large containers by a sample of their elements
+	:param x: any object
+	:param dict[int, int] or NoneType seen: ids of the objects already counted, mapped to the bytes counted for each;
+	objects in it are not counted again and the objects counted by this call are added to it
+	:rtype: int
+	"""
+	if seen is None:
+		seen = {}
+	if id(x) in seen:
+		return 0
+	# the object is marked before its parts are sized so that reference cycles stop here
+	seen[id(x)] = 0
+
+	for cls, estimator in _SIZE_ESTIMATORS:
+		if isinstance(x, cls):
+			if isinstance(x, ndarray) and isinstance(x.base, ndarray) and not isinstance(x, memmap):
+				# a view holds on to the array it looks into, which other views may share
+				size = getsizeof(x) + estimate_size(x.base, seen=seen)
+				seen[id(x)] = getsizeof(x)
+				return size
+			seen[id(x)] = estimator(x)
+			return seen[id(x)]
+
+	size = _get_shallow_size(x)
+	seen[id(x)] = size
+	if isinstance(x, (str, bytes, bytearray, int, float, complex, bool, type, ModuleType)) or x is None:
+		return size
+
+	if isinstance(x, dict):
+		keys = list(x.keys())
+		size += _get_sampled_size(elements=keys, seen=seen)
+		size += _get_sampled_size(elements=[x[key] for key in keys], seen=seen)
+	elif isinstance(x, (list, tuple)):
+		size += _get_sampled_size(elements=x, seen=seen)
+	elif isinstance(x, (set, frozenset)):
+		size += _get_sampled_size(elements=list(x), seen=seen)
+	elif isinstance(x, FunctionType):
+		# only what the function carries with it; its module and globals belong to everyone
+		for cell in x.__closure__ or ():
+			try:
+				size += estimate_size(cell.cell_contents, seen=seen)
+			except ValueError:
+				pass
+		size += estimate_size(x.__defaults__, seen=seen)
+	elif hasattr(x, '__dict__') and isinstance(x.__dict__, dict):
+		size += estimate_size(x.__dict__, seen=seen)
+	return size
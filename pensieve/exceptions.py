@@ -14,4 +14,7 @@ class MemoryRecursionError(StoringError):
 	pass
 
 class IllegalKeyError(StoringError):
-	pass
\ No newline at end of file
+	pass
+
+class ContentSerializationError(PensieveError):
+	pass
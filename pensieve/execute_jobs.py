@@ -0,0 +1,65 @@
+from concurrent.futures import wait, FIRST_COMPLETED
+from heapq import heappush, heappop
+
+
+def execute_jobs(jobs, submit, max_in_flight, on_done=None, priorities=None):
+	"""
+	runs every job as soon as its last precursor among the jobs finishes, without waiting for whole rounds;
+	precursors that are not among the jobs are not waited for
+	:param list[Memory] jobs: memories to be evaluated
+	:param callable submit: takes a job, starts it, and returns a concurrent.futures.Future
+	:param int max_in_flight: the maximum number of jobs running at the same time
+	:param callable or NoneType on_done: called with each job and its result once the job is finished
+	:param dict[str, float] or NoneType priorities: among ready jobs, the ones with higher priority start first;
+	without priorities, jobs start in the order they become ready
+	"""
+	priorities = priorities or {}
+	unique_jobs = {}
+	for job in jobs:
+		if job.key not in unique_jobs:
+			unique_jobs[job.key] = job
+
+	in_degrees = {}
+	successor_keys = {key: [] for key in unique_jobs}
+	for key, job in unique_jobs.items():
+		precursor_keys = [precursor_key for precursor_key in job.precursor_keys if precursor_key in unique_jobs]
+		in_degrees[key] = len(precursor_keys)
+		for precursor_key in precursor_keys:
+			successor_keys[precursor_key].append(key)
+
+	# the ready queue is a heap of (negative priority, order of becoming ready, key)
+	ready = []
+	order = 0
+	for key in unique_jobs:
+		if in_degrees[key] == 0:
+			heappush(ready, (-priorities.get(key, 0), order, key))
+			order += 1
+	in_flight = {}
+	max_in_flight = max(1, max_in_flight)
+
+	while len(ready) > 0 or len(in_flight) > 0:
+		while len(ready) > 0 and len(in_flight) < max_in_flight:
+			_, _, key = heappop(ready)
+			job = unique_jobs[key]
+			in_flight[submit(job)] = job
+
+		done, _ = wait(list(in_flight.keys()), return_when=FIRST_COMPLETED)
+		for future in done:
+			job = in_flight.pop(future)
+			try:
+				result = future.result()
+			except BaseException:
+				# let the running jobs finish but do not start anything else
+				for pending in in_flight.keys():
+					pending.cancel()
+				wait(list(in_flight.keys()))
+				raise
+
+			if on_done is not None:
+				on_done(job, result)
+
+			for successor_key in successor_keys[job.key]:
+				in_degrees[successor_key] -= 1
+				if in_degrees[successor_key] == 0:
+					heappush(ready, (-priorities.get(successor_key, 0), order, successor_key))
+					order += 1
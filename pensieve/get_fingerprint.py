@@ -0,0 +1,161 @@
+from hashlib import blake2b
+import pickle
+
+import dill
+
+from numpy import ndarray, ascontiguousarray
+from pandas import DataFrame, Series, Index, MultiIndex
+from pandas.util import hash_pandas_object
+
+
+DIGEST_SIZE = 16
+SCALAR_TYPES = (type(None), bool, int, float, complex)
+# starts the fingerprints of objects that are known only by their identity, and of everything that holds them;
+# digests are hexadecimal, so the dash cannot occur in them otherwise
+IDENTITY_PREFIX = 'id-'
+
+
+def is_identity_fingerprint(fingerprint):
+	"""
+	:param str fingerprint: a fingerprint, or several joined together
+	:return: True if the fingerprint depends on where an object is in memory, which another object can reuse once
+	this one is garbage collected, so the fingerprint is only good within this process and for as long as the object
+	lives
+	:rtype: bool
+	"""
+	return IDENTITY_PREFIX in fingerprint
+
+
+def _new_hash(type_name):
+	hasher = blake2b(digest_size=DIGEST_SIZE)
+	hasher.update(type_name.encode('utf-8'))
+	hasher.update(b'\x00')
+	return hasher
+
+
+def _hash_buffer(type_name, buffer):
+	hasher = _new_hash(type_name=type_name)
+	hasher.update(buffer)
+	return hasher.hexdigest()
+
+
+def _hash_parts(type_name, parts):
+	"""
+	:type type_name: str
+	:param list[str] parts: fingerprints of the parts of an object
+	:rtype: str
+	"""
+	hasher = _new_hash(type_name=type_name)
+	for part in parts:
+		hasher.update(part.encode('ascii'))
+	if any(is_identity_fingerprint(part) for part in parts):
+		return IDENTITY_PREFIX + hasher.hexdigest()
+	return hasher.hexdigest()
+
+
+def _get_bytes_view(x):
+	# viewing as bytes also covers dtypes that do not support the buffer protocol, e.g., datetime64
+	return ascontiguousarray(x).reshape(-1).view('uint8').data
+
+
+def _get_numpy_fingerprint(x):
+	if x.dtype.hasobject:
+		return _get_serialized_fingerprint(x)
+	hasher = _new_hash(type_name='ndarray')
+	hasher.update(f'{x.dtype.str}{x.shape}'.encode('utf-8'))
+	hasher.update(_get_bytes_view(x))
+	return hasher.hexdigest()
+
+
+def _get_object_arrays(x):
+	"""
+	:type x: DataFrame or Series or Index
+	:return: the values of the columns, index levels, or index of x that have the object dtype
+	:rtype: list
+	"""
+	if isinstance(x, DataFrame):
+		arrays = [x.iloc[:, i] for i in range(x.shape[1])] + [x.index]
+	elif isinstance(x, Series):
+		arrays = [x, x.index]
+	else:
+		arrays = [x]
+	result = []
+	for array in arrays:
+		if isinstance(array, MultiIndex):
+			result += [array.get_level_values(i) for i in range(array.nlevels)]
+		else:
+			result.append(array)
+	return [array.values for array in result if array.dtype == object]
+
+
+def _get_pandas_fingerprint(x):
+	try:
+		hashes = hash_pandas_object(x, index=True).values
+	except TypeError:
+		# cells that are not hashable, e.g., lists inside an object column
+		return _get_serialized_fingerprint(x)
+
+	hasher = _new_hash(type_name=type(x).__name__)
+	if isinstance(x, DataFrame):
+		hasher.update(get_fingerprint(list(x.columns)).encode('ascii'))
+		hasher.update(str(list(x.dtypes)).encode('utf-8'))
+	elif isinstance(x, Series):
+		hasher.update(get_fingerprint(x.name).encode('ascii'))
+		hasher.update(str(x.dtype).encode('utf-8'))
+	else:
+		hasher.update(str(x.dtype).encode('utf-8'))
+	hasher.update(_get_bytes_view(hashes))
+	# objects are hashed by their text, so 1 and '1' are told apart by their types
+	for values in _get_object_arrays(x):
+		hasher.update('\x00'.join(
+			f'{type(value).__module__}.{type(value).__qualname__}' for value in values
+		).encode('utf-8'))
+	return hasher.hexdigest()
+
+
+def _get_serialized_fingerprint(x):
+	try:
+		return _hash_buffer(type_name='pickle', buffer=pickle.dumps(x, protocol=pickle.HIGHEST_PROTOCOL))
+	except Exception:
+		pass
+	try:
+		return _hash_buffer(type_name='dill', buffer=dill.dumps(x, protocol=dill.HIGHEST_PROTOCOL))
+	except Exception:
+		# the object cannot be serialized; its identity is the only thing we can rely on
+		return IDENTITY_PREFIX + _hash_buffer(type_name=f'id:{type(x).__name__}', buffer=str(id(x)).encode('ascii'))
+
+
+def get_fingerprint(x):
+	"""
+	produces a small digest of an object that changes when the object's contents change
+	:param x: any object
+	:rtype: str
+	"""
+	if isinstance(x, SCALAR_TYPES):
+		return _hash_buffer(type_name=type(x).__name__, buffer=repr(x).encode('utf-8'))
+
+	elif isinstance(x, str):
+		return _hash_buffer(type_name='str', buffer=x.encode('utf-8', errors='surrogatepass'))
+
+	elif isinstance(x, (bytes, bytearray, memoryview)):
+		return _hash_buffer(type_name='bytes', buffer=x)
+
+	elif isinstance(x, ndarray):
+		return _get_numpy_fingerprint(x)
+
+	elif isinstance(x, (DataFrame, Series, Index)):
+		return _get_pandas_fingerprint(x)
+
+	elif isinstance(x, (list, tuple)):
+		return _hash_parts(type_name=type(x).__name__, parts=[get_fingerprint(element) for element in x])
+
+	elif isinstance(x, dict):
+		# like dictionary equality, the fingerprint does not depend on the order of items
+		items = sorted(get_fingerprint(key) + get_fingerprint(value) for key, value in x.items())
+		return _hash_parts(type_name=type(x).__name__, parts=items)
+
+	elif isinstance(x, (set, frozenset)):
+		return _hash_parts(type_name=type(x).__name__, parts=sorted(get_fingerprint(element) for element in x))
+
+	else:
+		return _get_serialized_fingerprint(x)
@@ -0,0 +1,202 @@
+from .get_fingerprint import get_fingerprint, is_identity_fingerprint, DIGEST_SIZE, IDENTITY_PREFIX
+
+from hashlib import blake2b
+from threading import Lock
+from types import FunctionType, CodeType, ModuleType
+from weakref import WeakKeyDictionary
+
+import dill
+
+
+_CODE_FINGERPRINTS = WeakKeyDictionary()
+_CODE_NAMES = WeakKeyDictionary()
+_FUNCTION_CACHE = WeakKeyDictionary()
+_LOCK = Lock()
+
+
+def _get_code_fingerprint(code):
+	"""
+	hashes what a code object does but not where it is defined, i.e., file names and line numbers are left out
+	:type code: CodeType
+	:rtype: str
+	"""
+	with _LOCK:
+		fingerprint = _CODE_FINGERPRINTS.get(code)
+	if fingerprint is not None:
+		return fingerprint
+
+	hasher = blake2b(digest_size=DIGEST_SIZE)
+	hasher.update(code.co_code)
+	for constant in code.co_consts:
+		if isinstance(constant, CodeType):
+			hasher.update(_get_code_fingerprint(constant).encode('ascii'))
+		else:
+			hasher.update(get_fingerprint(constant).encode('ascii'))
+	hasher.update(repr((
+		code.co_name, code.co_names, code.co_varnames, code.co_freevars, code.co_cellvars,
+		code.co_argcount, code.co_kwonlyargcount, code.co_flags
+	)).encode('utf-8'))
+	fingerprint = hasher.hexdigest()
+
+	with _LOCK:
+		_CODE_FINGERPRINTS[code] = fingerprint
+	return fingerprint
+
+
+def _get_code_names(code):
+	"""
+	the global names, and attribute names, that a code object and the code objects inside it, e.g., of lambdas and
+	comprehensions, refer to
+	:type code: CodeType
+	:rtype: tuple[str]
+	"""
+	with _LOCK:
+		names = _CODE_NAMES.get(code)
+	if names is not None:
+		return names
+
+	names = set(code.co_names)
+	for constant in code.co_consts:
+		if isinstance(constant, CodeType):
+			names.update(_get_code_names(constant))
+	names = tuple(sorted(names))
+
+	with _LOCK:
+		_CODE_NAMES[code] = names
+	return names
+
+
+def _get_global_values(function):
+	"""
+	the module constants, helper functions, and other globals that a function refers to by name
+	:type function: FunctionType
+	:rtype: list[tuple[str, object]]
+	"""
+	function_globals = function.__globals__
+	return [(name, function_globals[name]) for name in _get_code_names(function.__code__) if name in function_globals]
+
+
+def _get_cell_contents(function):
+	"""
+	:type function: FunctionType
+	:rtype: list
+	"""
+	contents = []
+	for cell in function.__closure__ or ():
+		try:
+			contents.append(cell.cell_contents)
+		except ValueError:
+			# the variable is not assigned yet
+			contents.append(None)
+	return contents
+
+
+def _get_signature(function, functions_visited=frozenset()):
+	"""
+	identifies the parts of a function that can change without the function object changing, including those of the
+	functions it refers to
+	:type function: FunctionType
+	:param frozenset[int] functions_visited: ids of functions already being signed, to stop recursive references
+	:rtype: tuple
+	"""
+	if id(function) in functions_visited:
+		return 'recursive'
+	functions_visited = functions_visited | {id(function)}
+
+	def get_value_signature(value):
+		if isinstance(value, FunctionType):
+			return _get_signature(function=value, functions_visited=functions_visited)
+		return id(value)
+
+	return (
+		function.__code__, id(function.__defaults__), id(function.__kwdefaults__),
+		tuple(get_value_signature(content) for content in _get_cell_contents(function)),
+		tuple(get_value_signature(value) for _, value in _get_global_values(function))
+	)
+
+
+def _get_cache_entry(function):
+	"""
+	:type function: FunctionType
+	:rtype: dict
+	"""
+	signature = _get_signature(function)
+	with _LOCK:
+		entry = _FUNCTION_CACHE.get(function)
+		if entry is None or entry['signature'] != signature:
+			entry = {'signature': signature, 'fingerprint': None, 'serialized': None}
+			_FUNCTION_CACHE[function] = entry
+	return entry
+
+
+def _get_value_fingerprint(value, functions_visited):
+	if isinstance(value, FunctionType):
+		return _compute_function_fingerprint(function=value, functions_visited=functions_visited)
+	elif isinstance(value, ModuleType):
+		# modules are known by name, like pickle knows them, rather than by everything in them
+		return get_fingerprint(f'module:{value.__name__}')
+	else:
+		return get_fingerprint(value)
+
+
+def _compute_function_fingerprint(function, functions_visited):
+	"""
+	:type function: FunctionType
+	:param set[int] functions_visited: ids of functions already being fingerprinted, to stop recursive closures
+	:rtype: str
+	"""
+	if id(function) in functions_visited:
+		return 'recursive'
+	functions_visited = functions_visited | {id(function)}
+
+	parts = [_get_code_fingerprint(function.__code__)]
+	for value in function.__defaults__ or ():
+		parts.append(_get_value_fingerprint(value=value, functions_visited=functions_visited))
+	for name, value in sorted((function.__kwdefaults__ or {}).items()):
+		parts.append(name)
+		parts.append(_get_value_fingerprint(value=value, functions_visited=functions_visited))
+	for value in _get_cell_contents(function):
+		parts.append(_get_value_fingerprint(value=value, functions_visited=functions_visited))
+	# a changed module constant or helper function changes the function too, even in another process
+	for name, value in _get_global_values(function):
+		parts.append(name)
+		parts.append(_get_value_fingerprint(value=value, functions_visited=functions_visited))
+
+	hasher = blake2b(digest_size=DIGEST_SIZE)
+	for part in parts:
+		hasher.update(part.encode('utf-8'))
+	if any(is_identity_fingerprint(part) for part in parts):
+		return IDENTITY_PREFIX + hasher.hexdigest()
+	return hasher.hexdigest()
+
+
+def get_function_fingerprint(function):
+	"""
+	fingerprints a function by its bytecode, constants, defaults, closure values, and the globals it refers to;
+	the result is cached until the function object, its defaults, its closure bindings, or those globals change
+	:type function: callable or NoneType
+	:rtype: str
+	"""
+	if not isinstance(function, FunctionType):
+		# builtins, partials, and callable objects are fingerprinted as objects
+		return get_fingerprint(function)
+
+	entry = _get_cache_entry(function)
+	if entry['fingerprint'] is None:
+		entry['fingerprint'] = _compute_function_fingerprint(function=function, functions_visited=set())
+	return entry['fingerprint']
+
+
+def serialize_function(function):
+	"""
+	dill-dumps a function; the payload is cached alongside the function's fingerprint
+	:type function: callable or NoneType
+	:rtype: bytes
+	"""
+	if not isinstance(function, FunctionType):
+		return dill.dumps(obj=function)
+
+	entry = _get_cache_entry(function)
+	if entry['serialized'] is None:
+		entry['serialized'] = dill.dumps(obj=function)
+	return entry['serialized']
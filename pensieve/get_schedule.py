@@ -1,22 +1,33 @@
 def get_schedule(jobs):
+    """
+    groups jobs into rounds such that every job comes after the rounds of its precursors among the jobs;
+    precursors that are not among the jobs are not waited for
+    :type jobs: list[Memory]
+    :rtype: list[list[Memory]]
+    """
     unique_jobs = {}
     for job in jobs:
         if job.key not in unique_jobs:
             unique_jobs[job.key] = job
-    jobs = list(unique_jobs.values())
 
-    added_to_schedule = []
-    schedule = []
-    while len(jobs) > 0:
-        job_round = []
-        for job in jobs:
-            if len(job.stale_precursors) == 0:
-                job_round.append(job)
-            elif all([dependency in added_to_schedule for dependency in job.stale_dependencies]):
-                job_round.append(job)
+    # in-degree of a job is the number of its precursors that are scheduled too
+    in_degrees = {}
+    successor_keys = {key: [] for key in unique_jobs}
+    for key, job in unique_jobs.items():
+        precursor_keys = [precursor_key for precursor_key in job.precursor_keys if precursor_key in unique_jobs]
+        in_degrees[key] = len(precursor_keys)
+        for precursor_key in precursor_keys:
+            successor_keys[precursor_key].append(key)
 
-        for job in job_round:
-            jobs.remove(job)
-        added_to_schedule += job_round
+    schedule = []
+    job_round = [job for key, job in unique_jobs.items() if in_degrees[key] == 0]
+    while len(job_round) > 0:
         schedule.append(job_round)
+        next_round = []
+        for job in job_round:
+            for successor_key in successor_keys[job.key]:
+                in_degrees[successor_key] -= 1
+                if in_degrees[successor_key] == 0:
+                    next_round.append(unique_jobs[successor_key])
+        job_round = next_round
     return schedule
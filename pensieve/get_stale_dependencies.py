@@ -0,0 +1,24 @@
+def get_stale_dependencies(memories):
+	"""
+	collects the stale ancestors that the memories reach through stale precursors, each one once,
+	in topological order, i.e., every memory comes after its own stale precursors
+	:type memories: list[Memory]
+	:rtype: list[Memory]
+	"""
+	dependencies = []
+	visited = set()
+	for memory in memories:
+		# iterative depth-first search that emits a memory after all of its stale precursors
+		stack = [(memory, iter(memory.stale_precursors))]
+		while len(stack) > 0:
+			current, precursors = stack[-1]
+			for precursor in precursors:
+				if precursor.key not in visited:
+					visited.add(precursor.key)
+					stack.append((precursor, iter(precursor.stale_precursors)))
+					break
+			else:
+				stack.pop()
+				if len(stack) > 0:
+					dependencies.append(current)
+	return dependencies
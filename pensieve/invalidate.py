@@ -0,0 +1,24 @@
+def invalidate(memories):
+	"""
+	marks memories and all of their descendants stale in a single traversal, without recursion;
+	a descendant that is already stale is not entered because its own descendants are already stale
+	:type memories: list[Memory]
+	"""
+	visited = set()
+	to_visit = []
+	for memory in memories:
+		if memory.key not in visited:
+			visited.add(memory.key)
+			memory._prepare_change()
+			memory._stale = True
+			to_visit.append(memory)
+
+	while len(to_visit) > 0:
+		memory = to_visit.pop()
+		for successor in memory.successors:
+			if successor.key in visited or successor.is_stale:
+				continue
+			visited.add(successor.key)
+			successor._prepare_change()
+			successor._stale = True
+			to_visit.append(successor)
@@ -0,0 +1,59 @@
+import tempfile
+import pickle
+import os
+
+import dill
+
+
+def _get_module(method):
+	if method == 'dill':
+		return dill
+	elif method == 'pickle':
+		return pickle
+	else:
+		raise ValueError(f'Unsupported method: {method}')
+
+
+def save_pickle(path, obj, method='pickle'):
+	"""
+	pickles an object into a temporary file and renames it to path, so that an interrupted save leaves the previous
+	file in place
+	:param str path: path of the file
+	:param obj: any object
+	:param str method: 'pickle' or 'dill'
+	"""
+	module = _get_module(method=method)
+	directory = os.path.dirname(os.path.abspath(path))
+	os.makedirs(directory, exist_ok=True)
+	file_descriptor, temporary_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+	try:
+		with os.fdopen(file_descriptor, 'wb') as file:
+			module.dump(obj, file, protocol=module.HIGHEST_PROTOCOL)
+		os.replace(temporary_path, path)
+	except BaseException:
+		try:
+			os.remove(temporary_path)
+		except OSError:
+			pass
+		raise
+
+
+def get_pickle_path(path):
+	"""
+	:param str path: path of the file as written by save_pickle
+	:return: the path, or the path with a .pickle extension that some versions of disk add, if only that one exists
+	:rtype: str
+	"""
+	if not os.path.exists(path) and os.path.exists(f'{path}.pickle'):
+		return f'{path}.pickle'
+	return path
+
+
+def load_pickle(path, method='pickle'):
+	"""
+	:param str path: path of the file
+	:param str method: 'pickle' or 'dill'
+	"""
+	module = _get_module(method=method)
+	with open(get_pickle_path(path=path), 'rb') as file:
+		return module.load(file)
@@ -0,0 +1,44 @@
+from threading import Thread
+import asyncio
+
+
+def _run_in_new_loop(coroutine):
+	loop = asyncio.new_event_loop()
+	try:
+		return loop.run_until_complete(coroutine)
+	finally:
+		loop.close()
+
+
+def _is_loop_running():
+	try:
+		asyncio.get_running_loop()
+	except RuntimeError:
+		# no event loop is running in this thread
+		return False
+	return True
+
+
+def run_coroutine(coroutine):
+	"""
+	runs a coroutine to completion from synchronous code;
+	if an event loop is already running in this thread, e.g., in a notebook, the coroutine runs in another thread
+	:param coroutine: an awaitable
+	"""
+	if not _is_loop_running():
+		return _run_in_new_loop(coroutine)
+
+	result = {}
+
+	def target():
+		try:
+			result['value'] = _run_in_new_loop(coroutine)
+		except BaseException as e:
+			result['error'] = e
+
+	thread = Thread(target=target)
+	thread.start()
+	thread.join()
+	if 'error' in result:
+		raise result['error']
+	return result['value']
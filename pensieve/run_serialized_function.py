@@ -0,0 +1,29 @@
+from .exceptions import ContentSerializationError
+
+from chronometry import Timer
+
+import dill
+
+
+def run_serialized_function(function_dump, arguments_dump):
+	"""
+	runs a dill-serialized function on dill-serialized arguments, meant to be called in a worker process
+	:type function_dump: bytes
+	:type arguments_dump: bytes
+	:return: the dill-serialized content and timer
+	:rtype: bytes
+	:raises ContentSerializationError: if the content cannot be sent back; the function is not run again elsewhere
+	because that would repeat its work and its side effects
+	"""
+	function = dill.loads(function_dump)
+	arguments = dill.loads(arguments_dump)
+	timer = Timer(start_now=True, unit='timedelta')
+	content = function(*arguments)
+	timer.stop()
+	try:
+		return dill.dumps((content, timer))
+	except Exception as error:
+		raise ContentSerializationError(
+			f'the {type(content).__name__} that the function returned in a worker process cannot be serialized back '
+			f'({error}); use the thread executor for it'
+		)
@@ -0,0 +1,249 @@
+from .compression import get_compression
+
+from numpy import ndarray, save as save_array, load as load_array
+from pandas import DataFrame, read_parquet
+
+import tempfile
+import pickle
+import os
+
+import dill
+
+try:
+	from pyarrow import Table, feather
+except ImportError:
+	Table = feather = None
+
+
+_SERIALIZERS = {}
+# serializers are tried in this order; the first one that accepts a content and succeeds writes it
+_SERIALIZER_ORDER = []
+
+
+def register_serializer(name, extension, accepts, save, load, memory_map=None, first=True):
+	"""
+	:param str name: name of the format, recorded with each saved content
+	:param str extension: file extension
+	:param callable accepts: takes a content and returns True if the format can hold it
+	:param callable save: takes a content and a binary file object and writes the content
+	:param callable load: takes a binary file object and returns the content
+	:param callable or NoneType memory_map: takes a path and returns the content mapped from the file rather than read
+	:param bool first: if True, the format is tried before the ones registered earlier
+	"""
+	_SERIALIZERS[name] = {
+		'name': name, 'extension': extension, 'accepts': accepts, 'save': save, 'load': load, 'memory_map': memory_map
+	}
+	if name in _SERIALIZER_ORDER:
+		_SERIALIZER_ORDER.remove(name)
+	if first:
+		_SERIALIZER_ORDER.insert(0, name)
+	else:
+		_SERIALIZER_ORDER.append(name)
+
+
+def get_serializer(name):
+	"""
+	:type name: str
+	:rtype: dict
+	"""
+	if name not in _SERIALIZERS:
+		raise ValueError(f'Unsupported content format: {name}')
+	return _SERIALIZERS[name]
+
+
+def get_content_formats():
+	"""
+	:return: names of the registered formats in the order they are tried
+	:rtype: list[str]
+	"""
+	return list(_SERIALIZER_ORDER)
+
+
+def _save_pickle(content, file):
+	pickle.dump(content, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _save_dill(content, file):
+	dill.dump(content, file, protocol=dill.HIGHEST_PROTOCOL)
+
+
+def _save_bytes(content, file):
+	file.write(content)
+
+
+def _save_str(content, file):
+	file.write(content.encode('utf-8', errors='surrogatepass'))
+
+
+def _load_str(file):
+	return file.read().decode('utf-8', errors='surrogatepass')
+
+
+def _accepts_array(content):
+	return isinstance(content, ndarray) and not content.dtype.hasobject
+
+
+def _save_array(content, file):
+	save_array(file, content, allow_pickle=False)
+
+
+def _load_array(file):
+	return load_array(file, allow_pickle=False)
+
+
+def _map_array(path):
+	# copy-on-write mapping: pages are read when touched and writes never reach the file
+	return load_array(path, mmap_mode='c', allow_pickle=False)
+
+
+def _accepts_data_frame(content):
+	return isinstance(content, DataFrame) and feather is not None
+
+
+def _save_feather(content, file):
+	# only uncompressed files can be memory-mapped
+	feather.write_feather(Table.from_pandas(content, preserve_index=True), file, compression='uncompressed')
+
+
+def _load_feather(file):
+	return feather.read_table(file).to_pandas()
+
+
+def _map_feather(path):
+	return feather.read_table(path, memory_map=True).to_pandas()
+
+
+def _save_parquet(content, file):
+	content.to_parquet(file, index=True)
+
+
+# registered from last to first
+register_serializer(
+	name='pickle', extension='pensieve', accepts=lambda content: True, save=_save_pickle, load=pickle.load
+)
+register_serializer(
+	name='dill', extension='dill', accepts=lambda content: True, save=_save_dill, load=dill.load, first=False
+)
+# parquet files are smaller but cannot be memory-mapped, so feather is tried first
+register_serializer(
+	name='parquet', extension='parquet', accepts=_accepts_data_frame, save=_save_parquet, load=read_parquet
+)
+register_serializer(
+	name='feather', extension='arrow', accepts=_accepts_data_frame, save=_save_feather, load=_load_feather,
+	memory_map=_map_feather
+)
+register_serializer(
+	name='str', extension='txt', accepts=lambda content: type(content) is str, save=_save_str, load=_load_str
+)
+register_serializer(
+	name='bytes', extension='bin', accepts=lambda content: type(content) is bytes, save=_save_bytes,
+	load=lambda file: file.read()
+)
+register_serializer(
+	name='npy', extension='npy', accepts=_accepts_array, save=_save_array, load=_load_array, memory_map=_map_array
+)
+
+
+def get_content_path(path, content_format, compression=None):
+	"""
+	:param str path: path of the file without an extension
+	:param str content_format: name of the format
+	:param str or NoneType compression: name of the compression, if any
+	:rtype: str
+	"""
+	content_path = f'{path}.{get_serializer(name=content_format)["extension"]}'
+	if compression is None:
+		return content_path
+	return f'{content_path}.{get_compression(name=compression)["extension"]}'
+
+
+def write_content(file, content, content_formats=None, compression=None):
+	"""
+	writes a content to a binary file object in the first format that accepts it
+	:param file: a binary file object that supports seek and truncate
+	:param content: any object
+	:param list[str] or NoneType content_formats: formats to try before the others, e.g., ['parquet']
+	:param str or NoneType compression: if given, the content is compressed as it is written
+	:return: the name of the format used
+	:rtype: str
+	"""
+	open_writer = None if compression is None else get_compression(name=compression)['open_writer']
+	content_formats = list(content_formats or [])
+	names = content_formats + [name for name in _SERIALIZER_ORDER if name not in content_formats]
+	start = file.tell()
+	error = None
+	for name in names:
+		serializer = get_serializer(name=name)
+		if not serializer['accepts'](content):
+			continue
+		try:
+			if open_writer is None:
+				serializer['save'](content, file)
+			else:
+				with open_writer(file) as writer:
+					serializer['save'](content, writer)
+			return name
+		except Exception as e:
+			error = e
+			file.seek(start)
+			file.truncate()
+	raise error or ValueError(f'No format can hold a {type(content)}')
+
+
+def read_content(file, content_format, compression=None):
+	"""
+	:param file: a binary file object
+	:param str content_format: the format returned by write_content
+	:param str or NoneType compression: the compression the content was written with
+	"""
+	load = get_serializer(name=content_format)['load']
+	if compression is None:
+		return load(file)
+	with get_compression(name=compression)['open_reader'](file) as reader:
+		return load(reader)
+
+
+def save_content(path, content, content_formats=None, compression=None):
+	"""
+	writes a content in the first format that accepts it, through a temporary file that is renamed into place
+	:param str path: path of the file without an extension
+	:param content: any object
+	:param list[str] or NoneType content_formats: formats to try before the others, e.g., ['parquet']
+	:param str or NoneType compression: if given, the content is compressed as it is written
+	:return: the name of the format used
+	:rtype: str
+	"""
+	directory = os.path.dirname(os.path.abspath(path))
+	os.makedirs(directory, exist_ok=True)
+	file_descriptor, temporary_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+	try:
+		with os.fdopen(file_descriptor, 'w+b') as file:
+			content_format = write_content(
+				file=file, content=content, content_formats=content_formats, compression=compression
+			)
+		os.replace(
+			temporary_path, get_content_path(path=path, content_format=content_format, compression=compression)
+		)
+	except BaseException:
+		try:
+			os.remove(temporary_path)
+		except OSError:
+			pass
+		raise
+	return content_format
+
+
+def load_content(path, content_format, memory_map=True, compression=None):
+	"""
+	:param str path: path of the file without an extension
+	:param str content_format: the format returned by save_content
+	:param bool memory_map: if True, formats that support it map the file instead of reading it;
+	compressed files are always read
+	:param str or NoneType compression: the compression the content was saved with
+	"""
+	serializer = get_serializer(name=content_format)
+	content_path = get_content_path(path=path, content_format=content_format, compression=compression)
+	if memory_map and compression is None and serializer['memory_map'] is not None:
+		return serializer['memory_map'](content_path)
+	with open(content_path, 'rb') as file:
+		return read_content(file=file, content_format=content_format, compression=compression)
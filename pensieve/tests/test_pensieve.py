@@ -149,3 +149,858 @@ class StrTestCase(PensieveTestCase):
         self.pensieve.store(key='d', precursors=['c'], function=lambda val: val + 8)
         str_rep = str(self.pensieve)
         self.assertIsNotNone(str_rep)
+
+
+class FingerprintTestCase(PensieveTestCase):
+    def test_precursors_reference_holds_digests_of_dataframes(self):
+        from pandas import DataFrame
+        calls = []
+
+        def add(args):
+            calls.append(1)
+            return args.first + args.second
+
+        self.pensieve.store(key='first', content=DataFrame({'x': [1, 2, 3]}))
+        self.pensieve.store(key='second', content=DataFrame({'x': [4, 5, 6]}))
+        self.pensieve.store(key='total', precursors=['first', 'second'], function=add)
+        memory = self.pensieve.memories_dictionary['total']
+        function_fingerprint, precursor_fingerprints = memory._precursors_reference
+        self.assertIsInstance(function_fingerprint, str)
+        self.assertEqual(set(precursor_fingerprints.keys()), {'first', 'second'})
+        self.assertTrue(all(isinstance(digest, str) for digest in precursor_fingerprints.values()))
+
+        memory.mark_stale()
+        self.assertEqual(list(self.pensieve['total']['x']), [5, 7, 9])
+        self.assertEqual(len(calls), 1)
+
+    def test_object_values_of_different_types_are_told_apart(self):
+        from pandas import Series, DataFrame, Index
+        from ..get_fingerprint import get_fingerprint
+
+        self.assertNotEqual(get_fingerprint(Series([1], dtype=object)), get_fingerprint(Series(['1'], dtype=object)))
+        self.assertNotEqual(
+            get_fingerprint(DataFrame({'x': [1]}, dtype=object)), get_fingerprint(DataFrame({'x': ['1']}))
+        )
+        self.assertNotEqual(get_fingerprint(Index([1], dtype=object)), get_fingerprint(Index(['1'])))
+
+        self.pensieve.store(key='x', content=Series([1], dtype=object))
+        self.pensieve.store(key='y', precursors=['x'], function=lambda x: type(x.iloc[0]).__name__)
+        self.assertEqual(self.pensieve['y'], 'int')
+        self.pensieve.store(key='x', content=Series(['1'], dtype=object))
+        self.assertEqual(self.pensieve['y'], 'str')
+
+
+class GenerationTestCase(PensieveTestCase):
+    def test_unchanged_precursors_are_validated_without_fingerprints(self):
+        from unittest.mock import patch
+        from ..Memory import Memory
+        self.pensieve.store(key='root', content=[1, 2, 3])
+        self.pensieve.store(key='child', precursors=['root'], function=lambda x: sum(x))
+        generation = self.pensieve.memories_dictionary['root'].generation
+        self.pensieve.memories_dictionary['root'].mark_stale()
+        with patch.object(Memory, '_get_precursors_reference', side_effect=AssertionError):
+            self.assertEqual(self.pensieve['child'], 6)
+        self.assertEqual(self.pensieve.memories_dictionary['root'].generation, generation)
+
+    def test_storing_new_content_increases_generation(self):
+        self.pensieve.store(key='root', content=1)
+        self.pensieve.store(key='child', precursors=['root'], function=lambda x: x + 1)
+        generation = self.pensieve.memories_dictionary['root'].generation
+        self.pensieve.store(key='root', content=2)
+        self.assertGreater(self.pensieve.memories_dictionary['root'].generation, generation)
+        self.assertEqual(self.pensieve['child'], 3)
+
+
+class FunctionFingerprintTestCase(TestCase):
+    def test_closure_values_change_the_fingerprint(self):
+        from ..get_function_fingerprint import get_function_fingerprint
+
+        def make_function(number):
+            return lambda: number
+
+        self.assertEqual(get_function_fingerprint(make_function(1)), get_function_fingerprint(make_function(1)))
+        self.assertNotEqual(get_function_fingerprint(make_function(1)), get_function_fingerprint(make_function(2)))
+
+    def test_fingerprint_is_cached_per_function(self):
+        from unittest.mock import patch
+        from .. import get_function_fingerprint as module
+
+        def function(x):
+            return x + 1
+
+        first = module.get_function_fingerprint(function)
+        with patch.object(module, '_compute_function_fingerprint', side_effect=AssertionError):
+            self.assertEqual(module.get_function_fingerprint(function), first)
+
+    def test_functions_without_source_can_be_fingerprinted(self):
+        from ..get_function_fingerprint import get_function_fingerprint, serialize_function
+        namespace = {}
+        exec('function = lambda x: x * 2', namespace)
+        self.assertIsInstance(get_function_fingerprint(namespace['function']), str)
+        self.assertIs(serialize_function(namespace['function']), serialize_function(namespace['function']))
+
+    def test_globals_and_helpers_change_the_fingerprint(self):
+        from ..get_function_fingerprint import get_function_fingerprint
+        namespace = {}
+        exec('SCALE = 2\ndef helper(x):\n    return x * SCALE\nfunction = lambda x: helper(x) + 1', namespace)
+        fingerprint = get_function_fingerprint(namespace['function'])
+        namespace['SCALE'] = 3
+        self.assertNotEqual(get_function_fingerprint(namespace['function']), fingerprint)
+        namespace['SCALE'] = 2
+        self.assertEqual(get_function_fingerprint(namespace['function']), fingerprint)
+
+
+class InvalidateTestCase(PensieveTestCase):
+    def test_invalidating_diamonds_visits_each_memory_once(self):
+        self.pensieve.store(key='left_0', content=1)
+        self.pensieve.store(key='right_0', content=1)
+        for i in range(1, 40):
+            for side in ['left', 'right']:
+                self.pensieve.store(
+                    key=f'{side}_{i}', precursors=[f'left_{i - 1}', f'right_{i - 1}'],
+                    function=lambda x: sum(x.values()), evaluate=False
+                )
+        self.assertEqual(self.pensieve['left_39'], 2 ** 39)
+        self.pensieve.invalidate(['left_0', 'right_0'])
+        self.assertTrue(all(memory.is_stale for memory in self.pensieve.memories_dictionary.values()))
+
+    def test_invalidate_accepts_a_single_key(self):
+        self.pensieve.store(key='root', content=1)
+        self.pensieve.store(key='child', precursors=['root'], function=lambda x: x + 1)
+        self.pensieve.invalidate('root')
+        self.assertTrue(self.pensieve.memories_dictionary['child'].is_stale)
+        self.assertEqual(self.pensieve['child'], 2)
+
+
+class StaleDependenciesTestCase(PensieveTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pensieve.store(key='a', content=1, evaluate=False)
+        self.pensieve.store(key='b', precursors=['a'], function=lambda x: x + 1, evaluate=False)
+        self.pensieve.store(key='c', precursors=['a'], function=lambda x: x + 2, evaluate=False)
+        self.pensieve.store(key='d', precursors=['b', 'c'], function=lambda x: x.b + x.c, evaluate=False)
+
+    def test_stale_dependencies_are_unique_and_topologically_sorted(self):
+        keys = [memory.key for memory in self.pensieve.memories_dictionary['d'].stale_dependencies]
+        self.assertEqual(sorted(keys), ['a', 'b', 'c'])
+        self.assertEqual(keys[0], 'a')
+
+    def test_update_schedule_includes_requested_memories_once(self):
+        schedule = self.pensieve.get_update_schedule(keys=['d', 'b'])
+        keys = [memory.key for schedule_round in schedule for memory in schedule_round]
+        self.assertEqual(sorted(keys), ['a', 'b', 'c', 'd'])
+        self.assertEqual(keys[0], 'a')
+        self.assertEqual(keys[-1], 'd')
+
+    def test_update_schedule_rounds_follow_dependencies(self):
+        schedule = self.pensieve.get_update_schedule(keys=['d'])
+        rounds = [sorted(memory.key for memory in schedule_round) for schedule_round in schedule]
+        self.assertEqual(rounds, [['a'], ['b', 'c'], ['d']])
+
+
+class ParallelEvaluationTestCase(TestCase):
+    def test_successors_start_without_waiting_for_the_whole_round(self):
+        from threading import Event
+        fast_chain_done = Event()
+
+        def slow():
+            # only finishes early if the fast chain's second memory could run while this one was running
+            return fast_chain_done.wait(timeout=5)
+
+        def fast_second(x):
+            fast_chain_done.set()
+            return x + 1
+
+        pensieve = Pensieve(num_threads=2)
+        pensieve.store(key='slow', function=slow, evaluate=False)
+        pensieve.store(key='fast_first', function=lambda: 1, evaluate=False)
+        pensieve.store(key='fast_second', precursors=['fast_first'], function=fast_second, evaluate=False)
+        self.assertEqual(pensieve.evaluate(output=True), [True, 1, 2])
+
+    def test_rounds_scheduler_gives_the_same_results(self):
+        results = []
+        for scheduler in ['dependencies', 'rounds']:
+            pensieve = Pensieve(num_threads=3, scheduler=scheduler)
+            pensieve.store(key='a', content=1, evaluate=False)
+            pensieve.store(key='b', precursors=['a'], function=lambda x: x + 1, evaluate=False)
+            pensieve.store(key='c', precursors=['a'], function=lambda x: x + 2, evaluate=False)
+            pensieve.store(key='d', precursors=['b', 'c'], function=lambda x: x.b * x.c, evaluate=False)
+            results.append(pensieve.evaluate(output=True))
+        self.assertEqual(results[0], [1, 2, 3, 6])
+        self.assertEqual(results[0], results[1])
+
+    def test_process_executor_runs_functions_in_other_processes(self):
+        import os
+        generator = (i for i in range(3))
+        pensieve = Pensieve(num_threads=2, executor='process')
+        try:
+            pensieve.store(key='parent_pid', function=lambda: os.getpid(), evaluate=False)
+            pensieve.store(key='worker_pid', precursors=['parent_pid'], function=lambda x: os.getpid(), evaluate=False)
+            # a generator cannot be serialized so this function falls back to a thread of this process
+            pensieve.store(
+                key='local_pid', precursors=['parent_pid'], function=lambda x: generator and os.getpid(),
+                evaluate=False
+            )
+            pensieve.evaluate()
+            self.assertNotEqual(pensieve['worker_pid'], os.getpid())
+            self.assertEqual(pensieve['local_pid'], os.getpid())
+            self.assertIn('worker_pid', pensieve.function_durations.measurements)
+        finally:
+            pensieve.process_pool.shutdown()
+
+    def test_outputs_that_cannot_be_sent_back_from_a_process_raise(self):
+        from ..exceptions import ContentSerializationError
+        pensieve = Pensieve(num_threads=2, executor='process')
+        try:
+            pensieve.store(key='n', content=3)
+            pensieve.store(key='generator', precursors=['n'], function=lambda n: (i for i in range(n)), evaluate=False)
+            with self.assertRaises(ContentSerializationError):
+                pensieve.evaluate()
+        finally:
+            pensieve.process_pool.shutdown()
+
+
+class AsyncTestCase(PensieveTestCase):
+    def test_coroutine_functions_are_awaited_when_accessed_synchronously(self):
+        async def read():
+            return 'data'
+
+        self.pensieve.store(key='data', function=read)
+        self.pensieve.store(key='length', precursors=['data'], function=lambda x: len(x))
+        self.assertEqual(self.pensieve['data'], 'data')
+        self.assertEqual(self.pensieve['length'], 4)
+
+    def test_evaluate_async_awaits_independent_memories_concurrently(self):
+        import asyncio
+        from time import perf_counter
+
+        def create_reader(value):
+            async def read():
+                await asyncio.sleep(0.2)
+                return value
+            return read
+
+        for i in range(5):
+            self.pensieve.store(key=f'source_{i}', function=create_reader(i), evaluate=False)
+        self.pensieve.store(
+            key='total', precursors=[f'source_{i}' for i in range(5)], function=lambda x: sum(x.values()),
+            evaluate=False
+        )
+        loop = asyncio.new_event_loop()
+        start = perf_counter()
+        try:
+            result = loop.run_until_complete(self.pensieve.evaluate_async(keys='total', output=True))
+        finally:
+            loop.close()
+        self.assertLess(perf_counter() - start, 0.8)
+        self.assertEqual(result, [10])
+        self.assertFalse(self.pensieve.memories_dictionary['total'].is_stale)
+        self.assertIn('source_0', self.pensieve.function_durations.measurements)
+
+
+class CriticalPathTestCase(PensieveTestCase):
+    def setUp(self):
+        super().setUp()
+        for key in ['a', 'b', 'c']:
+            self.pensieve.store(key=key, function=lambda: 1, evaluate=False)
+        self.pensieve.store(key='long', precursors=['c'], function=lambda x: x, evaluate=False)
+        self.pensieve.store(key='longer', precursors=['long'], function=lambda x: x, evaluate=False)
+
+    def test_simulated_makespan_depends_on_threads(self):
+        self.assertEqual(self.pensieve.simulate_evaluation(num_threads=1, default_duration=1), 5)
+        self.assertEqual(self.pensieve.simulate_evaluation(num_threads=2, default_duration=1), 3)
+
+    def test_jobs_on_the_critical_path_start_first(self):
+        from concurrent.futures import Future
+        from ..execute_jobs import execute_jobs
+        from ..critical_path import get_critical_paths
+        jobs = self.pensieve.get_update_jobs(keys=list(self.pensieve.keys()))
+        started = []
+
+        def submit(job):
+            started.append(job.key)
+            future = Future()
+            future.set_result(None)
+            return future
+
+        priorities = get_critical_paths(jobs=jobs, durations={job.key: 1 for job in jobs})
+        execute_jobs(jobs=jobs, submit=submit, max_in_flight=1, priorities=priorities)
+        self.assertEqual(started[0], 'c')
+        self.assertEqual(priorities['c'], 3)
+
+
+class SingleFlightTestCase(PensieveTestCase):
+    def test_concurrent_readers_evaluate_each_memory_once(self):
+        from threading import Barrier, Thread
+        from time import sleep
+        calls = {'root': 0, 'child': 0}
+
+        def root():
+            calls['root'] += 1
+            sleep(0.05)
+            return 1
+
+        def child(x):
+            calls['child'] += 1
+            sleep(0.05)
+            return x + 1
+
+        self.pensieve.store(key='root', function=root, evaluate=False)
+        self.pensieve.store(key='child', precursors=['root'], function=child, evaluate=False)
+        barrier = Barrier(32)
+        results = []
+
+        def read():
+            barrier.wait()
+            results.append(self.pensieve['child'])
+
+        threads = [Thread(target=read) for _ in range(32)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [2] * 32)
+        self.assertEqual(calls, {'root': 1, 'child': 1})
+
+    def test_errors_reach_every_waiting_reader(self):
+        def fail():
+            raise ValueError('failed')
+
+        self.pensieve.store(key='root', function=fail, evaluate=False)
+        with self.assertRaises(ValueError):
+            _ = self.pensieve['root']
+        self.assertIsNone(self.pensieve.memories_dictionary['root']._flight)
+
+    def test_readers_do_not_return_a_content_replaced_while_they_read(self):
+        from threading import Thread
+
+        self.pensieve.store(key='x', content=1)
+        self.pensieve.store(key='y', precursors=['x'], function=lambda x: x * 10)
+        self.assertEqual(self.pensieve['y'], 10)
+        self.pensieve.store(key='x', content=2, evaluate=False)
+        memory = self.pensieve.memories_dictionary['y']
+        is_content_ready = memory._is_content_ready
+        evaluated = []
+
+        def evaluate_in_another_thread():
+            # another thread brings the content up to date while this reader checks whether it is ready
+            if not evaluated:
+                evaluated.append(True)
+                thread = Thread(target=memory.get_content)
+                thread.start()
+                thread.join()
+            return is_content_ready()
+
+        memory._is_content_ready = evaluate_in_another_thread
+        try:
+            self.assertEqual(memory.get_content(), 20)
+        finally:
+            del memory._is_content_ready
+
+
+class WorkerPoolTestCase(TestCase):
+    def test_pool_is_reused_resized_and_closed(self):
+        with Pensieve(num_threads=2) as pensieve:
+            pensieve.store(key='a', content=1, evaluate=False)
+            pensieve.store(key='b', precursors=['a'], function=lambda x: x + 1, evaluate=False)
+            pensieve.evaluate()
+            pool = pensieve.thread_pool
+            pensieve.store(key='b', precursors=['a'], function=lambda x: x + 2, evaluate=False)
+            self.assertEqual(pensieve.evaluate(keys='b', output=True), [3])
+            self.assertIs(pensieve.thread_pool, pool)
+            pensieve.num_threads = 3
+            self.assertIsNot(pensieve.thread_pool, pool)
+            self.assertEqual(pensieve.thread_pool._max_workers, 3)
+        self.assertIsNone(pensieve._thread_pool)
+
+    def test_nested_evaluation_inside_a_worker_does_not_deadlock(self):
+        pensieve = Pensieve(num_threads=2)
+        pensieve.store(key='inner', function=lambda: 1, evaluate=False)
+        for i in range(4):
+            pensieve.store(
+                key=f'outer_{i}', function=lambda: pensieve.evaluate(keys=['inner'], output=True)[0] + 1,
+                evaluate=False
+            )
+        self.assertEqual(pensieve.evaluate(keys=[f'outer_{i}' for i in range(4)], output=True), [2, 2, 2, 2])
+        pensieve.close()
+
+    def test_threads_computing_a_flight_do_not_wait_for_the_pool(self):
+        from threading import Event, Thread
+        from time import sleep
+        import os
+
+        # a pool of one worker
+        pensieve = Pensieve(num_threads=-(os.cpu_count() or 1))
+        a_started, b_started, proceed = Event(), Event(), Event()
+
+        def a():
+            a_started.set()
+            proceed.wait()
+            # the only worker may be waiting for a, so c has to be evaluated without it
+            return pensieve.evaluate(keys=['c'], output=True)[0] + 1
+
+        def b():
+            b_started.set()
+            return pensieve.evaluate(keys=['d'], output=True)[0] + 1
+
+        pensieve.store(key='c', function=lambda: 1, evaluate=False)
+        pensieve.store(key='a', function=a, evaluate=False)
+        pensieve.store(key='d', precursors=['a'], function=lambda a: a + 1, evaluate=False)
+        pensieve.store(key='b', function=b, evaluate=False)
+        results = {}
+        readers = [Thread(target=lambda key=key: results.update({key: pensieve[key]})) for key in ('a', 'b')]
+        readers[0].start()
+        a_started.wait()
+        readers[1].start()
+        b_started.wait()
+        sleep(0.2)
+        proceed.set()
+        for reader in readers:
+            reader.join(timeout=10)
+        self.assertFalse(any(reader.is_alive() for reader in readers))
+        self.assertEqual(results, {'a': 2, 'b': 4})
+        pensieve.close()
+
+
+class MemoryBudgetTestCase(TestCase):
+    def setUp(self):
+        self.pensieve = Pensieve(memory_budget='200KB')
+        self.pensieve.store(key='n', content=10000)
+        self.pensieve.store(key='a', precursors=['n'], function=lambda n: list(range(n)))
+        self.pensieve.store(key='b', precursors=['n'], function=lambda n: list(range(n, 2 * n)))
+        self.pensieve.store(key='c', precursors=['a', 'b'], function=lambda a, b: len(a) + len(b))
+
+    def test_contents_are_evicted_and_recomputed_on_demand(self):
+        statistics = self.pensieve.eviction_statistics
+        self.assertGreater(statistics['evictions'], 0)
+        self.assertLessEqual(statistics['used_bytes'], statistics['budget'])
+        self.assertTrue(self.pensieve.memories_dictionary['a'].is_evicted)
+        self.assertFalse(self.pensieve.memories_dictionary['c'].is_stale)
+        recomputations = statistics['recomputations']
+        self.assertEqual(self.pensieve['a'][-1], 9999)
+        self.assertEqual(self.pensieve.eviction_statistics['recomputations'], recomputations + 1)
+        self.assertEqual(self.pensieve['c'], 20000)
+
+    def test_pinned_and_frozen_memories_are_not_evicted(self):
+        self.pensieve.pin('a')
+        self.pensieve.freeze('b')
+        self.assertFalse(self.pensieve.memories_dictionary['b'].is_evicted)
+        self.assertEqual(self.pensieve['a'][-1], 9999)
+        self.pensieve.store(key='d', precursors=['n'], function=lambda n: list(range(2 * n)))
+        self.pensieve.store(key='e', precursors=['n'], function=lambda n: list(range(3 * n)))
+        self.assertFalse(self.pensieve.memories_dictionary['a'].is_evicted)
+        self.assertEqual(self.pensieve['b'][0], 10000)
+
+    def test_contents_held_by_several_memories_are_charged_once(self):
+        import pickle
+
+        pensieve = Pensieve(memory_budget='10MB')
+        pensieve.store(key='a', content=list(range(10000)))
+        pensieve.store(key='b', precursors=['a'], function=lambda a: a)
+        self.assertIs(pensieve['b'], pensieve['a'])
+        size = pensieve.memories_dictionary['a'].size
+        self.assertEqual(pensieve.eviction_statistics['used_bytes'], size)
+        pensieve.erase('b')
+        self.assertEqual(pensieve.eviction_statistics['used_bytes'], size)
+        pensieve.erase('a')
+        self.assertEqual(pensieve.eviction_statistics['used_bytes'], 0)
+
+        pensieve.store(key='c', content=[1, 2])
+        unpickled = pickle.loads(pickle.dumps(pensieve))
+        self.assertEqual(unpickled.eviction_statistics['used_bytes'], pensieve.eviction_statistics['used_bytes'])
+
+    def test_expensive_contents_are_spilled_and_memory_mapped_back(self):
+        from tempfile import TemporaryDirectory
+        from time import sleep
+        import numpy as np
+
+        def make_array(n):
+            sleep(0.05)
+            return np.arange(n, dtype='float64')
+
+        with TemporaryDirectory() as directory:
+            pensieve = Pensieve(memory_budget='100KB', spill=directory)
+            pensieve.store(key='n', content=10000)
+            pensieve.store(key='a', precursors=['n'], function=make_array)
+            pensieve.store(key='b', precursors=['n'], function=lambda n: make_array(n) + 1)
+            evicted = [key for key in ('a', 'b') if pensieve.memories_dictionary[key].is_evicted]
+            self.assertEqual(len(evicted), 1)
+            self.assertEqual(pensieve.eviction_statistics['spills'], 1)
+
+            content = pensieve[evicted[0]]
+            self.assertIsInstance(content, np.memmap)
+            self.assertEqual(content[-1], 9999 if evicted[0] == 'a' else 10000)
+            statistics = pensieve.eviction_statistics
+            self.assertEqual((statistics['faults'], statistics['recomputations']), (1, 0))
+            self.assertIn('mean_fault_duration', pensieve.performance.columns)
+
+
+class SizeEstimationTestCase(PensieveTestCase):
+    def test_sizes_follow_buffers_and_views(self):
+        import numpy as np
+        from pandas import DataFrame
+        from ..estimate_size import estimate_size
+
+        array = np.zeros(100000)
+        self.assertGreaterEqual(estimate_size(array), array.nbytes)
+        seen = {}
+        both = estimate_size([array, array[10:]], seen=seen)
+        self.assertLess(both, 2 * array.nbytes)
+        data = DataFrame({'x': np.arange(1000), 'y': [str(i) * 10 for i in range(1000)]})
+        self.assertGreater(estimate_size(data), data.memory_usage(deep=False).sum())
+        self.assertAlmostEqual(
+            estimate_size(list(range(100000))) / estimate_size(list(range(1000))), 100, delta=5
+        )
+
+    def test_memory_report_separates_retained_and_shared_bytes(self):
+        import numpy as np
+        self.pensieve.store(key='a', function=lambda: np.ones(100000))
+        self.pensieve.store(key='b', precursors=['a'], function=lambda a: a)
+        self.pensieve.store(key='c', precursors=['a'], function=lambda a: a * 2)
+        report = self.pensieve.memory_report().set_index('key')
+        self.assertGreaterEqual(report.loc['b', 'shared_bytes'], 800000)
+        self.assertLess(report.loc['b', 'retained_bytes'], 100000)
+        self.assertGreaterEqual(report.loc['c', 'retained_bytes'], 800000)
+
+
+class ResultCacheTestCase(TestCase):
+    def test_results_are_reused_by_a_new_pensieve(self):
+        from tempfile import TemporaryDirectory
+        calls = []
+
+        def add(x):
+            calls.append(x)
+            return x + 1
+
+        with TemporaryDirectory() as directory:
+            for _ in range(2):
+                pensieve = Pensieve(backup=directory)
+                pensieve.store(key='x', content=1)
+                pensieve.store(key='y', precursors=['x'], function=add)
+                self.assertEqual(pensieve['y'], 2)
+            self.assertEqual(calls, [1])
+            # stored contents are not function results and stay out of the cache
+            self.assertEqual(pensieve.result_cache.statistics['hits'], 1)
+
+            pensieve.store(key='x', content=2)
+            self.assertEqual(pensieve['y'], 3)
+            self.assertEqual(calls, [1, 2])
+            self.assertEqual(pensieve.result_cache.statistics['writes'], 1)
+            self.assertEqual(pensieve.result_cache.statistics['misses'], 1)
+
+    def test_results_of_contents_known_only_by_identity_are_not_cached(self):
+        from tempfile import TemporaryDirectory
+
+        with TemporaryDirectory() as directory:
+            pensieve = Pensieve(backup=directory)
+            # a generator cannot be serialized, so its fingerprint stands for where it is in memory
+            pensieve.store(key='x', content=(i for i in range(3)))
+            pensieve.store(key='y', precursors=['x'], function=lambda x: 1)
+            self.assertEqual(pensieve['y'], 1)
+            self.assertEqual(pensieve.result_cache.statistics['writes'], 0)
+            self.assertEqual(pensieve.result_cache.statistics['misses'], 0)
+
+
+class SaveAndLoadTestCase(TestCase):
+    def test_only_changed_memories_are_written_again(self):
+        from tempfile import TemporaryDirectory
+        import os
+
+        pensieve = Pensieve()
+        pensieve.store(key='x', content=1)
+        pensieve.store(key='y', content=2)
+        pensieve.store(key='z', precursors=['x', 'y'], function=lambda x, y: x + y)
+        pensieve.store(key='w', content=0)
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'pensieve')
+            self.assertEqual(pensieve.save(path=path, echo=0), 13)
+            self.assertEqual(pensieve.save(path=path, echo=0), 0)
+
+            pensieve.store(key='x', content=10)
+            pensieve.erase('w')
+            self.assertEqual(pensieve['z'], 12)
+            self.assertEqual(pensieve.save(path=path, echo=0), 5)
+            self.assertFalse(os.path.exists(os.path.join(path, 'w')))
+
+            loaded = Pensieve.load(path=path, echo=False)
+            self.assertEqual(list(loaded.keys()), ['x', 'y', 'z'])
+            self.assertEqual(loaded['z'], 12)
+            self.assertEqual(loaded.save(path=path, echo=0), 0)
+            loaded.store(key='y', content=3)
+            self.assertEqual(loaded['z'], 13)
+
+    def test_snapshot_and_origin_saved_to_the_same_directory(self):
+        from tempfile import TemporaryDirectory
+
+        pensieve = Pensieve()
+        pensieve.store(key='x', content=1)
+        pensieve.store(key='y', precursors=['x'], function=lambda x: x + 1)
+        with TemporaryDirectory() as directory:
+            pensieve.save(path=directory, echo=0)
+            snapshot = pensieve.snapshot()
+            pensieve.store(key='x', content=10)
+            pensieve.save(path=directory, echo=0)
+            # the files of x and y on disk are the origin's now, so the snapshot writes its own again
+            self.assertGreater(snapshot.save(path=directory, echo=0), 0)
+            loaded = Pensieve.load(path=directory, echo=False)
+            self.assertEqual((loaded['x'], loaded['y']), (1, 2))
+            self.assertEqual(snapshot.save(path=directory, echo=0), 0)
+
+    def test_contents_are_saved_in_the_format_of_their_type(self):
+        from tempfile import TemporaryDirectory
+        import numpy as np
+        import os
+
+        pensieve = Pensieve()
+        pensieve.store(key='array', content=np.arange(10))
+        pensieve.store(key='text', content='hello')
+        pensieve.store(key='data', content=b'\x00\x01')
+        pensieve.store(key='other', content={'a': [1, 2]})
+        with TemporaryDirectory() as directory:
+            pensieve.save(path=directory, echo=0)
+            for key, file_name in [
+                ('array', 'content.npy'), ('text', 'content.txt'), ('data', 'content.bin'), ('other', 'content.pensieve')
+            ]:
+                self.assertTrue(os.path.exists(os.path.join(directory, key, file_name)))
+
+            loaded = Pensieve.load(path=directory, echo=False)
+            self.assertIsInstance(loaded['array'], np.memmap)
+            self.assertEqual(loaded['array'].tolist(), list(range(10)))
+            self.assertEqual((loaded['text'], loaded['data'], loaded['other']), ('hello', b'\x00\x01', {'a': [1, 2]}))
+
+    def test_successors_of_contents_that_could_not_be_saved_are_stale_after_load(self):
+        from tempfile import TemporaryDirectory
+
+        pensieve = Pensieve()
+        pensieve.store(key='n', content=2)
+        # a generator cannot be pickled, so the content of a is not saved and a is loaded stale
+        pensieve.store(key='a', precursors=['n'], function=lambda n: ((i for i in range(n)), n * 10))
+        pensieve.store(key='b', precursors=['a'], function=lambda a: a[1])
+        self.assertEqual(pensieve['b'], 20)
+        with TemporaryDirectory() as directory:
+            pensieve.save(path=directory, echo=0)
+            loaded = Pensieve.load(path=directory, echo=False)
+            self.assertTrue(loaded.memories_dictionary['a'].is_stale)
+            self.assertTrue(loaded.memories_dictionary['b'].is_stale)
+            loaded.store(key='n', content=5)
+            self.assertEqual(loaded['b'], 50)
+
+    def test_lazy_load_reads_contents_on_first_access(self):
+        from concurrent.futures import wait
+        from tempfile import TemporaryDirectory
+
+        pensieve = Pensieve()
+        pensieve.store(key='x', content=[1, 2])
+        pensieve.store(key='y', precursors=['x'], function=lambda x: sum(x))
+        pensieve.store(key='z', precursors=['y'], function=lambda y: y * 2)
+        with TemporaryDirectory() as directory:
+            pensieve.save(path=directory, echo=0)
+            loaded = Pensieve.load(path=directory, echo=False, lazy=True)
+            memories = loaded.memories_dictionary
+            self.assertEqual(loaded.get_precursor_keys('z'), ['y'])
+            self.assertTrue(all(memory.is_evicted for memory in memories.values()))
+            count = loaded.function_durations.measurements['z'].count
+            self.assertEqual(loaded['z'], 6)
+            self.assertTrue(memories['y'].is_evicted)
+            self.assertEqual(loaded.function_durations.measurements['z'].count, count)
+
+            wait(loaded.prefetch(keys=['x', 'y']))
+            self.assertFalse(memories['y'].is_evicted)
+            self.assertEqual(memories['x']._content, [1, 2])
+
+    def test_archive_holds_the_pensieve_in_a_single_file(self):
+        from tempfile import TemporaryDirectory
+        import numpy as np
+        import os
+
+        pensieve = Pensieve()
+        pensieve.store(key='x', content=np.arange(5))
+        pensieve.store(key='y', content=2)
+        pensieve.store(key='z', precursors=['x', 'y'], function=lambda x, y: int(x.sum()) * y)
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'pensieve.archive')
+            self.assertEqual(pensieve.save(path=path, echo=0, archive=True), 10)
+            self.assertTrue(os.path.isfile(path))
+            # the layout is detected from the existing file
+            self.assertEqual(pensieve.save(path=path, echo=0), 0)
+            pensieve.store(key='y', content=3)
+            self.assertEqual(pensieve.save(path=path, echo=0), 4)
+
+            loaded = Pensieve.load(path=path, echo=False, lazy=True)
+            self.assertTrue(loaded.memories_dictionary['x'].is_evicted)
+            self.assertEqual(loaded['x'].tolist(), list(range(5)))
+            self.assertEqual(loaded['z'], 30)
+            loaded.close()
+
+    def test_archives_are_closed_after_save_and_with_the_pensieve(self):
+        from ..PensieveArchive import PensieveArchive
+        from tempfile import TemporaryDirectory
+        from unittest import mock
+        import os
+
+        pensieve = Pensieve()
+        pensieve.store(key='x', content=[1, 2])
+        pensieve.store(key='y', precursors=['x'], function=lambda x: sum(x))
+        close = PensieveArchive.close
+        with TemporaryDirectory() as directory, mock.patch.object(
+            PensieveArchive, 'close', autospec=True, side_effect=close
+        ) as closed:
+            path = os.path.join(directory, 'pensieve.archive')
+            pensieve.save(path=path, echo=0, archive=True)
+            self.assertEqual(closed.call_count, 1)
+
+            loaded = Pensieve.load(path=path, echo=False, lazy=True)
+            self.assertEqual(closed.call_count, 1)
+            loaded.close()
+            self.assertEqual(closed.call_count, 2)
+            # a content that was not read yet opens the archive again
+            self.assertEqual(loaded['y'], 3)
+
+    def test_contents_are_compressed_as_they_are_saved(self):
+        from tempfile import TemporaryDirectory
+        import numpy as np
+        import os
+
+        pensieve = Pensieve(compression='zlib')
+        pensieve.store(key='x', content=np.zeros(100000))
+        pensieve.store(key='y', content=[1, 2])
+        pensieve.set_compression('y', False)
+        with TemporaryDirectory() as directory:
+            pensieve.save(path=directory, echo=0)
+            self.assertTrue(os.path.exists(os.path.join(directory, 'x', 'content.npy.gz')))
+            self.assertLess(os.path.getsize(os.path.join(directory, 'x', 'content.npy.gz')), 10000)
+            self.assertTrue(os.path.exists(os.path.join(directory, 'y', 'content.pensieve')))
+
+            loaded = Pensieve.load(path=directory, echo=False)
+            self.assertEqual(loaded.compression, 'zlib')
+            self.assertEqual(loaded['x'].sum(), 0)
+            self.assertEqual(loaded['y'], [1, 2])
+
+            # changing the compression rewrites the content and removes the old file
+            pensieve.compression = None
+            self.assertEqual(pensieve.save(path=directory, echo=0), 2)
+            self.assertTrue(os.path.exists(os.path.join(directory, 'x', 'content.npy')))
+            self.assertFalse(os.path.exists(os.path.join(directory, 'x', 'content.npy.gz')))
+
+
+class PickleTestCase(TestCase):
+    def test_content_buffers_are_pickled_out_of_band(self):
+        import numpy as np
+        import pickle
+
+        pensieve = Pensieve()
+        pensieve.store(key='x', content=np.arange(1000))
+        pensieve.store(key='y', precursors=['x'], function=lambda x: x * 2)
+        self.assertEqual(pensieve['y'][-1], 1998)
+
+        buffers = []
+        serialized = pickle.dumps(pensieve, protocol=5, buffer_callback=buffers.append)
+        self.assertEqual(len(buffers), 2)
+        in_band = pickle.dumps(pensieve, protocol=4)
+        self.assertLessEqual(len(serialized), len(in_band) - sum(buffer.raw().nbytes for buffer in buffers))
+        loaded = pickle.loads(serialized, buffers=buffers)
+        self.assertTrue(np.shares_memory(loaded['x'], np.frombuffer(buffers[0], dtype=loaded['x'].dtype)))
+        self.assertEqual(loaded['y'][-1], 1998)
+
+        # older protocols hold the buffers in band
+        self.assertEqual(pickle.loads(in_band)['y'][-1], 1998)
+
+
+class MergeTestCase(TestCase):
+    def test_merge_keeps_results_whose_precursors_are_unchanged(self):
+        from ..exceptions import PensieveError
+
+        calls = []
+        left = Pensieve()
+        left.store(key='x', content=1)
+        left.store(key='y', precursors=['x'], function=lambda x: calls.append('y') or x + 1)
+        right = Pensieve()
+        right.store(key='x', content=1)
+        right.store(key='z', precursors=['x'], function=lambda x: calls.append('z') or x * 10)
+        self.assertEqual((left['y'], right['z']), (2, 10))
+
+        merged = left + right
+        self.assertEqual((merged['y'], merged['z']), (2, 10))
+        self.assertEqual(calls, ['y', 'z'])
+        self.assertEqual(merged.get_successor_keys('x'), ['y', 'z'])
+
+        # the memories are shared until one side changes
+        merged.store(key='x', content=3)
+        self.assertEqual((merged['y'], left['y']), (4, 2))
+
+        other = Pensieve()
+        other.store(key='x', content=5)
+        other.store(key='z', precursors=['x'], function=lambda x: calls.append('z') or x * 10)
+        self.assertEqual(other['z'], 50)
+        self.assertEqual((left + other)['z'], 10)
+
+        conflicting = Pensieve()
+        conflicting.store(key='x', content=1)
+        conflicting.store(key='y', precursors=['x'], function=lambda x: x - 1)
+        with self.assertRaises(PensieveError):
+            left + conflicting
+
+
+class SnapshotTestCase(TestCase):
+    def test_snapshot_is_unaffected_by_later_changes(self):
+        pensieve = Pensieve()
+        pensieve.store(key='x', content=[1, 2])
+        pensieve.store(key='y', precursors=['x'], function=lambda x: sum(x))
+        self.assertEqual(pensieve['y'], 3)
+
+        snapshot = pensieve.snapshot()
+        self.assertIs(snapshot['x'], pensieve['x'])
+        pensieve.store(key='x', content=[10])
+        pensieve.store(key='z', precursors=['x', 'y'], function=lambda x, y: y)
+        self.assertEqual((pensieve['y'], snapshot['y']), (10, 3))
+        self.assertEqual(snapshot.get_successor_keys('x'), ['y'])
+        self.assertNotIn('z', snapshot.memories_dictionary)
+
+        snapshot.store(key='x', content=[5])
+        self.assertEqual((pensieve['y'], snapshot['y']), (10, 5))
+
+    def test_memories_held_before_a_snapshot_stay_with_the_origin(self):
+        pensieve = Pensieve()
+        pensieve.store(key='x', content=1)
+        pensieve.store(key='y', precursors=['x'], function=lambda x: x * 10)
+        memory = pensieve.memories_dictionary['y']
+        snapshot = pensieve.snapshot()
+        pensieve.store(key='x', content=2)
+        self.assertIs(pensieve.memories_dictionary['y'], memory)
+        self.assertEqual((memory.content, snapshot['y']), (20, 10))
+
+    def test_snapshot_copies_only_the_memories_that_change_or_it_uses(self):
+        pensieve = Pensieve()
+        for i in range(100):
+            pensieve.store(key=f'x_{i}', content=i)
+        snapshot = pensieve.snapshot()
+        _ = [pensieve[f'x_{i}'] for i in range(100)]
+        pensieve.store(key='x_0', content=-1)
+        self.assertEqual(list(snapshot.memories_dictionary._own), ['x_0'])
+        self.assertEqual((snapshot['x_0'], snapshot['x_1']), (0, 1))
+        self.assertEqual(len(snapshot.memories_dictionary._own), 2)
+
+
+class TopologicalOrderTestCase(PensieveTestCase):
+    def test_order_follows_new_edges_and_rejects_loops(self):
+        from ..exceptions import MemoryRecursionError
+
+        self.pensieve.store(key='a', content=1)
+        self.pensieve.store(key='b', content=2)
+        self.pensieve.store(key='c', precursors=['b'], function=lambda b: b + 1)
+        # a moves after b and c once it depends on c
+        self.pensieve.store(key='a', precursors=['c'], function=lambda c: c * 10)
+        self.assertEqual(self.pensieve['a'], 30)
+        order = self.pensieve._get_topological_order().get_sorted_keys()
+        self.assertLess(order.index('b'), order.index('c'))
+        self.assertLess(order.index('c'), order.index('a'))
+        self.assertEqual(sorted(self.pensieve.get_ancestor_keys('a')), ['b', 'c'])
+        self.assertTrue(self.pensieve.is_ancestor('b', 'a'))
+        self.assertFalse(self.pensieve.is_ancestor('a', 'b'))
+
+        with self.assertRaises(MemoryRecursionError):
+            self.pensieve.store(key='b', precursors=['a'], function=lambda a: a)
+        with self.assertRaises(MemoryRecursionError):
+            self.pensieve.store(key='c', precursors=['c'], function=lambda c: c)
+        self.assertEqual(self.pensieve.get_precursor_keys('b'), [])
+        self.assertEqual(self.pensieve.get_precursor_keys('c'), ['b'])
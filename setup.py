@@ -29,7 +29,7 @@ setup(
 
     packages=find_packages(exclude=("jupyter_tests", ".idea", ".git")),
     install_requires=[
-        'dill', 'toposort', 'disk', 'slytherin', 'chronometry', 'joblib', 'pandas',
+        'dill', 'disk', 'slytherin', 'chronometry', 'joblib', 'pandas',
         'abstract>=2022.4.20'
     ],
     python_requires='~=3.6',